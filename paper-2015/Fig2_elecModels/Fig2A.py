@@ -24,6 +24,12 @@ import matplotlib.pyplot as plt
 import random
 import time
 import moose
+import os
+import sys
+scriptDir = os.path.dirname( os.path.realpath( __file__ ) )
+sys.path.append( os.path.join( scriptDir, '../../util' ) )
+from runControl import RunController
+from popSpikes import PopulationSpikes
 
 np.random.seed(100) # set seed for reproducibility of simulations
 random.seed(100) # set seed for reproducibility of simulations
@@ -221,18 +227,12 @@ class ExcInhNetBase:
         for i in range(10):
             moose.setClock( i, dt )
         moose.setClock( 18, plotDt )
-        t1 = time.time()
+        rc = RunController( self.simtime, numChunks = 50 )
         print('reinit MOOSE -- takes a while ~20s.')
-        moose.reinit()
-        print(('reinit time t = ', time.time() - t1))
-        t1 = time.time()
+        rc.reinit()
         print('starting')
-        simadvance = self.simtime / 50.0
-        for i in range( 50 ):
-            moose.start( simadvance )
-            print(('at t = ', i * simadvance, 'realtime = ', time.time() - t1))
-        #moose.start(self.simtime)
-        print(('runtime for ', self.simtime, 'sec, is t = ', time.time() - t1))
+        rc.run()
+        rc.report()
 
         if plotif:
             self._plot()
@@ -252,15 +252,11 @@ class ExcInhNetBase:
         moose.connect( self.network, 'spikeOut', \
             self.spikes, 'input', 'OneToOne' )
 
-        ## make 2 tables to store spikes of all exc and all inh neurons
-        self.spikesExc = moose.Table2( '/plotSpikesAllExc' )
-        for i in range(self.NmaxExc):
-            moose.connect( self.network.vec[i], 'spikeOut', \
-                self.spikesExc, 'input' )
-        self.spikesInh = moose.Table2( '/plotSpikesAllInh' )
-        for i in range(self.NmaxExc,self.N):
-            moose.connect( self.network.vec[i], 'spikeOut', \
-                self.spikesInh, 'input' )
+        ## all-exc and all-inh spike trains are merged from the per-neuron
+        ## tables after the run, instead of a second spikeOut message
+        ## from every neuron into a shared table
+        self.spikesExc = PopulationSpikes( self.spikes, 0, self.NmaxExc )
+        self.spikesInh = PopulationSpikes( self.spikes, self.NmaxExc, self.N )
 
     def _plot(self):
         """ plots the spike raster for the simulated net"""
@@ -29,6 +29,10 @@ import os
 from moose.neuroml.ChannelML import ChannelML
 sys.path.append('/home/bhalla/moose/trunk/Demos/util')
 import rdesigneur as rd
+import argparse
+sys.path.append( os.path.join( os.path.dirname( os.path.realpath(
+        __file__ ) ), '../../util' ) )
+from phaseProtocol import PhaseProtocol, runSeeds
 
 PI = 3.14159265359
 useGssa = False
@@ -186,8 +190,32 @@ def displayPlots():
     plt.xlabel( 'Time (s)', fontsize = 16 )
     plt.show()
 
-def main():
-    numpy.random.seed( 1234 )
+def buildProtocol():
+    # Baseline, two tetani, post-tetanic rest, a long small Ca influx for
+    # LTD, and rest. Each phase is duration, psd Ca_input, dend Ca_input;
+    # None keeps the value in the model.
+    caPsd = '/model/chem/psd/Ca_input'
+    caDend = '/model/chem/dend/DEND/Ca_input'
+    castim = (numpy.random.rand( len( moose.vec( caPsd ) ) ) * 0.8 + 0.2) * psdTetCa
+    dendTet = lambda n: numpy.random.rand( n ) * dendTetCa
+    phases = [
+        [ baselineTime, None, None ],
+        [ tetTime, castim, dendTet ],
+        [ interTetTime, basalCa, basalCa ],
+        [ tetTime, castim, dendTet ],
+        [ postTetTime, basalCa, basalCa ],
+        [ ltdTime, ltdCa, ltdCa ],
+        [ postLtdTime, basalCa, basalCa ]
+    ]
+    proto = PhaseProtocol( [ caPsd, caDend ] )
+    for i in phases:
+        proto.addPhase( *i )
+    proto.compile()
+    return proto
+
+def buildModel( seed ):
+    numpy.random.seed( seed )
+    moose.seed( seed )
     rdes = buildRdesigneur()
     rdes.buildModel( '/model' )
     assert( moose.exists( '/model' ) )
@@ -197,33 +225,52 @@ def main():
     for i in range( 10, 18 ):
         moose.setClock( i, dt )
     moose.setClock( 18, plotdt )
+    proto = buildProtocol()
     moose.reinit()
     buildPlots()
+    return proto
+
+def psdStats( seed ):
+    # Runs the whole protocol and returns the number of AMPARs in each
+    # psd at the end of each phase.
+    proto = buildModel( seed )
+    moose.start( proto.runtime )
+    tab = moose.vec( '/graphs/psd_tot_PSD_R' )
+    n = len( tab[0].vector )
+    idx = numpy.minimum( numpy.round( proto.phaseEnds() / plotdt ).astype( int ), n - 1 )
+    return numpy.array( [ numpy.array( k.vector )[idx] for k in tab ] )
+
+def seedStats( seeds, processes ):
+    # Repeats the protocol for each seed in parallel, saves the psd
+    # numbers and reports the LTP and LTD ratios of total AMPAR.
+    psdR = numpy.array( runSeeds( psdStats, seeds, processes ) )
+    name = os.path.splitext( os.path.basename( __file__ ) )[0] + '_seeds.npz'
+    numpy.savez( name, seeds = seeds, psdR = psdR )
+    tot = psdR.sum( axis = 1 )
+    ltp = tot[:,4] / tot[:,0]
+    ltd = tot[:,6] / tot[:,4]
+    print(( 'LTP ratio = {:.3f} +- {:.3f}, LTD ratio = {:.3f} +- {:.3f} over {} seeds'.format(
+        ltp.mean(), ltp.std(), ltd.mean(), ltd.std(), len( seeds ) ) ))
+    print(( 'Wrote', name ))
+
+def main():
+    parser = argparse.ArgumentParser( description = 'LTP and LTD in a '
+            'multiscale model with spines.' )
+    parser.add_argument( '--seeds', type = int, nargs = '+', default = None,
+            help = 'run once per seed in worker processes and report LTP '
+            'and LTD statistics instead of plotting' )
+    parser.add_argument( '--processes', '-p', type = int, default = None,
+            help = 'worker processes for --seeds (default: all cores)' )
+    args = parser.parse_args()
+    if args.seeds:
+        seedStats( args.seeds, args.processes )
+        return
+
+    proto = buildModel( 1234 )
     # Run for baseline, tetanus, and post-tetanic settling time 
     print('starting...')
     t1 = time.time()
-    moose.start( baselineTime )
-    caPsd = moose.vec( '/model/chem/psd/Ca_input' )
-    caDend = moose.vec( '/model/chem/dend/DEND/Ca_input' )
-    castim = (numpy.random.rand( len( caPsd.concInit ) ) * 0.8 + 0.2) * psdTetCa
-    caPsd.concInit = castim
-    caDend.concInit = numpy.random.rand( len( caDend.concInit ) ) * dendTetCa
-    moose.start( tetTime )
-    caPsd.concInit = basalCa
-    caDend.concInit = basalCa
-    moose.start( interTetTime )
-    caPsd.concInit = castim
-    caDend.concInit = numpy.random.rand( len( caDend.concInit ) ) * dendTetCa
-    moose.start( tetTime )
-    caPsd.concInit = basalCa
-    caDend.concInit = basalCa
-    moose.start( postTetTime )
-    caPsd.concInit = ltdCa
-    caDend.concInit = ltdCa
-    moose.start( ltdTime )
-    caPsd.concInit = basalCa
-    caDend.concInit = basalCa
-    moose.start( postLtdTime )
+    moose.start( proto.runtime )
     print(('real time = ', time.time() - t1))
 
     if do3D:
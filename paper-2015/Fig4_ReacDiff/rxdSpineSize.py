@@ -15,6 +15,11 @@ import matplotlib.pyplot as plt
 import moose
 import sys
 import rdesigneur as rd
+import os
+sys.path.append( os.path.join( os.path.dirname( os.path.realpath(
+        __file__ ) ), '../../util' ) )
+from probe import Probe
+from tableVec import recordVec, harvest
 import matplotlib
 
 doMoo = True
@@ -46,6 +51,7 @@ spineSize = 1.0
 spineSizeDistrib = 0.5
 spineAngle= numpy.pi / 2.0
 spineAngleDistrib = 0.0
+probeDt = 0.0       # > 0 streams psd z and head0 diameter to stdout
 
 def makeCellProto( name ):
     elec = moose.Neuron( '/library/' + name )
@@ -118,17 +124,13 @@ def makeModel():
         x[i].concInit = concInit
 
 def makePlot( name, srcVec, field ):
-    tab = moose.Table2('/graphs/' + name + 'Tab', len( srcVec ) ).vec
-    for i in zip(srcVec, tab):
-        moose.connect(i[1], 'requestOut', i[0], field)
-    return tab
+    return recordVec( '/graphs/' + name + 'Tab', srcVec, field )
 
 
 def displayPlots():
     for x in moose.wildcardFind( '/graphs/#[0]' ):
-        tab = moose.vec( x )
-        for i in range( len( tab ) ):
-            plt.plot( tab[i].vector, label=x.name[:-3] + " " + str( i ) )
+        for i, v in enumerate( harvest( x.vec ) ):
+            plt.plot( v, label=x.name[:-3] + " " + str( i ) )
         plt.legend()
         plt.figure()
 
@@ -157,11 +159,10 @@ def main():
     makePlot( 'psd_z', moose.vec( '/model/chem/psd/z' ), 'getN' )
     makePlot( 'headDia', eHead, 'getDiameter' )
 
-    '''
-    debug = moose.PyRun( '/pyrun' )
-    debug.tick = 10
-    debug.runString = """print( "RUNNING: ", moose.element( '/model/chem/psd/z').n, moose.element( '/model/elec/head0' ).diameter)"""
-    '''
+    if probeDt > 0:
+        probe = Probe( probeDt, outfile = '-' )
+        probe.add( 'psd_z', moose.element( '/model/chem/psd/z' ), 'n' )
+        probe.add( 'head0Dia', moose.element( '/model/elec/head0' ), 'diameter' )
     moose.reinit()
     moose.start( runtime )
 
@@ -10,7 +10,10 @@
 # By default we set it to run the smallest model, that takes about 4 minutes
 # to run 57 seconds of simulation time, on an Intel core I7 at 
 # 2.2 GHz. The big model, VHC-neuron, takes almost 90 minutes.
-# This program dumps data to text files for further analysis.
+# Each morphology runs in its own worker process, so with enough cores
+# the whole set takes about as long as the slowest cell.
+# This program dumps data to text files for further analysis, and gathers
+# the psd dumps of all cells into Fig5BCD.psd.txt.
 ########################################################################
 try:
     import moogli
@@ -18,6 +21,8 @@ except ImportError as e:
     print( "[INFO ] Could not import moogli. Quitting ..." )
     quit()
     
+import argparse
+import multiprocessing
 import numpy
 import time
 import pylab
@@ -29,6 +34,10 @@ import sys
 import os
 from moose.neuroml.ChannelML import ChannelML
 import rdesigneur as rd
+sys.path.append( os.path.join( os.path.dirname( os.path.realpath(
+        __file__ ) ), '../../util' ) )
+from stimulusProtocol import StimulusProtocol
+from tableVec import recordVec
 
 PI = 3.14159265359
 useGssa = True
@@ -173,22 +182,14 @@ def buildPlots( rdes ):
     assert( len( caPsd ) == numSpines )
     assert( len( caHead ) == numSpines )
     if numSpines < numPlots:
-        caPsdTab = moose.Table2( '/graphs/caPsdTab', numSpines ).vec
-        caHeadTab = moose.Table2( '/graphs/caHeadTab', numSpines ).vec
-        psdRtab = moose.Table2( '/graphs/psdRtab', numSpines ).vec
-        for i in range( numSpines ):
-            moose.connect( caPsdTab[i], 'requestOut', caPsd[i], 'getConc' )
-            moose.connect( caHeadTab[i], 'requestOut', caHead[i], 'getConc')
-            moose.connect( psdRtab[i], 'requestOut', psdR[i], 'getN' )
+        recordVec( '/graphs/caPsdTab', caPsd, 'getConc' )
+        recordVec( '/graphs/caHeadTab', caHead, 'getConc' )
+        recordVec( '/graphs/psdRtab', psdR, 'getN' )
     else:
-        caPsdTab = moose.Table2( '/graphs/caPsdTab', numPlots ).vec
-        caHeadTab = moose.Table2( '/graphs/caHeadTab', numPlots ).vec
-        psdRtab = moose.Table2( '/graphs/psdRtab', numPlots ).vec
-        dx = numSpines / numPlots
-        for i in range( numPlots ):
-            moose.connect( caPsdTab[i], 'requestOut', caPsd[i*dx], 'getConc' )
-            moose.connect( caHeadTab[i], 'requestOut', caHead[i*dx], 'getConc' )
-            moose.connect( psdRtab[i], 'requestOut', psdR[i*dx], 'getN' )
+        dx = numSpines // numPlots
+        recordVec( '/graphs/caPsdTab', [ caPsd[i*dx] for i in range( numPlots ) ], 'getConc' )
+        recordVec( '/graphs/caHeadTab', [ caHead[i*dx] for i in range( numPlots ) ], 'getConc' )
+        recordVec( '/graphs/psdRtab', [ psdR[i*dx] for i in range( numPlots ) ], 'getN' )
     vtab = moose.Table( '/graphs/vtab' )
     moose.connect( vtab, 'requestOut', rdes.soma, 'getVm' )
     eSpineCaTab = moose.Table( '/graphs/eSpineCaTab' )
@@ -208,78 +209,101 @@ def saveAndClearPlots( name ):
     moose.delete( "/graphs" )
 
 def printPsd( name ):
-    # Print the vol, the path dist from soma, the electrotonic dist, and N
+    # Print the index, N, conc, the path dist from soma and the
+    # electrotonic dist of each psd, as one block.
     psdR = moose.vec( '/model/chem/psd/tot_PSD_R' )
-    neuronVoxel = moose.element( '/model/chem/spine' ).neuronVoxel
+    neuronVoxel = numpy.array( moose.element( '/model/chem/spine' ).neuronVoxel, dtype = int )
     elecComptMap = moose.element( '/model/chem/dend' ).elecComptMap
     print(("len( neuronVoxel = ", len( neuronVoxel), min( neuronVoxel), max( neuronVoxel)))
     print((len( elecComptMap), elecComptMap[0], elecComptMap[12]))
     neuron = moose.element( '/model/elec' )
-    ncompts = neuron.compartments
-    d = {}
-    j = 0
-    for i in ncompts:
-        #print i
-        d[i] = j
-        j += 1
+    # Segment index of the first compartment of each dend voxel, then
+    # of the dend voxel under each spine.
+    d = dict( ( c, j ) for j, c in enumerate( neuron.compartments ) )
+    voxelSeg = numpy.array( [ d[compt[0]] for compt in elecComptMap ], dtype = int )
+    segIndex = voxelSeg[ neuronVoxel ]
+    p = numpy.asarray( neuron.geometricalDistanceFromSoma )[ segIndex ]
+    L = numpy.asarray( neuron.electrotonicDistanceFromSoma )[ segIndex ]
+    data = numpy.column_stack( ( numpy.arange( len( psdR ) ),
+        numpy.asarray( psdR.n ), numpy.asarray( psdR.conc ), p, L ) )
+    numpy.savetxt( name + ".txt", data, fmt = "%d    %s  %s  %s  %s" )
 
-    f = open( name + ".txt", 'w' )
-    for i in range( len( psdR ) ):
-        n = psdR[i].n
-        conc = psdR[i].conc
-        vol = psdR[i].volume
-        compt = elecComptMap[ neuronVoxel[i] ]
-        #print compt
-        segIndex = d[compt[0]]
-        p = neuron.geometricalDistanceFromSoma[ segIndex ]
-        L = neuron.electrotonicDistanceFromSoma[ segIndex ]
-        s = str( i ) + "    " + str(n) + "  " + str( conc ) + "  " + str(p) + "  " + str(L) + "\n"
-        f.write( s )
-    f.close()
 
-
-def probeStimulus( time ):
-    for t in numpy.arange( 0, time, probeInterval ):
-        moose.start( probeInterval )
-        for i in synSpineList:
-            i.activation( probeAmplitude )
-
-def tetanicStimulus( time ):
+def buildProtocol():
+    # Baseline probe, tetanus, then post-tetanic probe, compiled into
+    # TimeTables so that the whole protocol runs in one moose.start.
     tetInterval = 1.0/tetanusFrequency
-    for t in numpy.arange( 0, time, tetInterval ):
-        moose.start( tetInterval )
-        for i in synDendList:
-            i.activation( tetanusAmplitude )
-        for i in synSpineList:
-            i.activation( tetanusAmplitudeForSpines )
+    proto = StimulusProtocol()
+    proto.addTrain( synSpineList, probeAmplitude, probeInterval, baselineTime )
+    start = proto.runtime
+    proto.addTrain( synDendList, tetanusAmplitude, tetInterval, tetTime, start )
+    proto.addTrain( synSpineList, tetanusAmplitudeForSpines, tetInterval,
+            tetTime, start )
+    proto.addTrain( synSpineList, probeAmplitude, probeInterval, postTetTime )
+    proto.compile()
+    return proto
 
-def main():
+def runMorphology( fname ):
+    # Builds, runs and dumps one cell in its own process, with its own
+    # rdesigneur. Returns the cell, its run time and its psd file.
     global synSpineList 
     global synDendList 
     numpy.random.seed( 1234 )
     rdes = buildRdesigneur( )
-    for i in elecFileNames:
-        print(i)
-        rdes.cellProtoList = [ ['./cells/' + i, 'elec'] ]
-        rdes.buildModel( )
-        assert( moose.exists( '/model' ) )
-        synSpineList = moose.wildcardFind( "/model/elec/#head#/glu,/model/elec/#head#/NMDA" )
-        temp = set( moose.wildcardFind( "/model/elec/#/glu,/model/elec/#/NMDA" ) )
+    print(fname)
+    rdes.cellProtoList = [ ['./cells/' + fname, 'elec'] ]
+    rdes.buildModel( )
+    assert( moose.exists( '/model' ) )
+    synSpineList = moose.wildcardFind( "/model/elec/#head#/glu,/model/elec/#head#/NMDA" )
+    temp = set( moose.wildcardFind( "/model/elec/#/glu,/model/elec/#/NMDA" ) )
+
+    synDendList = list( temp - set( synSpineList ) )
+    proto = buildProtocol()
+    moose.reinit()
+    buildPlots( rdes )
+    # Run for baseline, tetanus, and post-tetanic settling time 
+    t1 = time.time()
+    moose.start( proto.runtime )
+    realTime = time.time() - t1
+    print(('real time = ', realTime))
 
-        synDendList = list( temp - set( synSpineList ) )
-        moose.reinit()
-        buildPlots( rdes )
-        # Run for baseline, tetanus, and post-tetanic settling time 
-        t1 = time.time()
-        probeStimulus( baselineTime )
-        tetanicStimulus( tetTime )
-        probeStimulus( postTetTime )
-        print(('real time = ', time.time() - t1))
+    printPsd( fname + ".fig5" )
+    saveAndClearPlots( fname + ".fig5" )
+    return fname, realTime, fname + ".fig5.txt"
+
+def mergeResults( results, name = "Fig5BCD" ):
+    # Gathers the psd dumps of all cells into one file, with the cell as
+    # the first column, and lists the run time of each.
+    with open( name + ".psd.txt", 'w' ) as f:
+        for fname, realTime, psdFile in results:
+            with open( psdFile ) as g:
+                for line in g:
+                    f.write( fname + "    " + line )
+    with open( name + ".times.txt", 'w' ) as f:
+        for fname, realTime, psdFile in results:
+            f.write( "{}    {:.3f}\n".format( fname, realTime ) )
+    print(( 'Wrote', name + ".psd.txt", name + ".times.txt" ))
+
+def main():
+    parser = argparse.ArgumentParser( description = 'Runs the Fig5BCD '
+            'protocol on each morphology, one per worker process.' )
+    parser.add_argument( '--cells', nargs = '+', default = elecFileNames,
+            help = 'morphology files in ./cells' )
+    parser.add_argument( '--processes', '-p', type = int, default = None,
+            help = 'worker processes (default: all cores)' )
+    args = parser.parse_args()
 
-        printPsd( i + ".fig5" )
-        saveAndClearPlots( i + ".fig5" )
-        moose.delete( '/model' )
-        rdes.elecid = moose.element( '/' )
+    # Every cell gets a fresh process, so that no MOOSE state is carried
+    # from one model to the next.
+    t1 = time.time()
+    pool = multiprocessing.Pool( args.processes, maxtasksperchild = 1 )
+    try:
+        results = pool.map( runMorphology, args.cells, chunksize = 1 )
+    finally:
+        pool.close()
+        pool.join()
+    mergeResults( results )
+    print(('total real time = ', time.time() - t1))
 
 if __name__ == '__main__':
     main()
@@ -35,9 +35,15 @@ import moose
 from PyQt4 import Qt, QtCore, QtGui
 from numpy import random as nprand
 from moose.neuroml.NeuroML import NeuroML
+import os
 import sys
 import rdesigneur as rd
 import moogli
+scriptDir = os.path.dirname( os.path.realpath( __file__ ) )
+sys.path.append( os.path.join( scriptDir, '../../util' ) )
+from runControl import RunController
+from popSpikes import PopulationSpikes
+from tableVec import recordVec, harvest, sampleTimes
 cellname = "./cells_channels/CA1_nochans.morph.xml"
 fname = "fig6bcde"
 
@@ -280,7 +286,10 @@ def makeDetailedNeuron():
     rdes.buildModel( '/model' )
     #bcs.addAllPlots()
     
-def connectDetailedNeuron():
+def connectDetailedNeuron( src = '/network', srcField = 'spikeOut' ):
+    """Connects spike sources to the synapses of the detailed neuron.
+    By default the source is the LIF network; multiscaleRunner.py passes
+    a TimeTable vec of the same size standing in for it."""
     excProb = 0.00042
     excSeed = 1234
     inhProb = 0.00013
@@ -300,7 +309,7 @@ def connectDetailedNeuron():
     totNMDAWt = 0.0
     totGABAWt = 0.0
     for x in moose.wildcardFind( '/model/elec/#/glu/##[ISA=Synapse]' ):
-        exc = moose.connect( '/network', 'spikeOut', x, 'addSpike','sparse')
+        exc = moose.connect( src, srcField, x, 'addSpike','sparse')
         exc.setRandomConnectivity( excProb, seed )
         seed = seed + 1
         if exc.numEntries > 0:
@@ -316,7 +325,7 @@ def connectDetailedNeuron():
     seed = excSeed
     for x in moose.wildcardFind( '/model/elec/#/NMDA/##[ISA=Synapse]' ):
         #print " x = ", x
-        exc = moose.connect( '/network', 'spikeOut', x, 'addSpike','sparse')
+        exc = moose.connect( src, srcField, x, 'addSpike','sparse')
         exc.setRandomConnectivity( excProb, seed )
         seed = seed + 1
         if exc.numEntries > 0:
@@ -332,7 +341,7 @@ def connectDetailedNeuron():
     seed = inhSeed
     for x in moose.wildcardFind( '/model/elec/#/GABA/##[ISA=Synapse]' ):
         #print x
-        inh = moose.connect( '/network', 'spikeOut', x, 'addSpike','sparse')
+        inh = moose.connect( src, srcField, x, 'addSpike','sparse')
         inh.setRandomConnectivity( inhProb, seed )
         seed = seed + 1
         if inh.numEntries > 0:
@@ -458,15 +467,11 @@ class ExcInhNetBase:
         moose.connect( self.network, 'spikeOut', \
             self.spikes, 'input', 'OneToOne' )
 
-        ## make 2 tables to store spikes of all exc and all inh neurons
-        self.spikesExc = moose.Table( '/plotSpikesAllExc' )
-        for i in range(self.NmaxExc):
-            moose.connect( self.network.vec[i], 'spikeOut', \
-                self.spikesExc, 'input' )
-        self.spikesInh = moose.Table( '/plotSpikesAllInh' )
-        for i in range(self.NmaxExc,self.N):
-            moose.connect( self.network.vec[i], 'spikeOut', \
-                self.spikesInh, 'input' )
+        ## all-exc and all-inh spike trains are merged from the per-neuron
+        ## tables after the run, instead of a second spikeOut message
+        ## from every neuron into a shared table
+        self.spikesExc = PopulationSpikes( self.spikes, 0, self.NmaxExc )
+        self.spikesInh = PopulationSpikes( self.spikes, self.NmaxExc, self.N )
 
     def _plot(self, fig):
         """ plots the spike raster for the simulated net"""
@@ -761,14 +766,8 @@ def buildNeuronPlots( rdes ):
     moose.connect( vtab, "requestOut", rdes.soma, "getVm" )
     caSoma = moose.element( rdes.soma.path + "/Ca_conc" )
     moose.connect( catab, "requestOut", caSoma, "getCa" )
-    elist = moose.wildcardFind( '/model/chem/psd/tot_PSD_R[]' )
-    rtab = moose.Table2( '/graphs/rtab', len( elist ) ).vec
-    for i in zip( elist, rtab ):
-        moose.connect( i[1], "requestOut", i[0], "getN" )
-    elist = moose.wildcardFind( '/model/chem/spine/Ca[]' )
-    pcatab = moose.Table2( '/graphs/pcatab', len( elist ) ).vec
-    for i in zip( elist, pcatab ):
-        moose.connect( i[1], "requestOut", i[0], "getConc" )
+    recordVec( '/graphs/rtab', '/model/chem/psd/tot_PSD_R', 'getN' )
+    recordVec( '/graphs/pcatab', '/model/chem/spine/Ca', 'getConc' )
 
 def cleanAx( ax, label, showXlabel = False ):
     ax.spines['top'].set_visible( False )
@@ -798,19 +797,15 @@ def saveNeuronPlots( fig, rdes ):
     
     ax = plt.subplot(223)
     cleanAx( ax, 'D', showXlabel = True )
-    pcatab = list( moose.vec( '/graphs/pcatab' ) )[0::50]
-    t = np.arange( 0, len( pcatab[0].vector ), 1 ) * pcatab[0].dt
-    for i in pcatab:
-        plt.plot( t, i.vector * 1000 )
+    t = sampleTimes( '/graphs/pcatab' )
+    plt.plot( t, harvest( '/graphs/pcatab', 50 ).T * 1000 )
     plt.ylabel( '[Ca] (uM)', fontsize = 16 )
     plt.xlabel( 'Time (s)', fontsize = 16 )
 
     ax = plt.subplot(224)
     cleanAx( ax, 'E', showXlabel = True )
-    rtab = list( moose.vec( '/graphs/rtab' ) )[0::50]
-    t = np.arange( 0, len( rtab[0].vector ), 1 ) * rtab[0].dt
-    for i in rtab:
-        plt.plot( t, i.vector )
+    t = sampleTimes( '/graphs/rtab' )
+    plt.plot( t, harvest( '/graphs/rtab', 50 ).T )
     plt.ylabel( '# of inserted GluRs', fontsize = 16 )
     plt.xlabel( 'Time (s)', fontsize = 16 )
     '''
@@ -915,19 +910,19 @@ if __name__=='__main__':
         fig2, ret = makeScatterPlot( 50, 50, Vm )
         #cellFig = bcs.neuronPlot( '/model/elec', '/model/chem/psd/tot_PSD_R[]' )
 
-    moose.reinit()
-    t1 = time.time()
-    print('starting')
-    #moose.start(simtime)
-    for currTime in np.arange( 0, simtime, updateDt ):
-        moose.start(updateDt)
+    def updateScatter( currTime ):
+        ## currTime is the end of the chunk, colour by spikes since its start
         lastt = net.network.vec.lastEventTime
-        lastt = np.exp( 2 * (lastt - currTime ) )
-        print(currTime, time.time() - t1)
+        lastt = np.exp( 2 * (lastt - currTime + updateDt ) )
         ret.set_array( lastt )
         fig2.canvas.draw()
 
-    print('runtime, t = ', time.time() - t1)
+    rc = RunController( simtime, chunkTime = updateDt )
+    rc.addHook( updateScatter )
+    rc.reinit()
+    print('starting')
+    rc.run()
+    rc.report()
 
     if plotif:
         net._plot( fig )
@@ -0,0 +1,309 @@
+#/**********************************************************************
+#** This program is part of 'MOOSE', the
+#** Messaging Object Oriented Simulation Environment.
+#**           Copyright (C) 2003-2014 Upinder S. Bhalla. and NCBS
+#** It is made available under the terms of the
+#** GNU Lesser General Public License version 2.1
+#** See the file COPYING.LIB for the full notice.
+#**********************************************************************/
+
+'''
+Runs the Figure 6 multiscale model, the LIF network coupled to the
+detailed rdesigneur neuron with spines and chemistry, as two processes
+instead of one.
+
+The network only drives the detailed neuron, through synapses that
+carry a delay, so the two halves can be pipelined:
+    - the network process advances by commDt at a time and after each
+      interval sends the new (spike time, neuron index) events through a
+      bounded queue.
+    - the neuron process replaces /network by a TimeTable vec of the same
+      size, wired up by the same connectDetailedNeuron(), appends the
+      received spike times to the TimeTables and then advances over the
+      same interval. Its soma Vm for the interval is sent back to the
+      parent.
+Each process runs at its own solver's pace, one interval apart, so the
+wall time is close to that of the slower half rather than the sum.
+The queues are read with a timeout, and if either child dies the parent
+terminates the other and raises ProcessDied rather than waiting forever.
+
+Both modes build each half with its own random seeds, so that
+    python multiscaleRunner.py --test
+can check the two-process run against the single-process run of the
+same model. The test uses the deterministic chemical solver, since
+Gsolve and the noisy network plasticity otherwise share one random
+number stream in a single process.
+
+Usage:
+    python multiscaleRunner.py [--model ReducedModel] [--simtime 30]
+        [--commDt 0.2] [--single]
+'''
+
+from __future__ import print_function
+import argparse
+import importlib
+import multiprocessing
+import queue
+import random
+import time
+import numpy as np
+
+networkSeed = 100
+neuronSeed = 1234
+noiseSeed = 101
+pollTime = 1.0  # s between checks that the other processes are alive
+
+#############################################
+# Model building, shared by both modes
+#############################################
+
+def loadModel( modelName, useGssa = None ):
+    m = importlib.import_module( modelName )
+    if useGssa is not None:
+        m.useGssa = useGssa
+    return m
+
+def buildNetwork( m ):
+    import moose
+    np.random.seed( networkSeed )
+    random.seed( networkSeed )
+    moose.seed( networkSeed )
+    return m.ExcInhNet( N = m.N )
+
+def buildNeuron( m, src = '/network', srcField = 'spikeOut' ):
+    import moose
+    np.random.seed( neuronSeed )
+    rdes = m.buildRdesigneur()
+    rdes.buildModel( '/model' )
+    m.buildNeuronPlots( rdes )
+    m.connectDetailedNeuron( src, srcField )
+    return rdes
+
+def initNetwork( m, net, simtime ):
+    np.random.seed( noiseSeed )
+    net.simulate( simtime, plotif = True,
+        v0 = np.random.uniform( m.el - 20e-3, m.vt, size = m.N ) )
+
+def setClocks( m ):
+    """Same clock assignments as the __main__ of the Fig6 scripts."""
+    import moose
+    moose.useClock( 1, '/network', 'process' )
+    moose.useClock( 2, '/plotSpikes', 'process' )
+    moose.useClock( 3, '/plotVms', 'process' )
+    if m.CaPlasticity:
+        moose.useClock( 3, '/plotWeights', 'process' )
+        moose.useClock( 3, '/plotCa', 'process' )
+    for i in ( 0, 1, 2, 3, 9 ):
+        moose.setClock( i, m.dt )
+
+def chunks( simtime, commDt ):
+    """End times of the communication intervals."""
+    n = int( np.ceil( simtime / commDt - 1e-9 ) )
+    return [ min( ( i + 1 ) * commDt, simtime ) for i in range( n ) ]
+
+def spikeTrains( net ):
+    return [ np.array( v ) for v in net.spikes.vec.vector ]
+
+#############################################
+# Two-process mode
+#############################################
+
+class ProcessDied( RuntimeError ):
+    pass
+
+def getPolled( q, isDead ):
+    """q.get(), checking every pollTime that isDead() returns None,
+    and raising ProcessDied with the message it returns otherwise."""
+    while True:
+        try:
+            return q.get( timeout = pollTime )
+        except queue.Empty:
+            pass
+        msg = isDead()
+        if msg is not None:
+            raise ProcessDied( msg )
+
+def parentDead():
+    parent = multiprocessing.parent_process()
+    if parent is not None and not parent.is_alive():
+        return 'parent process has exited'
+    return None
+
+def networkProcess( modelName, useGssa, simtime, commDt, spikeQueue, resultQueue ):
+    import moose
+    m = loadModel( modelName, useGssa )
+    net = buildNetwork( m )
+    initNetwork( m, net, simtime )
+    setClocks( m )
+    moose.reinit()
+    sent = np.zeros( m.N, dtype = int )
+    lastTime = 0.0
+    for endTime in chunks( simtime, commDt ):
+        moose.start( endTime - lastTime )
+        lastTime = endTime
+        vectors = net.spikes.vec.vector
+        counts = np.array( [ len( v ) for v in vectors ] )
+        new = [ v[s:] for v, s in zip( vectors, sent ) ]
+        times = np.concatenate( new )
+        indices = np.repeat( np.arange( m.N ), counts - sent )
+        sent = counts
+        spikeQueue.put( ( endTime, times, indices ) )
+    resultQueue.put( ( 'network', spikeTrains( net ) ) )
+
+def neuronProcess( modelName, useGssa, simtime, commDt, spikeQueue, resultQueue ):
+    import moose
+    m = loadModel( modelName, useGssa )
+    moose.seed( networkSeed )    # as in the single-process run
+    ## stands in for the LIF network: replays its spikes into the synapses
+    proxy = moose.TimeTable( '/network', m.N )
+    buildNeuron( m, '/network', 'eventOut' )
+    setClocks( m )
+    moose.reinit()
+    received = [ [] for i in range( m.N ) ]
+    vtab = moose.element( '/graphs/vtab' )
+    lastTime = 0.0
+    vmSent = 0
+    while lastTime < simtime - 1e-9:
+        endTime, times, indices = getPolled( spikeQueue, parentDead )
+        for i in np.unique( indices ):
+            received[i].extend( times[ indices == i ] )
+            proxy.vec[int(i)].vector = received[i]
+        moose.start( endTime - lastTime )
+        lastTime = endTime
+        vm = vtab.vector
+        resultQueue.put( ( 'vm', endTime, np.array( vm[vmSent:] ) ) )
+        vmSent = len( vm )
+    resultQueue.put( ( 'neuron', np.array( vtab.vector ) ) )
+
+def runTwoProcess( modelName, simtime, commDt, useGssa = None, verbose = True ):
+    """Returns ( network spike trains, detailed neuron soma Vm )."""
+    ctx = multiprocessing.get_context( 'spawn' )
+    ## bounded, so the network can run ahead by at most a few intervals
+    spikeQueue = ctx.Queue( maxsize = 8 )
+    resultQueue = ctx.Queue()
+    args = ( modelName, useGssa, simtime, commDt, spikeQueue, resultQueue )
+    procs = [ ctx.Process( target = networkProcess, args = args,
+                name = 'network' ),
+            ctx.Process( target = neuronProcess, args = args,
+                name = 'neuron' ) ]
+    for p in procs:
+        p.start()
+    t0 = time.time()
+    results = {}
+    def childDead():
+        # A child that exits cleanly has put its result on the queue
+        # first, so it is only missing if the child failed.
+        for p in procs:
+            if p.exitcode is not None and ( p.exitcode != 0 or
+                    ( p.name not in results and resultQueue.empty() ) ):
+                return '%s process exited with code %d before sending ' \
+                        'its results' % ( p.name, p.exitcode )
+        return None
+    try:
+        while len( results ) < 2:
+            msg = getPolled( resultQueue, childDead )
+            if msg[0] == 'vm':
+                if verbose:
+                    print( 'at t = %g, realtime = %.3f' % ( msg[1], time.time() - t0 ) )
+            else:
+                results[ msg[0] ] = msg[1]
+    except ProcessDied:
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+        for p in procs:
+            p.join()
+        raise
+    for p in procs:
+        p.join()
+    if verbose:
+        print( 'runtime, t = ', time.time() - t0 )
+    return results['network'], results['neuron']
+
+#############################################
+# Single-process mode, the reference
+#############################################
+
+def runSingleProcess( modelName, simtime, commDt, useGssa = None, verbose = True ):
+    """Returns ( network spike trains, detailed neuron soma Vm )."""
+    import moose
+    m = loadModel( modelName, useGssa )
+    net = buildNetwork( m )
+    buildNeuron( m )
+    initNetwork( m, net, simtime )
+    setClocks( m )
+    moose.reinit()
+    t0 = time.time()
+    lastTime = 0.0
+    for endTime in chunks( simtime, commDt ):
+        moose.start( endTime - lastTime )
+        lastTime = endTime
+        if verbose:
+            print( 'at t = %g, realtime = %.3f' % ( endTime, time.time() - t0 ) )
+    if verbose:
+        print( 'runtime, t = ', time.time() - t0 )
+    return spikeTrains( net ), np.array( moose.element( '/graphs/vtab' ).vector )
+
+def runSingleProcessIsolated( modelName, simtime, commDt, useGssa = None ):
+    """runSingleProcess in a fresh process, so that it can follow a
+    two-process run from the same parent."""
+    ctx = multiprocessing.get_context( 'spawn' )
+    pool = ctx.Pool( 1 )
+    try:
+        return pool.apply( runSingleProcess,
+            ( modelName, simtime, commDt, useGssa, False ) )
+    finally:
+        pool.close()
+        pool.join()
+
+def testEquivalence( modelName, simtime = 1.0, commDt = 0.2, vmTol = 1e-3 ):
+    """Two-process run must reproduce the single-process network spikes
+    exactly and the detailed neuron soma Vm to within vmTol (V)."""
+    refSpikes, refVm = runSingleProcessIsolated( modelName, simtime, commDt,
+            useGssa = False )
+    spikes, vm = runTwoProcess( modelName, simtime, commDt, useGssa = False,
+            verbose = False )
+    assert len( spikes ) == len( refSpikes )
+    for s, r in zip( spikes, refSpikes ):
+        assert len( s ) == len( r ) and np.allclose( s, r ), \
+                'network spike trains differ'
+    assert len( vm ) == len( refVm ), 'soma Vm lengths differ'
+    err = np.max( np.abs( vm - refVm ) ) if len( vm ) else 0.0
+    print( 'max soma Vm difference = %g V' % err )
+    assert err <= vmTol, 'soma Vm differs by more than %g V' % vmTol
+    print( 'two-process run matches single-process run' )
+
+def main():
+    parser = argparse.ArgumentParser( description =
+        'Run the Fig6 multiscale model split across two processes.' )
+    parser.add_argument( '--model', default = 'ReducedModel',
+        help = 'module with the network and detailed neuron, '
+        'ReducedModel or Fig6BCDE' )
+    parser.add_argument( '--simtime', type = float, default = None,
+        help = 'simulation time (s), default from the model' )
+    parser.add_argument( '--commDt', type = float, default = 0.2,
+        help = 'communication interval between the processes (s)' )
+    parser.add_argument( '--single', action = 'store_true',
+        help = 'run everything in one process, for comparison' )
+    parser.add_argument( '--test', action = 'store_true',
+        help = 'check the two-process run against the single-process one' )
+    parser.add_argument( '--out', '-o', default = 'multiscale.npz' )
+    args = parser.parse_args()
+
+    if args.test:
+        testEquivalence( args.model, args.simtime or 1.0, args.commDt )
+        return
+    simtime = args.simtime
+    if simtime is None:
+        simtime = loadModel( args.model ).simtime
+    if args.single:
+        spikes, vm = runSingleProcess( args.model, simtime, args.commDt )
+    else:
+        spikes, vm = runTwoProcess( args.model, simtime, args.commDt )
+    np.savez( args.out, vm = vm, spikeTimes = np.concatenate( spikes ),
+            spikeIndices = np.repeat( np.arange( len( spikes ) ),
+                [ len( s ) for s in spikes ] ) )
+    print( 'Wrote ' + args.out )
+
+if __name__ == '__main__':
+    main()
@@ -11,7 +11,9 @@ import rdesigneur as rd
 import time
 
 
-def singleCompt( name, params ):
+def setupSingleCompt( name, params ):
+    """Copies the named model into /model with its own Ksolve and a Table2
+    on A, without running it. Returns the table and the runtime."""
     mod = moose.copy( '/library/' + name + '/' + name, '/model' )
     A = moose.element( mod.path + '/A' )
     Z = moose.element( mod.path + '/Z' )
@@ -36,16 +38,31 @@ def singleCompt( name, params ):
     stoich = moose.Stoich( mod.path + '/stoich' )
     stoich.compartment = mod
     stoich.ksolve = ksolve
-    stoich.path = mod.path + '/##'
+    stoich.reacSystemPath = mod.path + '/##'
     runtime += 2 * steptime
+    return tab, runtime
 
+def singleCompt( name, params ):
+    tab, runtime = setupSingleCompt( name, params )
     moose.reinit()
     moose.start( runtime )
     t = np.arange( 0, runtime + 1e-9, tab.dt )
     return name, t, tab.vector
-    #pylab.plot( t, tab.vector, label='[A] (mM)' )
-    
-    #pylab.show()
+
+def batchSingleCompt( models ):
+    """Runs several models side by side, each in its own compartment
+    with its own Ksolve, in a single reinit and start. models is a list
+    of ( name, params ). Returns ( name, t, A ) for each, truncated to
+    that model's own runtime, as singleCompt would."""
+    setups = [ ( name, ) + setupSingleCompt( name, params )
+            for name, params in models ]
+    moose.reinit()
+    moose.start( max( s[2] for s in setups ) )
+    ret = []
+    for name, tab, runtime in setups:
+        t = np.arange( 0, runtime + 1e-9, tab.dt )
+        ret.append( ( name, t, tab.vector[:len( t )] ) )
+    return ret
 
 def plotBoilerplate( panelTitle, plotPos, xlabel = ''):
     ax = plt.subplot( 8,4,plotPos )
@@ -73,12 +90,13 @@ def plotBoilerplate( panelTitle, plotPos, xlabel = ''):
     return ax
 
 def plotPanelB():
-    panelB = []
     panelBticks = []
-    panelB.append( singleCompt( 'fhn', abstrModelEqns2.makeFHN() ) )
-    panelB.append( singleCompt( 'bis', abstrModelEqns2.makeBis() ) )
-    panelB.append( singleCompt( 'negFB', abstrModelEqns2.makeNegFB() ) )
-    panelB.append( singleCompt( 'negFF', abstrModelEqns2.makeNegFF() ) )
+    # All four models run together in one pass, see batchSingleCompt.
+    panelB = batchSingleCompt( [
+        ( 'fhn', abstrModelEqns2.makeFHN() ),
+        ( 'bis', abstrModelEqns2.makeBis() ),
+        ( 'negFB', abstrModelEqns2.makeNegFB() ),
+        ( 'negFF', abstrModelEqns2.makeNegFF() ) ] )
 
     panelBticks.append( np.arange( 0, 4.00001, 1 ) )
     panelBticks.append( np.arange( 0, 4.00001, 1 ) )
@@ -106,20 +124,20 @@ def runPanelCDEF( name, dist, seqDt, numSpine, seq, stimAmpl ):
         diffusionLength = 1e-6,
         cellProto = [['cell', 'soma']],
         chemProto = [['dend', name]],
-        chemDistrib = [['dend', 'soma', 'install', '1' ]],
-        plotList = [['soma', '1', 'dend' + '/A', 'n', '# of A']],
+        chemDistrib = [[name, 'soma', 'dend', '1', 1e-6 ]],
+        plotList = [['soma', '1', name + '/A', 'n', '# of A']],
     )
     rdes.buildModel()
     #for i in range( 20 ):
         #moose.setClock( i, 0.02 )
-    A = moose.vec( '/model/chem/dend/A' )
-    Z = moose.vec( '/model/chem/dend/Z' )
-    print(moose.element( '/model/chem/dend/A/Adot' ).expr)
-    print(moose.element( '/model/chem/dend/B/Bdot' ).expr)
-    print(moose.element( '/model/chem/dend/Ca/CaStim' ).expr)
-    phase = moose.vec( '/model/chem/dend/phase' )
-    ampl = moose.vec( '/model/chem/dend/ampl' )
-    vel = moose.vec( '/model/chem/dend/vel' )
+    A = moose.vec( '/model/chem/' + name + '/A' )
+    Z = moose.vec( '/model/chem/' + name + '/Z' )
+    print(moose.element( '/model/chem/' + name + '/A/Adot' ).expr)
+    print(moose.element( '/model/chem/' + name + '/B/Bdot' ).expr)
+    print(moose.element( '/model/chem/' + name + '/Ca/CaStim' ).expr)
+    phase = moose.vec( '/model/chem/' + name + '/phase' )
+    ampl = moose.vec( '/model/chem/' + name + '/ampl' )
+    vel = moose.vec( '/model/chem/' + name + '/vel' )
     vel.nInit = 1e-6 * seqDt
     ampl.nInit = stimAmpl
     stride = int( dist ) / numSpine
@@ -135,7 +153,7 @@ def runPanelCDEF( name, dist, seqDt, numSpine, seq, stimAmpl ):
     print(snapshot)
     #snapshot = 26
     moose.start( snapshot )
-    avec = moose.vec( '/model/chem/dend/A' ).n
+    avec = moose.vec( '/model/chem/' + name + '/A' ).n
     moose.start( runtime - snapshot )
     tvec = []
     for i in range( 5 ):
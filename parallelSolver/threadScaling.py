@@ -0,0 +1,249 @@
+'''
+Measures how the multithreaded solvers scale on the Fig2_v4 workloads.
+
+The solvers of the multithreaded moose-core branch (see README) read the
+number of threads from NUM_THREADS. This script reruns a workload in a
+fresh process for each NUM_THREADS in --threads, --repeats times each:
+
+    singleCompt     panel B: the four abstract models, each in a single
+                    compartment with its own Ksolve, run together as
+                    Fig2_v4.plotPanelB runs them.
+    panelCDEF       one row of panels C-F: each of the four models on a
+                    100-voxel dendrite built by rdesigneur, as
+                    Fig2_v4.plotPanelCDEF runs them.
+
+For each thread count it records the wall time of every repeat, the
+speedup of the fastest repeat over the fastest single-threaded one, the
+parallel efficiency (speedup / threads), and the largest difference of
+the output tables from the single-threaded run, relative to the largest
+value of each table. A run whose difference is above --tol is flagged.
+Repeats that crash or pass --timeout are listed with their last line of
+output and left out of the timings. The summary is written as JSON, and --plot saves speedup and efficiency
+curves.
+
+A build without the multithreaded solvers ignores NUM_THREADS, so its
+speedup should stay at 1.
+
+Example:
+    python threadScaling.py --threads 1 2 4 8 --repeats 3 --plot scaling.png
+'''
+
+from __future__ import print_function
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+scriptDir = os.path.dirname( os.path.realpath( __file__ ) )
+workloads = [ 'singleCompt', 'panelCDEF' ]
+
+#############################################
+# Worker side: one run per process
+#############################################
+
+def runSingleCompt():
+    import moose
+    import abstrModelEqns2
+    import Fig2_v4
+    tables = {}
+    for name, t, vec in Fig2_v4.batchSingleCompt( [
+            ( 'fhn', abstrModelEqns2.makeFHN() ),
+            ( 'bis', abstrModelEqns2.makeBis() ),
+            ( 'negFB', abstrModelEqns2.makeNegFB() ),
+            ( 'negFF', abstrModelEqns2.makeNegFF() ) ] ):
+        tables[name] = vec
+    moose.delete( '/model' )
+    return tables
+
+def runPanelCDEF():
+    import abstrModelEqns2
+    import Fig2_v4
+    for name in ( 'FHN', 'Bis', 'NegFB', 'NegFF' ):
+        getattr( abstrModelEqns2, 'make' + name )()
+    Fig2_v4.makePassiveSoma( 'cell', 100e-6, 10e-6 )
+    seq = [ 0, 1, 2, 3, 4 ]
+    tables = {}
+    # Arguments as in Fig2_v4.plotPanelCDEF
+    for name, dist, seqDt, ampl in ( ( 'fhn', 5.0, 0.5, 0.4 ),
+            ( 'bis', 15.0, 2.0, 1.0 ), ( 'negFB', 5.0, 2.0, 1.0 ),
+            ( 'negFF', 5.0, 4.0, 1.0 ) ):
+        dt, tvec, avec = Fig2_v4.runPanelCDEF( name, dist, seqDt, 5, seq, ampl )
+        for i, v in enumerate( tvec ):
+            tables[ '%s_plot%d' % ( name, i ) ] = v
+        tables[ name + '_A' ] = avec
+    return tables
+
+def worker( workload, out ):
+    import moose
+    sys.path.insert( 0, scriptDir )
+    moose.Neutral( '/library' )
+    moose.Neutral( '/model' )
+    t0 = time.time()
+    if workload == 'singleCompt':
+        tables = runSingleCompt()
+    else:
+        moose.delete( '/model' )
+        tables = runPanelCDEF()
+    wallTime = time.time() - t0
+    np.savez( out, wallTime = wallTime, **tables )
+
+#############################################
+# Driver
+#############################################
+
+def runOne( workload, threads, timeout ):
+    """Runs the workload once with NUM_THREADS = threads. Returns the
+    wall time and the output tables, or an error string and None."""
+    fd, out = tempfile.mkstemp( prefix = 'threadScaling_', suffix = '.npz' )
+    os.close( fd )
+    env = dict( os.environ, NUM_THREADS = str( threads ), MPLBACKEND = 'Agg' )
+    cmd = [ sys.executable, os.path.realpath( __file__ ), '--worker',
+            '--workloads', workload, '--out', out ]
+    try:
+        p = subprocess.run( cmd, env = env, cwd = scriptDir, timeout = timeout,
+                stdout = subprocess.PIPE, stderr = subprocess.STDOUT )
+    except subprocess.TimeoutExpired:
+        os.remove( out )
+        return 'TIMEOUT', None
+    try:
+        with np.load( out ) as data:
+            tables = dict( ( k, data[k] ) for k in data.files if k != 'wallTime' )
+            wallTime = float( data['wallTime'] )
+    except ( IOError, ValueError, EOFError ):
+        lines = p.stdout.decode( 'utf8', 'replace' ).strip().splitlines()
+        return lines[-1] if lines else 'exit code %d' % p.returncode, None
+    finally:
+        os.remove( out )
+    return wallTime, tables
+
+def tableDiff( tables, ref ):
+    """Largest difference of any table from ref, relative to the largest
+    absolute value of that reference table."""
+    worst = 0.0
+    for k, r in ref.items():
+        v = tables.get( k )
+        if v is None or len( v ) != len( r ):
+            return float( 'inf' )
+        scale = max( np.abs( r ).max(), 1e-12 )
+        worst = max( worst, float( np.abs( v - r ).max() / scale ) )
+    return worst
+
+def scaleWorkload( workload, threadList, repeats, tol, timeout ):
+    runs = []
+    ref = None
+    for threads in threadList:
+        times = []
+        diffs = []
+        errors = []
+        for i in range( repeats ):
+            wallTime, tables = runOne( workload, threads, timeout )
+            if tables is None:
+                errors.append( wallTime )
+                continue
+            if ref is None:
+                ref = tables
+            times.append( wallTime )
+            diffs.append( tableDiff( tables, ref ) )
+        run = { 'threads': threads, 'wallTimes': times }
+        if errors:
+            run['errors'] = errors
+        if times:
+            run['bestWallTime'] = min( times )
+            run['maxRelDiff'] = max( diffs )
+            run['matches'] = run['maxRelDiff'] <= tol
+        runs.append( run )
+        print( '{:12} threads = {:3d}  {}'.format( workload, threads,
+            'best {:.3f} s, maxRelDiff {:.3g}'.format( run['bestWallTime'],
+            run['maxRelDiff'] ) if times else errors[-1] ) +
+            ( ', {} failed'.format( len( errors ) ) if errors and times else '' ) )
+    base = [ r for r in runs if r['threads'] == threadList[0] and 'bestWallTime' in r ]
+    for r in runs:
+        if base and 'bestWallTime' in r:
+            r['speedup'] = base[0]['bestWallTime'] / r['bestWallTime']
+            r['efficiency'] = r['speedup'] * threadList[0] / r['threads']
+    return runs
+
+def plotScaling( summary, fname ):
+    import matplotlib
+    matplotlib.use( 'Agg' )
+    import matplotlib.pyplot as plt
+    fig, ( ax1, ax2 ) = plt.subplots( 1, 2, figsize = ( 10, 4 ) )
+    maxThreads = 1
+    for workload, runs in summary['workloads'].items():
+        ok = [ r for r in runs if 'speedup' in r ]
+        th = [ r['threads'] for r in ok ]
+        maxThreads = max( th + [ maxThreads ] )
+        ax1.plot( th, [ r['speedup'] for r in ok ], 'o-', label = workload )
+        ax2.plot( th, [ r['efficiency'] for r in ok ], 'o-', label = workload )
+    ax1.plot( [ 1, maxThreads ], [ 1, maxThreads ], 'k:', label = 'ideal' )
+    ax1.set_xlabel( 'NUM_THREADS' )
+    ax1.set_ylabel( 'Speedup' )
+    ax1.legend()
+    ax2.axhline( 1.0, color = 'k', linestyle = ':' )
+    ax2.set_xlabel( 'NUM_THREADS' )
+    ax2.set_ylabel( 'Parallel efficiency' )
+    ax2.set_ylim( 0, 1.2 )
+    fig.tight_layout()
+    fig.savefig( fname )
+    print( 'Wrote ' + fname )
+
+def main():
+    ncores = multiprocessing.cpu_count()
+    defaultThreads = sorted( set( [ 1 ] + [ 2 ** i for i in range( 1, 8 )
+            if 2 ** i <= ncores ] + [ ncores ] ) )
+    parser = argparse.ArgumentParser( description = 'Speedup of the '
+        'multithreaded solvers on the Fig2_v4 workloads.' )
+    parser.add_argument( '--workloads', nargs = '+', default = workloads,
+        choices = workloads )
+    parser.add_argument( '--threads', type = int, nargs = '+',
+        default = defaultThreads,
+        help = 'values of NUM_THREADS (default: powers of 2 up to the cores)' )
+    parser.add_argument( '--repeats', type = int, default = 3 )
+    parser.add_argument( '--tol', type = float, default = 1e-6,
+        help = 'largest relative difference from the single-thread tables' )
+    parser.add_argument( '--timeout', type = float, default = 300,
+        help = 'seconds before a run is abandoned' )
+    parser.add_argument( '--report', '-o', default = 'threadScaling.json' )
+    parser.add_argument( '--plot', default = None,
+        help = 'save speedup and efficiency curves to this image' )
+    parser.add_argument( '--worker', action = 'store_true',
+        help = argparse.SUPPRESS )
+    parser.add_argument( '--out', help = argparse.SUPPRESS )
+    args = parser.parse_args()
+
+    if args.worker:
+        worker( args.workloads[0], args.out )
+        return
+
+    threadList = sorted( args.threads )
+    summary = { 'cpuCount': ncores, 'repeats': args.repeats, 'tol': args.tol,
+            'workloads': {} }
+    for workload in args.workloads:
+        summary['workloads'][workload] = scaleWorkload( workload, threadList,
+                args.repeats, args.tol, args.timeout )
+    with open( args.report, 'w' ) as f:
+        json.dump( summary, f, indent = 2 )
+    print( 'Wrote ' + args.report )
+
+    print( '{:12} {:>7} {:>9} {:>8} {:>10} {:>11}'.format( 'workload',
+        'threads', 'best(s)', 'speedup', 'efficiency', 'maxRelDiff' ) )
+    for workload, runs in summary['workloads'].items():
+        for r in runs:
+            if 'speedup' not in r:
+                print( '{:12} {:7d} {}'.format( workload, r['threads'],
+                    r.get( 'errors', [ 'no reference' ] )[-1] ) )
+                continue
+            print( '{:12} {:7d} {:9.3f} {:8.2f} {:10.2f} {:11.3g}{}'.format(
+                workload, r['threads'], r['bestWallTime'], r['speedup'],
+                r['efficiency'], r['maxRelDiff'],
+                '' if r['matches'] else '  MISMATCH' ) )
+    if args.plot:
+        plotScaling( summary, args.plot )
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,8 @@
 #########################################################################
 
 import math
+import sys
+import multiprocessing
 import pylab
 import numpy
 import moose
@@ -59,7 +61,48 @@ def main():
     In doing a production dose-response series
     you may wish to sample concentration space logarithmically rather than
     linearly.
+
+    Each arm builds its own copy of the model and starts from its own
+    initial point, so the arms are independent and can be run in
+    separate processes::
+
+        python chemDoseResponse.py 3
+
+    runs them on three cores. For this small model a single process is
+    quicker, but the same holds for finer sweeps or bigger models.
     """
+    processes = int( sys.argv[1] ) if len( sys.argv ) > 1 else 1
+    deltaA = 0.002
+    num = 150
+    arms = [
+        # Go up.
+        ( 'b vs a up', 0.1, deltaA, num, None ),
+        # Go down, from the top of the up arm, where only the high
+        # state exists.
+        ( 'b vs a down', 0.1 + num * deltaA, -deltaA, num, None ),
+        # Now aim for the middle. We do this by judiciously choosing a 
+        # start point that should be closer to the unstable fixed point.
+        ( 'b vs a mid', 0.28, -deltaA, 65, 0.15 ),
+    ]
+    if processes > 1:
+        pool = multiprocessing.Pool( processes )
+        results = pool.map( _sweepArm, arms )
+        pool.close()
+        pool.join()
+    else:
+        results = [ _sweepArm( arm ) for arm in arms ]
+
+    for arm, ( avec, bvec ) in zip( arms, results ):
+        pylab.plot( numpy.log10( avec ), numpy.log10( bvec ), label=arm[0] )
+
+    pylab.ylim( [-1.7, 1.2] )
+    pylab.legend()
+    pylab.show()
+
+def setupSteadyState():
+    """ Builds the model with its Ksolve and SteadyState finder. """
+    if moose.exists( '/model' ):
+        moose.delete( '/model' )
     compartment = makeModel()
     ksolve = moose.Ksolve( '/model/compartment/ksolve' )
     stoich = moose.Stoich( '/model/compartment/stoich' )
@@ -72,27 +115,20 @@ def main():
     state.stoich = stoich
     state.convergenceCriterion = 1e-6
     moose.seed( 111 ) # Used when generating the samples in state space
+    return state
 
-    b = moose.element( '/model/compartment/b' )
+def sweepArm( aInit, deltaA, num, bInit = None ):
+    """ Follows one arm of the dose-response curve: steps a.concInit by
+    deltaA num times starting at aInit, finding the steady state at each
+    step. Returns the lists of a and b concentrations.
+    """
+    state = setupSteadyState()
     a = moose.element( '/model/compartment/a' )
-    c = moose.element( '/model/compartment/c' )
-    a.concInit = 0.1
-    deltaA = 0.002
-    num = 150
-    avec = []
-    bvec = []
+    b = moose.element( '/model/compartment/b' )
+    a.concInit = aInit
     moose.reinit()
-
-    # Now go up.
-    for i in range( 0, num ):
-        moose.start( 1.0 ) # Run the model for 1 seconds.
-        state.settle() # This function finds the steady states.
-        avec.append( a.conc )
-        bvec.append( b.conc )
-        a.concInit += deltaA
-        #print i, a.conc, b.conc
-    pylab.plot( numpy.log10( avec ), numpy.log10( bvec ), label='b vs a up' )
-    # Now go down.
+    if bInit is not None:
+        b.conc = bInit
     avec = []
     bvec = []
     for i in range( 0, num ):
@@ -100,29 +136,12 @@ def main():
         state.settle() # This function finds the steady states.
         avec.append( a.conc )
         bvec.append( b.conc )
-        a.concInit -= deltaA
-        #print i, a.conc, b.conc
-
-
-    pylab.plot( numpy.log10( avec ), numpy.log10( bvec ), label='b vs a down' )
-    # Now aim for the middle. We do this by judiciously choosing a 
-    # start point that should be closer to the unstable fixed point.
-    avec = []
-    bvec = []
-    a.concInit = 0.28
-    b.conc = 0.15
-    for i in range( 0, 65 ):
-        moose.start( 1.0 ) # Run the model for 1 seconds.
-        state.settle() # This function finds the steady states.
-        avec.append( a.conc )
-        bvec.append( b.conc )
-        a.concInit -= deltaA
+        a.concInit += deltaA
         #print i, a.conc, b.conc
-    pylab.plot( numpy.log10( avec ), numpy.log10( bvec ), label='b vs a mid' )
+    return avec, bvec
 
-    pylab.ylim( [-1.7, 1.2] )
-    pylab.legend()
-    pylab.show()
+def _sweepArm( arm ):
+    return sweepArm( *arm[1:] )
 
 
 def makeModel():
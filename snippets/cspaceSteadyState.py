@@ -30,9 +30,14 @@
 #########################################################################
 
 import math
+import os
+import sys
 import pylab
 import numpy
 import moose
+sys.path.append( os.path.join( os.path.dirname( os.path.realpath(
+        __file__ ) ), '../util' ) )
+from fixedPoints import explore, settleSample
 print( "[INFO ] Using moose from %s" % moose.__file__ )
 
 # This is required if boost solver used.
@@ -46,34 +51,30 @@ def displayPlots():
     pylab.legend()
     pylab.show()
 
-def getState( ksolve, state ):
-    state.randomInit()
-    moose.start( 0.1 ) # Run the model for 2 seconds.
-    state.settle()
-    '''
-    scale = 1.0 / ( 1e-15 * 6.022e23 )
-    for x in ksolve.nVec[0]:
-            print x * scale,
-    # print ksolve.nVec[0]
-    print state.nIter, state.status, state.stateType, state.nNegEigenvalues, state.nPosEigenvalues, state.solutionStatus
-     '''
-    moose.start( 20.0 ) # Run model for 10 seconds, just for display
+def getState( ksolve, state, display = True ):
+    scale = 1.0 / ( moose.element( '/model/compartment' ).volume * 6.022e23 )
+    ret = settleSample( ksolve, state, scale, 0.1 ) # Run for 0.1 s, settle
+    if display:
+        moose.start( 20.0 ) # Run model for 20 seconds, just for display
+    return ret
 
 
 def main():
     """
 This example sets up the kinetic solver and steady-state finder, on
 a bistable model.
-It looks for the fixed points 100 times, as follows:
+It looks for the fixed points in batches of 10, as follows:
 - Set up the random initial condition that fits the conservation laws
-- Run for 2 seconds. This should not be mathematically necessary, but
+- Run for 0.1 seconds. This should not be mathematically necessary, but
   for obscure numerical reasons it is much more likely that the
   steady state solver will succeed in finding a state.
 - Find the fixed point
-- Print out the fixed point vector and various diagnostics.
-- Run for 10 seconds. This is completely unnecessary, and is done here
-  just so that the resultant graph will show what kind of state has been
-  found.
+- Compare it with the fixed points found so far, and count how often
+  each one is reached.
+- Go on to the next sample without running the model on: the search
+  calls getState with display = False.
+It stops once 20 samples in a row have found no new fixed point, or
+after 100 samples, and prints one line per fixed point.
 After it does all this, the program runs for 100 more seconds on the last
 found fixed point (which turns out to be a saddle node), then
 is hard-switched in the script to the first attractor basin from which
@@ -87,13 +88,12 @@ Looking at the output you will see many features of note:
 - The values found for each of the fixed points match well with the
   values found by running the system to steady-state at the end.
 - There are a large number of failures to find a fixed point. These are
-  found and reported in the diagnostics. They show up on the plot
-  as cases where the 10-second runs are not flat.
+  counted in the summary.
 
-If you wanted to find fixed points in a production model, you would
-not need to do the 10-second runs, and you would need to eliminate the
-cases where the state-finder failed. Then you could identify the good
-points and keep track of how many of each were found.
+To see on the plot what kind of state each sample found, call
+getState with display = True in the search. It then runs the model for
+20 seconds after each sample, which is slow and not needed to find the
+fixed points.
 There is no way to guarantee that all fixed points have been found using
 this algorithm!
 You may wish to sample concentration space logarithmically rather than
@@ -124,8 +124,10 @@ linearly.
     b = moose.element( '/model/compartment/b' )
     c = moose.element( '/model/compartment/c' )
 
-    for i in range( 0, 100 ):
-        getState( ksolve, state )
+    fps = explore( lambda: getState( ksolve, state, display = False ),
+            batchSize = 10, patience = 20, maxSamples = 100 )
+    fps.printTable( [ p.name for p in
+            moose.wildcardFind( '/model/compartment/##[ISA=PoolBase]' ) ] )
 
     moose.start( 100.0 ) # Run the model for 100 seconds.
 
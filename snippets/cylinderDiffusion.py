@@ -18,6 +18,9 @@ import moose
 
 import os
 import signal
+sys.path.append( os.path.join( os.path.dirname( os.path.realpath(
+        __file__ ) ), '../util' ) )
+from voxelIO import getField, setField
 PID = os.getpid()
 
 def doNothing( *args ):
@@ -78,11 +81,9 @@ def makeModel():
 
     print((dsolve.numPools))
     assert( dsolve.numPools == 4 )
-    a.vec[0].concInit = concA
-    b.vec[0].concInit = concA
-    c.vec[0].concInit = concA
-    d.vec.concInit = concA / 5.0
-    d.vec[num-1].concInit = concA
+    setField( [a, b, c], concA, stop = 1 )
+    setField( d, concA / 5.0 )
+    setField( d, concA, start = num - 1 )
 
 def makePlots():
     plt.ion()
@@ -166,20 +167,14 @@ def main():
     d = moose.element( '/model/compartment/d' )
 
     moose.reinit()
-    atot = sum( a.vec.n )
-    btot = sum( b.vec.n )
-    ctot = sum( c.vec.n )
-    dtot = sum( d.vec.n )
+    atot, btot, ctot, dtot = getField( [a, b, c, d], 'n' ).sum( axis = 1 )
     plotlist = makePlots()
     for t in numpy.arange( 0, runtime, plotdt ):
         moose.start( plotdt )
         updatePlots( plotlist, t )
     # moose.start( runtime ) # Run the model
 
-    atot2 = sum( a.vec.n )
-    btot2 = sum( b.vec.n )
-    ctot2 = sum( c.vec.n )
-    dtot2 = sum( d.vec.n )
+    atot2, btot2, ctot2, dtot2 = getField( [a, b, c, d], 'n' ).sum( axis = 1 )
 
     print('Ratio of initial to final total numbers of of a, b, c, d = ')
     print((atot2/atot, btot2/btot, ctot2/ctot, dtot2/dtot))
@@ -11,18 +11,22 @@
 This example sets up the kinetic solver and steady-state finder, on
 a bistable model of a chemical system. The model is set up within the
 script.
-The algorithm calls the steady-state finder 50 times with different
-(randomized) initial conditions, as follows:
+The algorithm calls the steady-state finder in batches of 10, with
+different (randomized) initial conditions, as follows:
 
 * Set up the random initial condition that fits the conservation laws
 * Run for 2 seconds. This should not be mathematically necessary, but
   for obscure numerical reasons it is much more likely that the
   steady state solver will succeed in finding a state.
 * Find the fixed point
-* Print out the fixed point vector and various diagnostics.
-* Run for 10 seconds. This is completely unnecessary, and is done here
-  just so that the resultant graph will show what kind of state has
-  been  found.
+* Compare it with the fixed points found so far, and count how often
+  each one is reached.
+* Go on to the next sample without running the model on: the search
+  calls getState with display = False.
+
+It stops once 20 samples in a row have found no new fixed point, and
+prints one line per fixed point with its type, how often it was found
+and its concentrations.
 
 After it does all this, the program runs for 100 more seconds on the
 last found fixed point (which turns out to be a saddle node), then
@@ -40,13 +44,12 @@ Looking at the output you will see many features of note:
 * The values found for each of the fixed points match well with the
   values found by running the system to steady-state at the end.
 * There are a large number of failures to find a fixed point. These are
-  found and reported in the diagnostics. They show up on the plot
-  as cases where the 10-second runs are not flat.
+  counted in the summary.
 
-If you wanted to find fixed points in a production model, you would
-not need to do the 10-second runs, and you would need to eliminate the
-cases where the state-finder failed. Then you could identify the good
-points and keep track of how many of each were found.
+To see on the plot what kind of state each sample found, call
+getState with display = True in the search. It then runs the model for
+10 seconds after each sample, which is slow and not needed to find the
+fixed points.
 
 There is no way to guarantee that all fixed points have been found
 using this algorithm! If there are points in an obscure corner of state
@@ -61,9 +64,14 @@ linearly.
 from __future__ import print_function
 
 import math
+import os
+import sys
 import pylab
 import numpy
 import moose
+sys.path.append( os.path.join( os.path.dirname( os.path.realpath(
+        __file__ ) ), '../util' ) )
+from fixedPoints import explore, settleSample
 
 def main():
     compartment = makeModel()
@@ -80,8 +88,10 @@ def main():
     state.convergenceCriterion = 1e-6
     moose.seed( 111 ) # Used when generating the samples in state space
 
-    for i in range( 0, 50 ):
-        getState( ksolve, state )
+    fps = explore( lambda: getState( ksolve, state, display = False ),
+            batchSize = 10, patience = 20, maxSamples = 500 )
+    fps.printTable( [ p.name for p in
+            moose.wildcardFind( '/model/compartment/##[ISA=PoolBase]' ) ] )
 
     # Now display the states of the system at more length to compare.
     moose.start( 100.0 ) # Run the model for 100 seconds.
@@ -174,20 +184,17 @@ def displayPlots():
     pylab.legend()
     pylab.show()
 
-def getState( ksolve, state ):
+def getState( ksolve, state, display = True ):
     """ This function finds a steady state starting from a random
     initial condition that is consistent with the stoichiometry rules
-    and the original model concentrations.
+    and the original model concentrations. Returns the concentrations
+    and state type, or None if the steady state solver failed.
     """
     scale = 1.0 / ( 1e-15 * 6.022e23 )
-    state.randomInit() # Randomize init conditions, subject to stoichiometry
-    moose.start( 2.0 ) # Run the model for 2 seconds.
-    state.settle() # This function finds the steady states.
-    for x in ksolve.nVec[0]:
-        print(x * scale, end=' ')
-
-    print(state.nIter, state.status, state.stateType, state.nNegEigenvalues, state.nPosEigenvalues, state.solutionStatus)
-    moose.start( 10.0 ) # Run model for 10 seconds, just for display
+    ret = settleSample( ksolve, state, scale, 2.0 )
+    if display:
+        moose.start( 10.0 ) # Run model for 10 seconds, just for display
+    return ret
 
 
 # Run the 'main' if this script is executed standalone.
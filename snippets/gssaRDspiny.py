@@ -9,13 +9,22 @@
 
 
 import math
+import os
+import sys
 import pylab
 import numpy
 import matplotlib.pyplot as plt
 import moose
+sys.path.append( os.path.join( os.path.dirname( os.path.realpath(
+        __file__ ) ), '../util' ) )
+from frameRecorder import FrameRecorder, headlessArgs
+from runControl import RunController
 
 #diffConst = 10e-12 # m^2/sec
 diffConst = 0.0
+# Pools shown in the animated display, and saved in headless mode.
+displayPools = ( 'compt0/a', 'compt0/b', 'compt1/a', 'compt1/b',
+        'compt2/a', 'compt2/b' )
 def makeModel():
     model = moose.Neutral( '/model' )
     # Make neuronal model. It has no channels, just for geometry
@@ -133,46 +142,22 @@ def makeDisplay():
     plt.xlabel( 'time (seconds)' )
     plt.legend()
 
-    a = moose.vec( '/model/chem/compt0/a' )
-    b = moose.vec( '/model/chem/compt0/b' )
-    line1, = dend.plot( list(range( len( a ))), a.conc, label='a' )
-    line2, = dend.plot( list(range( len( b ))), b.conc, label='b' )
-    dend.set_ylim( 0, 0.6 )
-
-    a = moose.vec( '/model/chem/compt1/a' )
-    b = moose.vec( '/model/chem/compt1/b' )
-    line3, = spine.plot( list(range( len( a ))), a.conc, label='a' )
-    line4, = spine.plot( list(range( len( b ))), b.conc, label='b' )
-    spine.set_ylim( 0, 0.6 )
-
-    a = moose.vec( '/model/chem/compt2/a' )
-    b = moose.vec( '/model/chem/compt2/b' )
-    line5, = psd.plot( list(range( len( a ))), a.conc, label='a' )
-    line6, = psd.plot( list(range( len( b ))), b.conc, label='b' )
-    psd.set_ylim( 0, 0.6 )
+    # Look up the pool vecs once, they are read on every frame.
+    vecs = [ moose.vec( '/model/chem/' + p ) for p in displayPools ]
+    lines = []
+    for ax, i in ( ( dend, 0 ), ( spine, 2 ), ( psd, 4 ) ):
+        for v, name in zip( vecs[i:i+2], ( 'a', 'b' ) ):
+            line, = ax.plot( list(range( len( v ))), v.conc, label=name )
+            lines.append( line )
+        ax.set_ylim( 0, 0.6 )
 
     fig.canvas.draw()
-    return ( timeSeries, dend, spine, psd, fig, line1, line2, line3, line4, line5, line6, timeLabel )
+    return ( timeSeries, dend, spine, psd, fig ) + tuple( lines ) + ( timeLabel, vecs )
 
 def updateDisplay( plotlist ):
-    a = moose.vec( '/model/chem/compt0/a' )
-    b = moose.vec( '/model/chem/compt0/b' )
-    plotlist[5].set_ydata( a.conc )
-    plotlist[6].set_ydata( b.conc )
-    print(('compt0:', min(a.n), max(a.n), min(b.n), max(b.n)))
-
-    a = moose.vec( '/model/chem/compt1/a' )
-    b = moose.vec( '/model/chem/compt1/b' )
-    plotlist[7].set_ydata( a.conc )
-    plotlist[8].set_ydata( b.conc )
-    print(('compt1:', min(a.n), max(a.n), min(b.n), max(b.n)))
-
-    a = moose.vec( '/model/chem/compt2/a' )
-    b = moose.vec( '/model/chem/compt2/b' )
-    plotlist[9].set_ydata( a.conc )
-    plotlist[10].set_ydata( b.conc )
+    for line, v in zip( plotlist[5:11], plotlist[12] ):
+        line.set_ydata( v.conc )
     plotlist[4].canvas.draw()
-    print(('compt2:', min(a.n), max(a.n), min(b.n), max(b.n)))
 
 
 def finalizeDisplay( plotlist, cPlotDt ):
@@ -244,6 +229,22 @@ def makeChemModel( compt ):
     b.diffConst = diffConst
     s.diffConst = 0
 
+def runHeadless( outFile, runtime, animationdt ):
+    """ Runs without display, keeping a frame of the a and b
+    concentrations in the dendrite, spine and PSD voxels every
+    animationdt, and saves them all at the end.
+    """
+    rec = FrameRecorder( dict( ( p.replace( '/', '_' ), '/model/chem/' + p )
+            for p in displayPools ),
+            numFrames = int( round( runtime / animationdt ) ) + 1 )
+    rc = RunController( runtime, chunkTime = animationdt, verbose = False )
+    rc.addHook( rec.capture )
+    rc.reinit()
+    rec.capture( 0.0 )
+    rc.run()
+    rc.report()
+    rec.save( outFile, names = [ 'compt0_a', 'compt0_b' ], ylim = ( 0, 0.6 ) )
+
 def main():
     """
     This example illustrates how to define a kinetic model embedded in
@@ -269,7 +270,12 @@ def main():
         d. time-series plot that appears after the simulation has
            ended. The plot is for the last (rightmost) compartment.
 
+    With ``--headless spiny.npz`` it runs without the display and saves
+    the voxel concentrations of the animated plots to a file, or a movie
+    of the dendrite if the file name ends in .mp4 or .gif.
     """
+    outFile = headlessArgs( 'Reaction-diffusion in a spiny neuron, '
+            'with GSSA in the spines.' )
     chemdt = 0.1 # Tested various dts, this is reasonable.
     diffdt = 0.01
     plotdt = 1
@@ -278,6 +284,10 @@ def main():
 
     makeModel()
 
+    if outFile:
+        runHeadless( outFile, runtime, animationdt )
+        return
+
     plotlist = makeDisplay()
 
     # Schedule the whole lot - autoscheduling already does this.
@@ -0,0 +1,297 @@
+#########################################################################
+## This program is part of 'MOOSE', the
+## Messaging Object Oriented Simulation Environment.
+##           Copyright (C) 2014 Upinder S. Bhalla. and NCBS
+## It is made available under the terms of the
+## GNU Lesser General Public License version 2.1
+## See the file COPYING.LIB for the full notice.
+#########################################################################
+
+'''
+Benchmarks the kinetic solvers on the models in ../genesis.
+
+Each model is loaded with moose.loadModel and run under each solver
+    ee      exponential Euler, no Stoich
+    rk5     Ksolve, Runge-Kutta-Fehlberg (the 'gsl' solver)
+    rk4     Ksolve, 4th order Runge-Kutta
+    lsoda   Ksolve, LSODA
+    gssa    Gsolve
+at each of several clock dts. The solvers are added with
+moose.addChemSolver, as loadModel would. The Ksolve method has to be set
+before the Stoich is built, so the Ksolves are made first. The Ksolve
+methods all step adaptively within each clock dt, so for them the dt
+sets how often the solver is called and the diffusion step in
+multi-compartment models, rather than the integration step; rk4 and rk5
+agree closely at any dt.
+
+Every non-buffered pool is recorded at plotDt, and the run is compared
+with a reference: rk5 at a dt --refFactor times smaller than the
+smallest benchmarked dt. The Ksolve ignores epsAbs and epsRel in current
+builds, so the dt is the only knob the reference has. To show how far
+the reference itself can be trusted, lsoda is run at the same dt and its
+error against the reference is reported as referenceErr, in the maxErr
+column of the reference in the summary; a warning is printed if that is
+above --tol. The error of a run is the largest
+deviation of each pool from the reference, divided by the largest
+reference concentration of that pool (floored at 1e-3 of the largest
+concentration in the model, so that nearly empty pools do not dominate).
+For gssa this measures the size of the noise rather than solver error.
+
+Every run happens in its own process, so a solver that crashes only
+loses that run. Builds of MOOSE whose pools cannot be advanced without a
+solver report ee as UNSUPPORTED. The report records, for each run, the
+wall time, reinit time, clock steps per second of wall time, simulated
+seconds per second, and the maximum and mean relative errors. It is written as JSON, and as
+CSV if the file name ends in .csv. A summary is printed, with the fastest
+run per model whose error is under --tol.
+
+Example:
+    python kineticSolverBenchmark.py --models acc68.g Kholodenko.g \
+            --dt 0.001 0.01 0.1 --runtime 100 -p 4
+'''
+
+from __future__ import print_function
+import argparse
+import csv
+import glob
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing.pool import ThreadPool
+import numpy as np
+
+scriptDir = os.path.dirname( os.path.realpath( __file__ ) )
+genesisDir = os.path.join( scriptDir, '..', 'genesis' )
+solvers = [ 'ee', 'rk5', 'rk4', 'lsoda', 'gssa' ]
+unsupportedExit = 3
+
+#############################################
+# Worker side: one run per process
+#############################################
+
+def setupRun( mfile, solver, dt, plotDt ):
+    """Loads mfile with the solver and returns the Table2s recording the
+    conc of every non-buffered pool."""
+    import moose
+    moose.loadModel( mfile, '/model', 'ee' )
+    if solver == 'ee':
+        if 'process' not in moose.getFieldNames( 'Pool', 'destFinfo' ):
+            print( 'UNSUPPORTED: pools have no process action in this build' )
+            sys.exit( unsupportedExit )
+    elif solver == 'gssa':
+        moose.addChemSolver( '/model', 'gssa' )
+    else:
+        for compt in moose.wildcardFind( '/model/##[ISA=ChemCompt]' ):
+            k = moose.Ksolve( compt.path + '/ksolve' )
+            k.method = solver
+        moose.addChemSolver( '/model', 'gsl' )
+    # kkit files set their own clocks; use ours for all chem ticks.
+    for i in range( 10, 18 ):
+        moose.setClock( i, dt )
+    pools = [ p for p in moose.wildcardFind( '/model/##[ISA=PoolBase]' )
+            if not p.isA[ 'BufPool' ] ]
+    bench = moose.Neutral( '/bench' )
+    tabs = []
+    for i, p in enumerate( pools ):
+        tab = moose.Table2( '/bench/tab%d' % i )
+        moose.connect( tab, 'requestOut', p, 'getConc' )
+        tab.tick = 18
+        tabs.append( tab )
+    moose.setClock( 18, plotDt )
+    return [ p.path for p in pools ], tabs
+
+def worker( mfile, solver, dt, plotDt, runtime, out ):
+    import moose
+    names, tabs = setupRun( mfile, solver, dt, plotDt )
+    t0 = time.time()
+    moose.reinit()
+    reinitTime = time.time() - t0
+    t0 = time.time()
+    moose.start( runtime )
+    wallTime = time.time() - t0
+    n = min( len( t.vector ) for t in tabs ) if tabs else 0
+    conc = np.array( [ t.vector[:n] for t in tabs ] )
+    np.savez( out, names = np.array( names ), conc = conc,
+            reinitTime = reinitTime, wallTime = wallTime )
+
+#############################################
+# Driver
+#############################################
+
+def runOne( mfile, solver, dt, plotDt, runtime, timeout ):
+    """Runs one (model, solver, dt) in a subprocess. Returns its record
+    and the recorded concentrations ( pools x samples ), or None."""
+    record = { 'model': os.path.basename( mfile ), 'solver': solver,
+            'dt': dt, 'runtime': runtime }
+    workdir = tempfile.mkdtemp( prefix = 'kinbench_' )
+    out = os.path.join( workdir, 'run.npz' )
+    cmd = [ sys.executable, os.path.realpath( __file__ ), '--worker',
+            '--models', mfile, '--solvers', solver, '--dt', str( dt ),
+            '--plotDt', str( plotDt ), '--runtime', str( runtime ),
+            '--out', out ]
+    try:
+        p = subprocess.run( cmd, cwd = workdir, timeout = timeout,
+                stdout = subprocess.PIPE, stderr = subprocess.STDOUT )
+    except subprocess.TimeoutExpired:
+        record['status'] = 'TIMEOUT'
+        shutil.rmtree( workdir, ignore_errors = True )
+        return record, None
+    if p.returncode == unsupportedExit:
+        record['status'] = 'UNSUPPORTED'
+        shutil.rmtree( workdir, ignore_errors = True )
+        return record, None
+    if p.returncode != 0 or not os.path.exists( out ):
+        record['status'] = 'FAILED'
+        lines = p.stdout.decode( 'utf8', 'replace' ).strip().splitlines()
+        record['error'] = lines[-1] if lines else 'exit code %d' % p.returncode
+        shutil.rmtree( workdir, ignore_errors = True )
+        return record, None
+    with np.load( out ) as data:
+        conc = data['conc']
+        record['status'] = 'OK'
+        record['numPools'] = int( conc.shape[0] )
+        record['reinitTime'] = float( data['reinitTime'] )
+        record['wallTime'] = float( data['wallTime'] )
+    wall = max( record['wallTime'], 1e-9 )
+    record['stepsPerSec'] = runtime / dt / wall
+    record['simSecPerSec'] = runtime / wall
+    shutil.rmtree( workdir, ignore_errors = True )
+    return record, conc
+
+def relativeError( conc, ref ):
+    """( max, mean ) over pools of the largest deviation from ref,
+    relative to the pool's largest reference conc."""
+    n = min( conc.shape[1], ref.shape[1] )
+    if conc.shape[0] != ref.shape[0] or n == 0:
+        return float( 'nan' ), float( 'nan' )
+    conc = conc[:, :n]
+    ref = ref[:, :n]
+    scale = np.abs( ref ).max( axis = 1 )
+    scale = np.maximum( scale, 1e-3 * max( scale.max(), 1e-30 ) )
+    err = np.abs( conc - ref ).max( axis = 1 ) / scale
+    err = np.where( np.isfinite( err ), err, np.inf )
+    return float( err.max() ), float( err.mean() )
+
+def benchmarkModel( mfile, solverList, dts, plotDt, runtime, timeout,
+        refFactor, tol ):
+    """All runs for one model, reference first."""
+    refDt = min( dts ) / refFactor
+    refRecord, ref = runOne( mfile, 'rk5', refDt, plotDt, runtime, timeout )
+    refRecord['solver'] = 'reference'
+    checkRecord, check = runOne( mfile, 'lsoda', refDt, plotDt, runtime,
+            timeout )
+    if ref is not None and check is not None:
+        refRecord['referenceErr'] = relativeError( check, ref )[0]
+        if not refRecord['referenceErr'] <= tol:
+            print( 'WARNING: {}: rk5 and lsoda differ by {:.3g} at dt = {:g}; '
+                'errors below that are not resolved'.format(
+                refRecord['model'], refRecord['referenceErr'], refDt ) )
+    records = [ refRecord ]
+    for solver, dt in itertools.product( solverList, dts ):
+        record, conc = runOne( mfile, solver, dt, plotDt, runtime, timeout )
+        if conc is not None and ref is not None:
+            record['maxRelErr'], record['meanRelErr'] = \
+                    relativeError( conc, ref )
+        records.append( record )
+    return records
+
+def writeReport( records, fname, args ):
+    if fname.endswith( '.csv' ):
+        keys = [ 'model', 'solver', 'dt', 'runtime', 'status', 'numPools',
+                'wallTime', 'reinitTime', 'stepsPerSec', 'simSecPerSec',
+                'maxRelErr', 'meanRelErr', 'referenceErr', 'error' ]
+        with open( fname, 'w' ) as f:
+            w = csv.DictWriter( f, keys, extrasaction = 'ignore' )
+            w.writeheader()
+            w.writerows( records )
+    else:
+        with open( fname, 'w' ) as f:
+            json.dump( { 'runtime': args.runtime, 'plotDt': args.plotDt,
+                'reference': { 'solver': 'rk5',
+                    'dt': min( args.dt ) / args.refFactor, 'check': 'lsoda' },
+                'runs': records }, f, indent = 2 )
+    print( 'Wrote ' + fname )
+
+def printSummary( records, tol ):
+    print( '{:24} {:>9} {:>7} {:>9} {:>11} {:>10} {:>10}'.format( 'model',
+        'solver', 'dt', 'wall(s)', 'steps/s', 'maxErr', 'meanErr' ) )
+    for r in records:
+        if r['status'] != 'OK':
+            print( '{:24} {:>9} {:7g} {}'.format( r['model'], r['solver'],
+                r['dt'], r['status'] ) )
+            continue
+        print( '{:24} {:>9} {:7g} {:9.3f} {:11.4g} {:10.3g} {:10.3g}'.format(
+            r['model'], r['solver'], r['dt'], r['wallTime'],
+            r['stepsPerSec'], r.get( 'maxRelErr',
+                r.get( 'referenceErr', float( 'nan' ) ) ),
+            r.get( 'meanRelErr', float( 'nan' ) ) ) )
+    print( '\nFastest run with maxRelErr < {:g}:'.format( tol ) )
+    for model in sorted( set( r['model'] for r in records ) ):
+        good = [ r for r in records if r['model'] == model and
+                r['status'] == 'OK' and r.get( 'maxRelErr', np.inf ) < tol ]
+        if good:
+            best = min( good, key = lambda r: r['wallTime'] )
+            print( '{:24} {:>9} dt = {:g}'.format( model, best['solver'],
+                best['dt'] ) )
+        else:
+            print( '{:24} none'.format( model ) )
+
+def main():
+    parser = argparse.ArgumentParser( description =
+        'Benchmark the kinetic solvers on the models in ../genesis.' )
+    parser.add_argument( '--models', nargs = '+', default = None,
+        help = 'model files, or names in ../genesis (default: all .g and '
+        '.cspace files there)' )
+    parser.add_argument( '--solvers', nargs = '+', default = solvers,
+        choices = solvers )
+    parser.add_argument( '--dt', type = float, nargs = '+',
+        default = [ 0.001, 0.01, 0.1 ] )
+    parser.add_argument( '--plotDt', type = float, default = 1.0,
+        help = 'interval at which pools are compared (s)' )
+    parser.add_argument( '--runtime', type = float, default = 100.0 )
+    parser.add_argument( '--tol', type = float, default = 0.01,
+        help = 'maxRelErr below which a run counts as accurate' )
+    parser.add_argument( '--timeout', type = float, default = 600 )
+    parser.add_argument( '--processes', '-p', type = int, default = 1,
+        help = 'models benchmarked at the same time' )
+    parser.add_argument( '--report', '-o', default = 'kineticSolverBenchmark.json',
+        help = 'report file, .json or .csv' )
+    parser.add_argument( '--refFactor', type = float, default = 10.0,
+        help = 'the reference dt is the smallest --dt divided by this' )
+    parser.add_argument( '--worker', action = 'store_true',
+        help = argparse.SUPPRESS )
+    parser.add_argument( '--out', help = argparse.SUPPRESS )
+    args = parser.parse_args()
+
+    if args.worker:
+        worker( args.models[0], args.solvers[0], args.dt[0], args.plotDt,
+                args.runtime, args.out )
+        return
+
+    if args.models is None:
+        models = sorted( glob.glob( os.path.join( genesisDir, '*.g' ) ) +
+                glob.glob( os.path.join( genesisDir, '*.cspace' ) ) )
+    else:
+        models = [ m if os.path.exists( m ) else os.path.join( genesisDir, m )
+                for m in args.models ]
+    models = [ os.path.realpath( m ) for m in models ]
+
+    t0 = time.time()
+    def bench( mfile ):
+        print( 'Benchmarking ' + os.path.basename( mfile ) )
+        return benchmarkModel( mfile, args.solvers, args.dt, args.plotDt,
+                args.runtime, args.timeout, args.refFactor, args.tol )
+    pool = ThreadPool( args.processes )
+    records = [ r for recs in pool.map( bench, models ) for r in recs ]
+    pool.close()
+    print( 'Benchmark took {:.1f} s'.format( time.time() - t0 ) )
+    writeReport( records, args.report, args )
+    printSummary( records, args.tol )
+
+if __name__ == '__main__':
+    main()
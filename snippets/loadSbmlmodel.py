@@ -51,6 +51,8 @@ import pylab
 
 import moose
 from moose.chemUtil.add_Delete_ChemicalSolver import *
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '../util'))
+from modelCache import loadModelCached
 
 def main():
     """
@@ -84,8 +86,10 @@ If someone wants to load anyother file then
     else:
         runtime = float(sys.argv[2])
     sbmlId = moose.element('/')
-    # Loading the sbml file into MOOSE, models are loaded in path/model
-    sbmlId = moose.readSBML(filepath,'/sbml')
+    # Loading the sbml file into MOOSE, models are loaded in path/model.
+    # The SBML reader is slow, so repeat loads of the same file come from
+    # the compiled model cache, see util/modelCache.py
+    sbmlId = loadModelCached(filepath,'/sbml','ee')
     if isinstance(sbmlId, (list, tuple)):
         print(sbmlId)
 
@@ -3,7 +3,10 @@ import numpy
 import pylab
 import moose
 import time
-import sys
+import os
+sys.path.append( os.path.join( os.path.dirname( os.path.realpath(
+        __file__ ) ), '../util' ) )
+from voxelIO import voxelCoords, applyProfile
 
 def main():
     """
@@ -47,8 +50,8 @@ def main():
     stoich.reacSystemPath = '/cylinder/##'
 
     #initialize
-    x = numpy.arange( 0, compt.x1, compt.diffLength )
-    c.vec.nInit = [ (q < 0.2 * compt.x1) for q in x ]
+    x = voxelCoords( compt )[0]
+    applyProfile( c, lambda x, y, z: x < 0.2 * compt.x1, compt, 'nInit' )
 
     # Run and plot it.
     moose.reinit()
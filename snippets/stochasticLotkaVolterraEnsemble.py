@@ -0,0 +1,192 @@
+#########################################################################
+## This program is part of 'MOOSE', the
+## Messaging Object Oriented Simulation Environment.
+##           Copyright (C) 2013 Upinder S. Bhalla. and NCBS
+## It is made available under the terms of the
+## GNU Lesser General Public License version 2.1
+## See the file COPYING.LIB for the full notice.
+#########################################################################
+
+from __future__ import print_function
+import os
+import sys
+import argparse
+import multiprocessing
+import time
+import numpy
+import pylab
+import moose
+sys.path.append( os.path.join( os.path.dirname( os.path.realpath(
+        __file__ ) ), '../util' ) )
+from ensemble import makeEnsembleMesh, Histogram
+from runControl import RunController
+
+runtime = 138.0
+countBins = numpy.arange( 0, 1001, 10 )
+
+def makeModel( numTrials, volume = 1e-15 ):
+    """ The Lotka-Volterra system of stochasticLotkaVolterra.py, written
+    as mass-action reactions so that the GSSA solver handles it without
+    rates that change under it::
+
+            x ---> 2x       Kf = alpha
+            x + y ---> 2y   Kf = beta = delta, per molecule
+            y ---> z        Kf = gamma
+
+    The compartment is split into numTrials voxels, each an independent
+    trial.
+    """
+    model = moose.Neutral( '/model' )
+    lotka = moose.CubeMesh( '/model/lotka' )
+    makeEnsembleMesh( lotka, numTrials, volume )
+
+    x = moose.Pool( '/model/lotka/x' )
+    y = moose.Pool( '/model/lotka/y' )
+    z = moose.BufPool( '/model/lotka/z' ) # Dummy molecule.
+    birth = moose.Reac( '/model/lotka/birth' )
+    predation = moose.Reac( '/model/lotka/predation' )
+    death = moose.Reac( '/model/lotka/death' )
+
+    # Parameters, as in stochasticLotkaVolterra.py
+    alpha = 1.0
+    beta = 0.01
+    gamma = 1.0
+    x.nInit = 200.0
+    y.nInit = 100.0
+    z.nInit = 0.0
+    moose.connect( birth, 'sub', x, 'reac' )
+    moose.connect( birth, 'prd', x, 'reac' )
+    moose.connect( birth, 'prd', x, 'reac' )
+    moose.connect( predation, 'sub', x, 'reac' )
+    moose.connect( predation, 'sub', y, 'reac' )
+    moose.connect( predation, 'prd', y, 'reac' )
+    moose.connect( predation, 'prd', y, 'reac' )
+    moose.connect( death, 'sub', y, 'reac' )
+    moose.connect( death, 'prd', z, 'reac' )
+
+    # The rates in # units depend on the substrates, so set them last.
+    birth.numKf = alpha
+    predation.numKf = beta
+    death.numKf = gamma
+    for r in ( birth, predation, death ):
+        r.Kb = 0
+
+    gsolve = moose.Gsolve( '/model/lotka/gsolve' )
+    stoich = moose.Stoich( '/model/lotka/stoich' )
+    stoich.compartment = lotka
+    stoich.ksolve = gsolve
+    stoich.reacSystemPath = '/model/lotka/##'
+
+def runBlock( numTrials, runtime, sampleDt, seed ):
+    """Runs numTrials trials. Returns the extinction times of x and y
+    (inf if it survived) and the histograms of x and y."""
+    if moose.exists( '/model' ):
+        moose.delete( '/model' )
+    makeModel( numTrials )
+    moose.seed( seed )
+    x = moose.vec( '/model/lotka/x' )
+    y = moose.vec( '/model/lotka/y' )
+    extinct = [ numpy.full( numTrials, numpy.inf ) for i in ( 0, 1 ) ]
+    histX = Histogram( countBins )
+    histY = Histogram( countBins )
+    def sample( t ):
+        n = [ x.n, y.n ]
+        alive = numpy.isinf( extinct[0] ) & numpy.isinf( extinct[1] )
+        histX.update( n[0][alive] )
+        histY.update( n[1][alive] )
+        for i in ( 0, 1 ):
+            extinct[i][ alive & ( n[i] == 0 ) ] = t
+        # Once either species is gone the trial is over. Without
+        # predators the prey grow exponentially, so clear out the trial
+        # rather than let it swamp the solver.
+        over = ~alive | ( n[0] == 0 ) | ( n[1] == 0 )
+        if over.any():
+            n[0][over] = 0
+            n[1][over] = 0
+            x.n = n[0]
+            y.n = n[1]
+    rc = RunController( runtime, chunkTime = sampleDt, verbose = False )
+    rc.addHook( sample )
+    rc.reinit()
+    rc.run()
+    return extinct, histX, histY
+
+def _runBlock( args ):
+    return runBlock( *args )
+
+def main():
+    """
+    The stochasticLotkaVolterra example shows a single stochastic run of
+    a Lotka-Volterra system, in which one species eventually goes extinct.
+    This example asks how long that takes, over many trials. The model is
+    the same system written as mass-action reactions. Its compartment is
+    split into one voxel per trial, so one Gsolve advances all the trials
+    together, and blocks of trials with distinct seeds run in parallel
+    worker processes.
+
+    Every sampleDt the script checks which trials have lost their prey
+    (x) or predators (y), and adds the populations of the surviving trials
+    to running histograms. It prints the fraction of trials in which each
+    species went extinct and the median extinction time, then plots the
+    survival curve and the population histograms.
+
+    Run using:
+
+        ``python stochasticLotkaVolterraEnsemble.py --trials 1000 -p 4``
+    """
+    parser = argparse.ArgumentParser( description = 'Extinction times '
+            'of the stochastic Lotka-Volterra system over many trials.' )
+    parser.add_argument( '--trials', type = int, default = 1000 )
+    parser.add_argument( '--runtime', type = float, default = runtime )
+    parser.add_argument( '--sampleDt', type = float, default = 0.1,
+            help = 'interval at which extinction is checked (s)' )
+    parser.add_argument( '--blocks', type = int, default = None,
+            help = 'blocks of trials (default: one per process)' )
+    parser.add_argument( '--processes', '-p', type = int, default = None,
+            help = 'worker processes (default: all cores)' )
+    parser.add_argument( '--seed', type = int, default = 1 )
+    args = parser.parse_args()
+    numBlocks = args.blocks or args.processes or multiprocessing.cpu_count()
+
+    sizes = numpy.diff( numpy.linspace( 0, args.trials, numBlocks + 1 ).astype( int ) )
+    tasks = [ ( n, args.runtime, args.sampleDt, args.seed + i )
+            for i, n in enumerate( sizes ) if n > 0 ]
+    t0 = time.time()
+    if args.processes == 1:
+        results = [ _runBlock( t ) for t in tasks ]
+    else:
+        pool = multiprocessing.Pool( args.processes )
+        results = pool.map( _runBlock, tasks )
+        pool.close()
+        pool.join()
+    extinct = [ numpy.concatenate( [ r[0][i] for r in results ] ) for i in ( 0, 1 ) ]
+    histX = results[0][1]
+    histY = results[0][2]
+    for r in results[1:]:
+        histX.merge( r[1] )
+        histY.merge( r[2] )
+    print( '{} trials of {} s in {:.2f} s wall clock'.format(
+        args.trials, args.runtime, time.time() - t0 ) )
+    for name, e in zip( ( 'x (prey)', 'y (predator)' ), extinct ):
+        gone = numpy.isfinite( e )
+        print( '{:13} extinct in {:.3f} of trials, median time {:.4g} s'.format(
+            name, gone.mean(), numpy.median( e[gone] ) if gone.any() else numpy.nan ) )
+
+    pylab.subplot( 2, 1, 1 )
+    t = numpy.arange( 0, args.runtime + args.sampleDt, args.sampleDt )
+    first = numpy.minimum( extinct[0], extinct[1] )
+    pylab.plot( t, [ ( first > tt ).mean() for tt in t ] )
+    pylab.xlabel( 'Time (s)' )
+    pylab.ylabel( 'Fraction with both species' )
+    pylab.subplot( 2, 1, 2 )
+    centres = ( countBins[1:] + countBins[:-1] ) / 2.0
+    pylab.plot( centres, histX.density(), label = 'x' )
+    pylab.plot( centres, histY.density(), label = 'y' )
+    pylab.xlabel( '# molecules' )
+    pylab.ylabel( 'Probability density' )
+    pylab.legend()
+    pylab.show()
+
+# Run the 'main' if this script is executed standalone.
+if __name__ == '__main__':
+    main()
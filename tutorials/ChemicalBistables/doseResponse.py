@@ -2,9 +2,16 @@
 ## Author: Sahil Moza
 ## June 26, 2014
 
+import os
+import sys
+import argparse
+import multiprocessing
 import moose
 import numpy as np
 from matplotlib import pyplot as plt
+scriptDir = os.path.dirname( os.path.realpath( __file__ ) )
+sys.path.append( os.path.join( scriptDir, '../../util' ) )
+from fixedPoints import FixedPointSet
 
 def setupSteadyState(simdt,plotDt):
 
@@ -42,7 +49,7 @@ def parseModelName(fileName):
     return directory, prefix, suffix
 
 # Solve for the steady state
-def getState( ksolve, state, vol):
+def getState( ksolve, state, vol, display = True ):
       scale = 1.0 / ( vol * 6.022e23 )
       moose.reinit()
       state.randomInit() # Removing random initial condition to systematically make Dose reponse curves.
@@ -54,17 +61,76 @@ def getState( ksolve, state, vol):
       #print a
       for x in ksolve.nVec[0]:
           vector.append( x * scale)
-      moose.start( 10.0 ) # Run model for 10 seconds, just for display
+      if display:
+          moose.start( 10.0 ) # Run model for 10 seconds, just for display
       failedSteadyState = any([np.isnan(x) for x in vector])
       
       if not (failedSteadyState):
            return state.stateType, state.solutionStatus, a, vector
 
+# Each worker process loads the model once and then handles many doses.
+_worker = {}
+
+def initWorker( model, dosePath ):
+    moose.loadModel( model, 'model', 'ee' )
+    ksolve, state = setupSteadyState( 1e-2, 1 )
+    enz = moose.element( dosePath )
+    _worker.update( ksolve = ksolve, state = state, enz = enz,
+            init = float( enz.kcat ),
+            vol = moose.element( '/model/kinetics' ).volume )
+
+def findFixedPoints( scale, iterInit = 100, patience = 20, maxFixedPoints = None ):
+    """Returns the distinct fixed points at one dose as a list of
+    ( scale, stateType, concA, count ), sampling up to iterInit random
+    initial conditions but stopping once patience samples in a row find
+    nothing new."""
+    w = _worker
+    w['enz'].kcat = w['init'] * scale
+    fps = FixedPointSet()
+    concA = []
+    for num in range( iterInit ):
+        ret = getState( w['ksolve'], w['state'], w['vol'], display = False )
+        if ret is None or ret[1] != 0:
+            fps.addFailure()
+        else:
+            stateType, solStatus, a, vector = ret
+            i, isNew = fps.add( vector, stateType )
+            if isNew:
+                concA.append( a )
+        if fps.converged( patience, maxFixedPoints ):
+            break
+    return [ ( scale, t, a, n ) for t, a, n in
+            zip( fps.stateTypes, concA, fps.counts ) ]
+
+def _findFixedPoints( args ):
+    return findFixedPoints( *args )
+
+def doseResponse( model, dosePath, scales, iterInit = 100, patience = 20,
+        maxFixedPoints = None, processes = None ):
+    """Fixed points for each dose scale factor, computed in parallel
+    worker processes. Returns a list of ( scale, stateType, concA, count )."""
+    args = [ ( s, iterInit, patience, maxFixedPoints ) for s in scales ]
+    pool = multiprocessing.Pool( processes, initWorker, ( model, dosePath ) )
+    try:
+        results = pool.map( _findFixedPoints, args, chunksize = 1 )
+    finally:
+        pool.close()
+        pool.join()
+    return [ r for doseResults in results for r in doseResults ]
+
 
 def main():
-    # Setup parameters for simulation and plotting
-    simdt= 1e-2
-    plotDt= 1
+    parser = argparse.ArgumentParser( description = 'Dose-response curve '
+            'of a bistable model, one dose point per worker process.' )
+    parser.add_argument( '--processes', '-p', type = int, default = None,
+            help = 'worker processes (default: all cores)' )
+    parser.add_argument( '--patience', type = int, default = 20,
+            help = 'stop sampling a dose after this many samples in a row '
+            'find no new fixed point' )
+    parser.add_argument( '--maxFixedPoints', type = int, default = 3,
+            help = 'stop sampling a dose once this many fixed points are '
+            'found; a bistable system has 3' )
+    args = parser.parse_args()
 
     # Factors to change in the dose concentration in log scale
     factorExponent = 10  ## Base: ten raised to some power.
@@ -75,42 +141,30 @@ def main():
 
     # Load Model and set up the steady state solver.
     # model = sys.argv[1] # To load model from a file.
-    model = './19085.cspace'
-    modelPath, modelName, modelType = parseModelName(model)
-    outputDir = modelPath
-    
-    modelId = moose.loadModel(model, 'model', 'ee')
+    model = os.path.join( scriptDir, '19085.cspace' )
     dosePath = '/model/kinetics/b/DabX' # The dose entity
-
-    ksolve, state = setupSteadyState( simdt, plotDt)
-    vol = moose.element( '/model/kinetics' ).volume
     iterInit = 100
-    solutionVector = []
-    factorArr = []
-    
-    enz = moose.element(dosePath)
-    init = float(enz.kcat) # Dose parameter
-    
+
     # Change Dose here to .
-    for factor in range(factorBegin, factorEnd, factorStepsize ):
-        scale = factorExponent ** (factor/factorScale) 
-        enz.kcat = init * scale     
-        print( "scale={:.3f}\tkcat={:.3f}".format( scale, enz.kcat) )
-        for num in range(iterInit):
-            stateType, solStatus, a, vector = getState( ksolve, state, vol)
-            if solStatus == 0:
-                #solutionVector.append(vector[0]/sum(vector))
-                solutionVector.append(a)
-                factorArr.append(scale)   
-                
-    joint = np.array([factorArr, solutionVector])
-    joint = joint[:,joint[1,:].argsort()]
+    scales = [ factorExponent ** (factor/factorScale) for factor in
+            range(factorBegin, factorEnd, factorStepsize ) ]
+    results = doseResponse( model, dosePath, scales, iterInit,
+            args.patience, args.maxFixedPoints, args.processes )
+    for scale, stateType, a, count in results:
+        print( "scale={:.3f}\tstateType={}\tconcA={:.3g}\tfound {} times".format(
+            scale, stateType, a, count ) )
+
+    # stateType 0 is a stable fixed point, the others are unstable.
+    joint = np.array( [ [r[0], r[2]] for r in results if r[1] == 0 ] ).T
+    unstable = np.array( [ [r[0], r[2]] for r in results if r[1] != 0 ] ).T
     
     # Plot dose response. Remove NaN from the values else plotting will fail.
     ax = plt.subplot()
     # plt.semilogx was failing. not sure why. That is why this convoluted
     # approach.
-    ax.plot( joint[0,:], joint[1,:] , marker="o", label = 'concA')
+    ax.plot( joint[0,:], joint[1,:] , 'o', label = 'concA, stable')
+    if len( unstable ):
+        ax.plot( unstable[0,:], unstable[1,:] , 'x', label = 'concA, unstable')
     ax.set_xscale( 'log' )
     plt.xlabel('Dose')
     plt.ylabel('Response')
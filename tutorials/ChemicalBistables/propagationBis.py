@@ -44,11 +44,16 @@ moves to the right.
 """
 
 import math
+import os
 import numpy
 import matplotlib.pyplot as plt
 import matplotlib.image as mpimg
 import moose
 import sys
+sys.path.append( os.path.join( os.path.dirname( os.path.realpath(
+        __file__ ) ), '../../util' ) )
+from frameRecorder import FrameRecorder, headlessArgs
+from runControl import RunController
 
 def makeModel():
                 # create container for model
@@ -103,11 +108,56 @@ def makeModel():
                 stoich.reacSystemPath = "/model/kinetics/##"
                 b.vec[num-1].concInit *= 1.01 # Break symmetry.
 
+def swapLeftHalf( b, c ):
+                """ Exchanges the concs of b and c in the left half of the
+                cylinder.
+                """
+                half = b.numData//2
+                bconc = b.vec.conc
+                cconc = c.vec.conc
+                bconc[:half], cconc[:half] = cconc[:half].copy(), bconc[:half].copy()
+                b.vec.conc = bconc
+                c.vec.conc = cconc
+
+def runHeadless( outFile, runtime, newruntime, displayInterval ):
+                """ Runs both stages without display, keeping a frame of the
+                a, b and c concentrations along the cylinder every
+                displayInterval, and saves them all at the end.
+                """
+                rec = FrameRecorder( { 'a': '/model/kinetics/a',
+                        'b': '/model/kinetics/b', 'c': '/model/kinetics/c' },
+                        numFrames = int( round( ( runtime + newruntime ) /
+                            displayInterval ) ) + 1 )
+                rc = RunController( runtime, chunkTime = displayInterval,
+                        verbose = False )
+                rc.addHook( rec.capture )
+                rc.reinit()
+                rec.capture( 0.0 )
+                rc.run()
+                swapLeftHalf( moose.element( '/model/kinetics/b' ),
+                        moose.element( '/model/kinetics/c' ) )
+                # Carry on from here, without a reinit.
+                rc = RunController( newruntime, chunkTime = displayInterval,
+                        verbose = False )
+                rc.addHook( lambda t: rec.capture( t + runtime ) )
+                rc.run()
+                rec.save( outFile, ylim = ( 0, 0.001 ) )
+
 def main():
+                """
+                Runs with an animated display. With ``--headless prop.npz`` it
+                instead runs at solver speed and saves the concentration
+                profiles to a file, or a movie if the file name ends in .mp4
+                or .gif.
+                """
+                outFile = headlessArgs( 'Propagation of bistable state flips.' )
                 runtime = 100
                 displayInterval = 2
                 makeModel()
                 dsolve = moose.element( '/model/dsolve' )
+                if outFile:
+                    runHeadless( outFile, runtime, 200, displayInterval )
+                    return
                 moose.reinit()
                 #moose.start( runtime ) # Run the model for 10 seconds.
 
@@ -147,10 +197,7 @@ def main():
                     fig.canvas.flush_events()
 
                 plt.title( 'Swapping concs of b and c in the left half the cylinder. Boundary slowly moves right due to taper.')
-                for i in range( b.numData//2 ):
-                    temp = b.vec[i].conc
-                    b.vec[i].conc = c.vec[i].conc
-                    c.vec[i].conc = temp
+                swapLeftHalf( b, c )
 
                 newruntime = 200
                 for t in range( displayInterval, newruntime, displayInterval ):
@@ -0,0 +1,183 @@
+#########################################################################
+## This program is part of 'MOOSE', the
+## Messaging Object Oriented Simulation Environment.
+##           Copyright (C) 2013 Upinder S. Bhalla. and NCBS
+## It is made available under the terms of the
+## GNU Lesser General Public License version 2.1
+## See the file COPYING.LIB for the full notice.
+#########################################################################
+
+from __future__ import print_function
+import os
+import sys
+import argparse
+import multiprocessing
+import time
+import numpy
+import moose
+scriptDir = os.path.dirname( os.path.realpath( __file__ ) )
+sys.path.append( os.path.join( scriptDir, '../../util' ) )
+from ensemble import makeEnsembleMesh, SwitchStats, Histogram
+from runControl import RunController
+from scaleVolumes import makeModel
+
+concBins = numpy.linspace( 0, 1.2, 61 )
+
+def runBlock( vol, numTrials, runtime, sampleDt, seed ):
+    """Runs numTrials independent GSSA trajectories of the bistable at
+    volume vol, one per voxel of a single Gsolve. Returns the switching
+    statistics and the histograms of a and b."""
+    if moose.exists( '/model' ):
+        moose.delete( '/model' )
+    makeModel()
+    compt = moose.element( '/model/compartment' )
+    makeEnsembleMesh( compt, numTrials, vol )
+    gsolve = moose.Gsolve( '/model/compartment/gsolve' )
+    stoich = moose.Stoich( '/model/compartment/stoich' )
+    stoich.compartment = compt
+    stoich.ksolve = gsolve
+    stoich.reacSystemPath = "/model/compartment/##"
+    moose.setClock( 5, 1.0 ) # clock for the solver
+    moose.useClock( 5, '/model/compartment/gsolve', 'process' )
+    moose.seed( seed )
+    a = moose.vec( '/model/compartment/a' )
+    b = moose.vec( '/model/compartment/b' )
+
+    # All trials start with a high. The a-high and b-high states have
+    # a at about 1 and 0.2 mM, so the thresholds sit between them.
+    switches = SwitchStats( numTrials, lo = 0.4, hi = 0.7, initialState = 1 )
+    histA = Histogram( concBins )
+    histB = Histogram( concBins )
+    def sample( t ):
+        concA = a.conc
+        switches.update( t, concA )
+        histA.update( concA )
+        histB.update( b.conc )
+    rc = RunController( runtime, chunkTime = sampleDt, verbose = False )
+    rc.addHook( sample )
+    rc.reinit()
+    rc.run()
+    return vol, switches, histA, histB
+
+def _runBlock( args ):
+    return runBlock( *args )
+
+def runEnsemble( volumes, numTrials, runtime, sampleDt = 1.0, numBlocks = 1,
+        seed = 11111, processes = None ):
+    """Splits the numTrials trials at each volume into numBlocks blocks
+    with distinct seeds, and runs the blocks in a pool. Yields ( vol,
+    switches, histA, histB ) for each volume as soon as all its blocks
+    are done."""
+    tasks = []
+    for i, vol in enumerate( volumes ):
+        sizes = numpy.diff( numpy.linspace( 0, numTrials, numBlocks + 1 ).astype( int ) )
+        for j, n in enumerate( sizes ):
+            if n > 0:
+                tasks.append( ( vol, n, runtime, sampleDt,
+                    seed + i * numBlocks + j ) )
+    remaining = dict( ( vol, sum( 1 for t in tasks if t[0] == vol ) )
+            for vol in volumes )
+    merged = {}
+    if processes == 1:
+        results = map( _runBlock, tasks )
+        pool = None
+    else:
+        pool = multiprocessing.Pool( processes )
+        results = pool.imap_unordered( _runBlock, tasks )
+    for vol, switches, histA, histB in results:
+        if vol in merged:
+            s, ha, hb = merged[vol]
+            merged[vol] = ( s.merge( switches ), ha.merge( histA ),
+                    hb.merge( histB ) )
+        else:
+            merged[vol] = ( switches, histA, histB )
+        remaining[vol] -= 1
+        if remaining[vol] == 0:
+            yield ( vol, ) + merged.pop( vol )
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+def main():
+    """
+    This example runs the bistable of scaleVolumes.py as an ensemble of
+    independent stochastic trials at each volume, to look at
+    noise-induced switching. Rather than run one trajectory after
+    another, the CubeMesh is split into one voxel per trial and the
+    Gsolve advances them all together. There is no diffusion between
+    the voxels, so each is a separate trajectory. The trials for each
+    volume are divided into blocks with distinct seeds, which run in
+    parallel worker processes.
+
+    There is no perturbation here: every trial starts in the state with
+    high a and is left alone. Every sampleDt the script classifies each
+    trial as a-high or b-high and records its switches, and adds a and b
+    to running histograms. For each volume it prints the switching rate,
+    the fraction of trials that switched, the median first switch time
+    and the median dwell time in each state, and it plots the histograms.
+
+    Run using:
+
+        ``python scaleVolumesEnsemble.py --trials 1000 -p 4``
+    """
+    parser = argparse.ArgumentParser( description = 'Noise-induced '
+            'switching of the bistable, many GSSA trials per volume.' )
+    parser.add_argument( '--volumes', type = float, nargs = '+',
+            default = [ 1e-21, 3e-22, 1e-22, 3e-23, 1e-23 ],
+            help = 'compartment volumes (m^3)' )
+    parser.add_argument( '--trials', type = int, default = 500,
+            help = 'trials per volume' )
+    parser.add_argument( '--runtime', type = float, default = 300.0 )
+    parser.add_argument( '--sampleDt', type = float, default = 1.0,
+            help = 'interval at which the trials are classified (s)' )
+    parser.add_argument( '--blocks', type = int, default = None,
+            help = 'blocks of trials per volume (default: one per process)' )
+    parser.add_argument( '--processes', '-p', type = int, default = None,
+            help = 'worker processes (default: all cores)' )
+    parser.add_argument( '--seed', type = int, default = 11111 )
+    parser.add_argument( '--out', '-o', default = None,
+            help = 'save the statistics and histograms to this .npz file' )
+    args = parser.parse_args()
+    numBlocks = args.blocks or args.processes or multiprocessing.cpu_count()
+
+    print( '{:>10} {:>7} {:>11} {:>9} {:>11} {:>9} {:>9}'.format( 'vol(um^3)',
+        'trials', 'switch/s', 'switched', 'firstSw(s)', 'dwellA(s)', 'dwellB(s)' ) )
+    t0 = time.time()
+    saved = {}
+    for vol, switches, histA, histB in runEnsemble( args.volumes, args.trials,
+            args.runtime, args.sampleDt, numBlocks, args.seed, args.processes ):
+        s = switches.summary()
+        print( '{:10.3g} {:7d} {:11.3g} {:9.3f} {:11.4g} {:9.4g} {:9.4g}'.format(
+            vol * 1e18, s['numTrials'], s['switchRate'], s['fracSwitched'],
+            s['medianFirstSwitch'], s['medianDwellHigh'], s['medianDwellLow'] ) )
+        saved[vol] = ( switches, histA, histB )
+    wall = time.time() - t0
+    print( '{} trials of {} s in {:.2f} s wall clock'.format(
+        args.trials * len( args.volumes ), args.runtime, wall ) )
+
+    if args.out:
+        data = { 'volumes': numpy.array( sorted( saved ) ), 'bins': concBins }
+        for i, vol in enumerate( sorted( saved ) ):
+            switches, histA, histB = saved[vol]
+            data[ 'histA%d' % i ] = histA.counts
+            data[ 'histB%d' % i ] = histB.counts
+            data[ 'firstSwitch%d' % i ] = switches.firstSwitch
+            data[ 'dwellHigh%d' % i ] = numpy.array( switches.dwellTimes[1] )
+            data[ 'dwellLow%d' % i ] = numpy.array( switches.dwellTimes[0] )
+        numpy.savez( args.out, **data )
+        print( 'Wrote ' + args.out )
+
+    import pylab
+    centres = ( concBins[1:] + concBins[:-1] ) / 2.0
+    for vol in sorted( saved, reverse = True ):
+        pylab.plot( centres, saved[vol][1].density(),
+                label = 'a, vol = {:.3g} um^3'.format( vol * 1e18 ) )
+    pylab.xlabel( 'Conc (mM)' )
+    pylab.ylabel( 'Probability density' )
+    pylab.yscale( 'log' )
+    pylab.legend()
+    pylab.show()
+
+# Run the 'main' if this script is executed standalone.
+if __name__ == '__main__':
+    main()
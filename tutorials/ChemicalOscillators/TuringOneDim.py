@@ -9,10 +9,17 @@
 
 
 import math
+import os
+import sys
 import numpy
 import matplotlib.pyplot as plt
 import matplotlib.image as mpimg
 import moose
+sys.path.append( os.path.join( os.path.dirname( os.path.realpath(
+        __file__ ) ), '../../util' ) )
+from frameRecorder import FrameRecorder, headlessArgs
+from runControl import RunController
+from voxelIO import setField
 
 def makeModel():
     """
@@ -107,10 +114,9 @@ def makeModel():
     stoich.dsolve = dsolve
     stoich.reacSystemPath = "/model/compartment/##"
     assert( dsolve.numPools == 3 )
-    a.vec.concInit = [0.1]*num
-    a.vec[0].concInit *= 1.2 # slight perturbation at one end.
-    b.vec.concInit = [0.1]*num
-    s.vec.concInit = [1]*num
+    setField( [a, b], 0.1 )
+    setField( a, 0.12, stop = 1 ) # slight perturbation at one end.
+    setField( s, 1 )
 
 def displayPlots():
     a = moose.element( '/model/compartment/a' )
@@ -121,11 +127,37 @@ def displayPlots():
     plt.legend()
     plt.show()
 
+def runHeadless( outFile, runtime, displayInterval ):
+    """ Runs without display, keeping a frame of the a, b and s
+    concentrations along the cylinder every displayInterval, and saves
+    them all at the end.
+    """
+    rec = FrameRecorder( { 'a': '/model/compartment/a',
+            'b': '/model/compartment/b', 's': '/model/compartment/s' },
+            numFrames = int( round( runtime / displayInterval ) ) + 1 )
+    rc = RunController( runtime, chunkTime = displayInterval, verbose = False )
+    rc.addHook( rec.capture )
+    rc.reinit()
+    rec.capture( 0.0 )
+    rc.run()
+    rc.report()
+    rec.save( outFile, names = [ 'a', 'b' ], ylim = ( 0, 0.5 ) )
+
 def main():
+    """
+    Runs the Turing pattern with an animated display. With
+    ``--headless turing.npz`` it instead runs at solver speed and saves
+    the concentration profiles to a file, or a movie if the file name
+    ends in .mp4 or .gif.
+    """
+    outFile = headlessArgs( 'One-dimensional Turing pattern.' )
     runtime = 400
     displayInterval = 2
     makeModel()
     dsolve = moose.element( '/model/dsolve' )
+    if outFile:
+        runHeadless( outFile, runtime, displayInterval )
+        return
     moose.reinit()
     #moose.start( runtime ) # Run the model for 10 seconds.
 
@@ -27,6 +27,11 @@ import numpy as np
 import matplotlib.pyplot as plt
 import time
 import moose
+import os
+import sys
+scriptDir = os.path.dirname( os.path.realpath( __file__ ) )
+sys.path.append( os.path.join( scriptDir, '../../util' ) )
+from popSpikes import PopulationSpikes
 
 import random
 
@@ -185,15 +190,11 @@ class ExcInhNetBase:
         moose.connect( self.network, 'spikeOut', \
             self.spikes, 'input', 'OneToOne' )
 
-        ## make 2 tables to store spikes of all exc and all inh neurons
-        self.spikesExc = moose.Table( '/plotSpikesAllExc' )
-        for i in range(self.NmaxExc):
-            moose.connect( self.network.vec[i], 'spikeOut', \
-                self.spikesExc, 'input' )
-        self.spikesInh = moose.Table( '/plotSpikesAllInh' )
-        for i in range(self.NmaxExc,self.N):
-            moose.connect( self.network.vec[i], 'spikeOut', \
-                self.spikesInh, 'input' )
+        ## all-exc and all-inh spike trains are merged from the per-neuron
+        ## tables after the run, instead of a second spikeOut message
+        ## from every neuron into a shared table
+        self.spikesExc = PopulationSpikes( self.spikes, 0, self.NmaxExc )
+        self.spikesInh = PopulationSpikes( self.spikes, self.NmaxExc, self.N )
 
     def _plot(self):
         """ plots the spike raster for the simulated net"""
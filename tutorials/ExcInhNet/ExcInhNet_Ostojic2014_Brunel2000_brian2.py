@@ -25,10 +25,16 @@ except ImportError as e:
 
 #prefs.codegen.target='numpy'
 #prefs.codegen.target='weave'
-set_device('cpp_standalone')
+set_device('cpp_standalone', build_on_run=False)
+import os
 import random
 import time
 
+## ExcInhNet_benchmark.py sets these to override the network size and
+## simtime, and to collect the spikes and timings instead of plotting.
+benchmarkOut = os.environ.get('EXCINHNET_BENCHMARK_OUT')
+t0 = time.time()
+
 np.random.seed(100) # set seed for reproducibility of simulations
 random.seed(100) # set seed for reproducibility of simulations
 
@@ -37,7 +43,7 @@ random.seed(100) # set seed for reproducibility of simulations
 # ###########################################
 
 simdt = 0.01*ms
-simtime = 10.0*second            # Simulation time
+simtime = float(os.environ.get('EXCINHNET_SIMTIME',10.0))*second # Simulation time
 defaultclock.dt = simdt         # Brian's default sim time step
 dt = defaultclock.dt/second     # convert to value in seconds
 
@@ -65,7 +71,7 @@ dv/dt=(1/taum)*(-(v-el))+inp : volt
 # Network parameters: numbers
 # ###########################################
 
-N = 1000          # Total number of neurons
+N = int(os.environ.get('EXCINHNET_N',1000)) # Total number of neurons
 fexc = 0.8        # Fraction of exc neurons
 NE = int(fexc*N)  # Number of excitatory cells
 NI = N-NE         # Number of inhibitory cells 
@@ -74,7 +80,7 @@ NI = N-NE         # Number of inhibitory cells
 # Network parameters: synapses
 # ###########################################
 
-C = 100           # Number of incoming connections on each neuron (exc or inh)
+C = int(os.environ.get('EXCINHNET_C',100)) # Number of incoming connections on each neuron (exc or inh)
 fC = fexc         # fraction fC incoming connections are exc, rest inhibitory
 excC = int(fC*C)  # number of exc incoming connections
 J = 0.8*mV        # exc strength is J (in mV as we add to voltage)
@@ -100,7 +106,7 @@ sparseness_e = fC*C/float(NE)
 sparseness_i = (1-fC)*C/float(NI)
 # Follow Dale's law -- exc (inh) neurons only have +ve (-ve) synapses
 #  hence need to set w correctly (always set after creating connections
-con = Synapses(P,P,'w:volt',pre='v_post+=w',method='euler')
+con = Synapses(P,P,'w:volt',on_pre='v_post+=w',method='euler')
 # I don't use Brian's connect_random,
 #  instead I use the same algorithm and seed as in the MOOSE version
 #con_e.connect_random(sparseness=sparseness_e)
@@ -120,7 +126,7 @@ for j in range(0,N):
     conn_j += [j]*excC
     conn_i += preIdxsI
     conn_j += [j]*(C-excC)
-con.connect(conn_i,conn_j)
+con.connect(i=conn_i,j=conn_j)
 con.delay = taudelay
 con.w['i<NE'] = J
 con.w['i>=NE'] = -g*J
@@ -145,8 +151,18 @@ sm_vm = StateMonitor(P,'v',record=list(range(10))+list(range(NE,NE+10)))
 print(("Setup complete, running for",simtime,"at dt =",dt,"s."))
 t1 = time.time()
 run(simtime,report='text')
-device.build(directory='output', compile=True, run=True, debug=False)
-print(('inittime + runtime, t = ', time.time() - t1))
+device.build(directory='output', compile=True, run=False, debug=False)
+buildtime = time.time() - t0
+t1 = time.time()
+device.run(directory='output')
+runtime = time.time() - t1
+print(('inittime, t = ', buildtime, 'runtime, t = ', runtime))
+
+if benchmarkOut:
+    np.savez(benchmarkOut, t=np.asarray(sm.t/second), i=np.asarray(sm.i),\
+        N=N, NmaxExc=NE, simtime=simtime/second,\
+        buildtime=buildtime, runtime=runtime)
+    quit()
 
 #print "For g,J =",g,J,"mean exc rate =",\
 #    sm_e.num_spikes/float(NE)/(simtime/second),'Hz.'
@@ -18,6 +18,7 @@ Currently, simtime and dt are modified to compare across MOOSE, Brian1 and Brian
 # matplot like commands into the namespace, further
 # also can use np. for numpy and mpl. for matplotlib
 from brian2 import *  
+import os
 import random
 import time
 import matplotlib.pyplot as plt
@@ -26,12 +27,17 @@ import numpy as np
 np.random.seed(100) # set seed for reproducibility of simulations
 random.seed(100) # set seed for reproducibility of simulations
 
+## ExcInhNet_benchmark.py sets these to override the network size and
+## simtime, and to collect the spikes and timings instead of plotting.
+benchmarkOut = os.environ.get('EXCINHNET_BENCHMARK_OUT')
+t0 = time.time()
+
 # ###########################################
 # Simulation parameters
 # ###########################################
 
 simdt = 0.001*ms
-simtime = 0.2*second            # Simulation time
+simtime = float(os.environ.get('EXCINHNET_SIMTIME',0.2))*second # Simulation time
 defaultclock.dt = simdt         # Brian's default sim time step
 dt = defaultclock.dt/second     # convert to value in seconds
 
@@ -59,7 +65,7 @@ dv/dt=(1/taum)*(-(v-el))+inp : volt
 # Network parameters: numbers
 # ###########################################
 
-N = 1000          # Total number of neurons
+N = int(os.environ.get('EXCINHNET_N',1000)) # Total number of neurons
 fexc = 0.8        # Fraction of exc neurons
 NE = int(fexc*N)  # Number of excitatory cells
 NI = N-NE         # Number of inhibitory cells 
@@ -68,7 +74,7 @@ NI = N-NE         # Number of inhibitory cells
 # Network parameters: synapses
 # ###########################################
 
-C = 100           # Number of incoming connections on each neuron (exc or inh)
+C = int(os.environ.get('EXCINHNET_C',100)) # Number of incoming connections on each neuron (exc or inh)
 fC = fexc         # fraction fC incoming connections are exc, rest inhibitory
 excC = int(fC*C)  # number of exc incoming connections
 J = 0.8*mV        # exc strength is J (in mV as we add to voltage)
@@ -97,10 +103,10 @@ Pi.v = vrange[NE:N]
 sparseness_e = fC*C/float(NE)
 sparseness_i = (1-fC)*C/float(NI)
 # Follow Dale's law -- exc (inh) neurons only have +ve (-ve) synapses.
-con_ee = Synapses(Pe,Pe,'',pre='v_post+=J')
-con_ie = Synapses(Pe,Pi,'',pre='v_post+=J')
-con_ei = Synapses(Pi,Pe,'',pre='v_post+=-g*J')
-con_ii = Synapses(Pi,Pi,'',pre='v_post+=-g*J')
+con_ee = Synapses(Pe,Pe,'',on_pre='v_post+=J')
+con_ie = Synapses(Pe,Pi,'',on_pre='v_post+=J')
+con_ei = Synapses(Pi,Pe,'',on_pre='v_post+=-g*J')
+con_ii = Synapses(Pi,Pi,'',on_pre='v_post+=-g*J')
 # I don't use Brian's connect_random,
 #  instead I use the same algorithm and seed as in the MOOSE version
 #con_e.connect_random(sparseness=sparseness_e)
@@ -117,11 +123,11 @@ for i in range(0,N):
     ## connect these presynaptically to i-th post-synaptic neuron
     ## choose the synapses object based on whether post-syn nrn is exc or inh
     if i<NE:
-        con_ee.connect(preIdxsE ==i)
-        con_ei.connect(preIdxsI ==i)
+        con_ee.connect(i=preIdxsE,j=i)
+        con_ei.connect(i=preIdxsI,j=i)
     else:
-        con_ie.connect(preIdxsE == i-NE)
-        con_ii.connect(preIdxsI == i-NE)
+        con_ie.connect(i=preIdxsE,j=i-NE)
+        con_ii.connect(i=preIdxsI,j=i-NE)
 con_ee.delay = taudelay
 con_ie.delay = taudelay
 con_ei.delay = taudelay
@@ -147,9 +153,19 @@ sm_e_vm = StateMonitor(Pe, variables=['v'],record=list(range(10)))
 # ###########################################
 
 print(("Setup complete, running for",simtime,"at dt =",dt,"s."))
+buildtime = time.time() - t0
 t1 = time.time()
 run(simtime,report='text')
-print(('inittime + runtime, t = ', time.time() - t1))
+runtime = time.time() - t1
+print(('inittime, t = ', buildtime, 'runtime, t = ', runtime))
+
+if benchmarkOut:
+    np.savez(benchmarkOut,\
+        t=np.concatenate([sm_e.t/second,sm_i.t/second]),\
+        i=np.concatenate([np.asarray(sm_e.i),np.asarray(sm_i.i)+NE]),\
+        N=N, NmaxExc=NE, simtime=simtime/second,\
+        buildtime=buildtime, runtime=runtime)
+    quit()
 
 print(("For g,J =",g,J,"mean exc rate =",\
     sm_e.num_spikes/float(NE)/(simtime/second),'Hz.'))
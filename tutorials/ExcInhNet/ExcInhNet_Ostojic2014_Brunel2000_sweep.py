@@ -0,0 +1,178 @@
+#/**********************************************************************
+#** This program is part of 'MOOSE', the
+#** Messaging Object Oriented Simulation Environment.
+#**           Copyright (C) 2003-2014 Upinder S. Bhalla. and NCBS
+#** It is made available under the terms of the
+#** GNU Lesser General Public License version 2.1
+#** See the file COPYING.LIB for the full notice.
+#**********************************************************************/
+
+'''
+Parameter sweep over the Ostojic 2014 / Brunel 2000 LIF network of
+ExcInhNet_Ostojic2014_Brunel2000.py.
+
+The key parameters J (exc coupling), g (relative inh strength) and the
+injection current only change synaptic weights and a neuron field, so
+each worker process builds the population and its random topology once
+and then, for each (J, g, Iinject) point, resets the weights with
+synapse.vec.weight, reinits and runs. Only summary statistics (mean
+rate, CV of ISIs, Fano factor, synchrony) are kept, one row per point,
+in a CSV table.
+
+Example, a J x g phase diagram on all cores:
+    python ExcInhNet_Ostojic2014_Brunel2000_sweep.py \\
+        --J 0.2e-3 0.4e-3 0.6e-3 0.8e-3 --g 3 4 5 6 --plot cv
+'''
+
+import argparse
+import csv
+import itertools
+import multiprocessing
+import time
+import numpy as np
+import moose
+
+import ExcInhNet_Ostojic2014_Brunel2000 as ein
+from spike_stats import summary_stats
+
+statFields = ['rate', 'rate_exc', 'rate_inh', 'cv', 'fano', 'synchrony']
+
+class ExcInhNetSweep(ein.ExcInhNet):
+    """ExcInhNet that is built once and re-parametrised in place."""
+
+    def __init__(self, **kwargs):
+        ein.ExcInhNet.__init__(self, **kwargs)
+        ## only per-neuron spike tables, the aggregate exc/inh tables and
+        ## Vm plots of ExcInhNetBase._init_plots are not needed here
+        self.spikes = moose.Table( '/plotSpikes', self.N )
+        moose.connect( self.network, 'spikeOut', \
+            self.spikes, 'input', 'OneToOne' )
+
+    def set_params(self, J, g, Iinject):
+        """Sets coupling and input without rebuilding the network."""
+        self.J = J
+        self.scaleI = g
+        self.Iinject = Iinject
+        weights = np.empty(self.incC)
+        weights[:self.excC] = J
+        weights[self.excC:] = -J*g
+        for i in range(self.N):
+            self.syns.vec[i].synapse.vec.weight = weights
+        self.network.vec.inject = Iinject
+
+    def spiketrains(self):
+        return [np.array(self.spikes.vec[i].vector) for i in range(self.N)]
+
+#############################################
+# Worker side: one network per process
+#############################################
+
+_net = None
+_runargs = None
+
+def _init_worker(netargs, runargs):
+    global _net, _runargs
+    _net = ExcInhNetSweep(**netargs)
+    _runargs = runargs
+
+def _run_point(point):
+    J, g, Iinject = point
+    simtime = _runargs['simtime']
+    t0 = time.time()
+    _net.set_params(J, g, Iinject)
+    _net.simulate(simtime, _runargs['dt'], plotif=False,
+        v0=np.linspace(ein.el-20e-3, ein.vt, _net.N))
+    row = {'J': J, 'g': g, 'Iinject': Iinject}
+    row.update(summary_stats(_net.spiketrains(), simtime, _net.NmaxExc))
+    row['walltime'] = time.time() - t0
+    return row
+
+#############################################
+# Driver
+#############################################
+
+def sweep(Js, gs, Iinjects, netargs, simtime, dt=ein.dt, processes=None):
+    """Runs all (J, g, Iinject) combinations and returns a list of rows
+    of summary statistics, in grid order."""
+    points = list(itertools.product(Js, gs, Iinjects))
+    runargs = {'simtime': simtime, 'dt': dt}
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = max(1, min(processes, len(points)))
+    if processes == 1:
+        _init_worker(netargs, runargs)
+        rows = [_run_point(p) for p in points]
+    else:
+        pool = multiprocessing.Pool(processes, _init_worker, (netargs, runargs))
+        try:
+            rows = pool.map(_run_point, points, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    return rows
+
+def write_table(rows, fname):
+    fields = ['J', 'g', 'Iinject'] + statFields + ['walltime']
+    with open(fname, 'w') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+
+def plot_phase_diagram(rows, field='cv'):
+    """Colour map of field over J x g, for the first Iinject value."""
+    import matplotlib.pyplot as plt
+    Iinject = rows[0]['Iinject']
+    rows = [r for r in rows if r['Iinject'] == Iinject]
+    Js = sorted(set(r['J'] for r in rows))
+    gs = sorted(set(r['g'] for r in rows))
+    grid = np.full((len(gs), len(Js)), np.nan)
+    for r in rows:
+        grid[gs.index(r['g']), Js.index(r['J'])] = r[field]
+    plt.figure()
+    plt.imshow(grid, origin='lower', aspect='auto', interpolation='nearest',
+        extent=[-0.5, len(Js)-0.5, -0.5, len(gs)-0.5])
+    plt.xticks(range(len(Js)), ['%g' % (J*1e3) for J in Js])
+    plt.yticks(range(len(gs)), ['%g' % g for g in gs])
+    plt.xlabel('J (mV)')
+    plt.ylabel('g')
+    plt.colorbar(label=field)
+    plt.title('%s at Iinject = %g A' % (field, Iinject))
+
+def main():
+    parser = argparse.ArgumentParser(description=
+        'Sweep J, g and Iinject of the Ostojic 2014 LIF network.')
+    parser.add_argument('--J', type=float, nargs='+', default=[0.2e-3, 0.8e-3],
+        help='exc coupling values (V)')
+    parser.add_argument('--g', type=float, nargs='+', default=[ein.g],
+        help='relative inh strength values')
+    parser.add_argument('--Iinject', type=float, nargs='+',
+        default=[ein.Iinject], help='injection current values (A)')
+    parser.add_argument('--N', type=int, default=ein.N)
+    parser.add_argument('--C', type=int, default=ein.C)
+    parser.add_argument('--simtime', type=float, default=1.0)
+    parser.add_argument('--dt', type=float, default=ein.dt)
+    parser.add_argument('--processes', '-p', type=int, default=None,
+        help='worker processes (default: all cores)')
+    parser.add_argument('--out', '-o', default='ExcInhNet_sweep.csv')
+    parser.add_argument('--plot', choices=statFields, default=None,
+        help='plot a J x g phase diagram of this statistic')
+    args = parser.parse_args()
+
+    netargs = {'N': args.N, 'incC': args.C}
+    t0 = time.time()
+    rows = sweep(args.J, args.g, args.Iinject, netargs,
+        args.simtime, args.dt, args.processes)
+    print(('sweep of %d points took t = ' % len(rows), time.time() - t0))
+    write_table(rows, args.out)
+    print('Wrote ' + args.out)
+    for r in rows:
+        print('J = %g, g = %g: rate = %.2f Hz, CV = %.2f, synchrony = %.2f' %
+            (r['J'], r['g'], r['rate'], r['cv'], r['synchrony']))
+    if args.plot:
+        import matplotlib.pyplot as plt
+        plot_phase_diagram(rows, args.plot)
+        plt.show()
+
+if __name__=='__main__':
+    main()
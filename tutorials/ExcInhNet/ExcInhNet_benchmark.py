@@ -0,0 +1,217 @@
+#/**********************************************************************
+#** This program is part of 'MOOSE', the
+#** Messaging Object Oriented Simulation Environment.
+#**           Copyright (C) 2003-2014 Upinder S. Bhalla. and NCBS
+#** It is made available under the terms of the
+#** GNU Lesser General Public License version 2.1
+#** See the file COPYING.LIB for the full notice.
+#**********************************************************************/
+
+'''
+Benchmarks the MOOSE and Brian2 implementations of the Ostojic 2014 /
+Brunel 2000 LIF network in this directory against each other:
+    moose        ExcInhNet_Ostojic2014_Brunel2000.py
+    brian2       ExcInhNet_Ostojic2014_Brunel2000_brian2.py (cpp_standalone)
+    brian2_slow  ExcInhNet_Ostojic2014_Brunel2000_brian2_slow_2pops_4syns.py
+
+Every (implementation, N, C, simtime) run happens in its own process, so
+that build time, run time and peak memory are measured separately. The
+spike output of each implementation is checked against the reference
+simulator by comparing the distributions of per-neuron rates and ISI CVs
+(two-sample Kolmogorov-Smirnov test). Everything goes into one JSON
+report, and a summary table is printed.
+
+Example:
+    python ExcInhNet_benchmark.py --N 500 1000 --C 50 100 --simtime 0.5
+'''
+
+import argparse
+import itertools
+import json
+import os
+import resource
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+from spike_stats import spiketrains_from_monitor, neuron_rates, cv_isi, \
+    summary_stats, ks_2samp
+
+scriptDir = os.path.dirname( os.path.realpath( __file__ ) )
+scripts = {
+    'brian2': 'ExcInhNet_Ostojic2014_Brunel2000_brian2.py',
+    'brian2_slow': 'ExcInhNet_Ostojic2014_Brunel2000_brian2_slow_2pops_4syns.py',
+}
+implementations = ['moose'] + sorted(scripts)
+
+def peak_memory_MB():
+    """Peak RSS of this process and its (waited for) children."""
+    rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return rss/1024.0
+
+#############################################
+# Worker side: one run per process
+#############################################
+
+def run_moose(N, C, simtime, out):
+    import ExcInhNet_Ostojic2014_Brunel2000 as ein
+    from ExcInhNet_Ostojic2014_Brunel2000_sweep import ExcInhNetSweep
+    t0 = time.time()
+    net = ExcInhNetSweep(N=N, incC=C)
+    buildtime = time.time() - t0
+    t0 = time.time()
+    net.simulate(simtime, ein.dt, plotif=False,
+        v0=np.linspace(ein.el-20e-3, ein.vt, N))
+    runtime = time.time() - t0
+    trains = net.spiketrains()
+    np.savez(out, t=np.concatenate(trains),
+        i=np.repeat(np.arange(N), [len(st) for st in trains]),
+        N=N, NmaxExc=net.NmaxExc, simtime=simtime,
+        buildtime=buildtime, runtime=runtime)
+
+def run_brian2(impl, N, C, simtime, out):
+    ## the Brian2 scripts read these and dump spikes and timings to out
+    os.environ['EXCINHNET_N'] = str(N)
+    os.environ['EXCINHNET_C'] = str(C)
+    os.environ['EXCINHNET_SIMTIME'] = str(simtime)
+    os.environ['EXCINHNET_BENCHMARK_OUT'] = out
+    try:
+        runpy.run_path(os.path.join(scriptDir, scripts[impl]),
+            run_name='__main__')
+    except SystemExit:
+        pass
+
+def worker(impl, N, C, simtime, out):
+    if impl == 'moose':
+        run_moose(N, C, simtime, out)
+    else:
+        run_brian2(impl, N, C, simtime, out)
+    ## last line of stdout is read by run_one()
+    print(json.dumps({'peak_memory_MB': peak_memory_MB()}))
+
+#############################################
+# Driver
+#############################################
+
+def run_one(impl, N, C, simtime, python, timeout):
+    """Runs one implementation in a subprocess and returns its record
+    along with its spike trains."""
+    record = {'impl': impl, 'N': N, 'C': C, 'simtime': simtime}
+    workdir = tempfile.mkdtemp(prefix='excinhnet_')
+    out = os.path.join(workdir, 'spikes.npz')
+    cmd = [python, os.path.realpath(__file__), '--worker', impl,
+        '--N', str(N), '--C', str(C), '--simtime', str(simtime), '--out', out]
+    env = dict(os.environ, MPLBACKEND='Agg',
+        PYTHONPATH=os.pathsep.join([scriptDir, os.environ.get('PYTHONPATH', '')]))
+    try:
+        p = subprocess.run(cmd, cwd=workdir, env=env, timeout=timeout,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except subprocess.TimeoutExpired:
+        record['status'] = 'TIMEOUT'
+        record['workdir'] = workdir
+        return record, None
+    output = p.stdout.decode('utf8', 'replace')
+    if p.returncode != 0 or not os.path.exists(out):
+        record['status'] = 'FAILED'
+        record['error'] = output.strip().splitlines()[-1:] or ['']
+        record['workdir'] = workdir
+        return record, None
+    record['status'] = 'OK'
+    record.update(json.loads(output.strip().splitlines()[-1]))
+    with np.load(out) as data:
+        record['buildtime'] = float(data['buildtime'])
+        record['runtime'] = float(data['runtime'])
+        trains = spiketrains_from_monitor(data['t'], data['i'], N)
+        record.update(summary_stats(trains, simtime, int(data['NmaxExc'])))
+        record['num_spikes'] = int(len(data['t']))
+    shutil.rmtree(workdir, ignore_errors=True)
+    return record, trains
+
+def compare(trains, reftrains, simtime, alpha):
+    """KS comparison of rate and CV distributions against the reference."""
+    Drate, prate = ks_2samp(neuron_rates(trains, simtime),
+        neuron_rates(reftrains, simtime))
+    Dcv, pcv = ks_2samp(cv_isi(trains), cv_isi(reftrains))
+    return {'ks_rate_D': Drate, 'ks_rate_p': prate,
+        'ks_cv_D': Dcv, 'ks_cv_p': pcv,
+        'equivalent': bool(prate > alpha and (np.isnan(pcv) or pcv > alpha))}
+
+def benchmark(impls, Ns, Cs, simtimes, reference, pythons, timeout, alpha):
+    records = []
+    for N, C, simtime in itertools.product(Ns, Cs, simtimes):
+        if C > N:
+            continue
+        results = {}
+        for impl in impls:
+            print('Running %s with N = %d, C = %d, simtime = %g s' %
+                (impl, N, C, simtime))
+            results[impl] = run_one(impl, N, C, simtime, pythons[impl], timeout)
+        ref, reftrains = results.get(reference, (None, None))
+        for impl in impls:
+            record, trains = results[impl]
+            if reftrains is not None and trains is not None and impl != reference:
+                record.update(compare(trains, reftrains, simtime, alpha))
+                record['runtime_vs_reference'] = \
+                    record['runtime']/max(ref['runtime'], 1e-9)
+                record['buildtime_vs_reference'] = \
+                    record['buildtime']/max(ref['buildtime'], 1e-9)
+            records.append(record)
+    return records
+
+def print_summary(records, reference):
+    print('%-12s %6s %5s %7s %9s %9s %9s %8s %6s %s' % ('impl', 'N', 'C',
+        'simtime', 'build(s)', 'run(s)', 'mem(MB)', 'rate', 'CV',
+        'equiv. to ' + reference))
+    for r in records:
+        if r['status'] != 'OK':
+            print('%-12s %6d %5d %7g %s' % (r['impl'], r['N'], r['C'],
+                r['simtime'], r['status']))
+            continue
+        print('%-12s %6d %5d %7g %9.3f %9.3f %9.1f %8.2f %6.2f %s' % (
+            r['impl'], r['N'], r['C'], r['simtime'], r['buildtime'],
+            r['runtime'], r['peak_memory_MB'], r['rate'], r['cv'],
+            r.get('equivalent', '-')))
+
+def main():
+    parser = argparse.ArgumentParser(description=
+        'Benchmark the MOOSE and Brian2 ExcInhNet implementations.')
+    parser.add_argument('--impl', nargs='+', choices=implementations,
+        default=['moose', 'brian2'])
+    parser.add_argument('--reference', choices=implementations,
+        default='brian2', help='simulator the others are compared against')
+    parser.add_argument('--N', type=int, nargs='+', default=[1000])
+    parser.add_argument('--C', type=int, nargs='+', default=[100])
+    parser.add_argument('--simtime', type=float, nargs='+', default=[0.2])
+    parser.add_argument('--brian2-python', default=sys.executable,
+        help='python to run the Brian2 scripts with, if Brian2 lives '
+        'in another environment')
+    parser.add_argument('--timeout', type=float, default=3600)
+    parser.add_argument('--alpha', type=float, default=0.01,
+        help='KS p-value below which distributions are flagged as different')
+    parser.add_argument('--report', '-o', default='ExcInhNet_benchmark.json')
+    parser.add_argument('--worker', choices=implementations, help=
+        argparse.SUPPRESS)
+    parser.add_argument('--out', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.N[0], args.C[0], args.simtime[0], args.out)
+        return
+
+    pythons = dict((impl, args.brian2_python) for impl in scripts)
+    pythons['moose'] = sys.executable
+    records = benchmark(args.impl, args.N, args.C, args.simtime,
+        args.reference, pythons, args.timeout, args.alpha)
+    with open(args.report, 'w') as f:
+        json.dump({'reference': args.reference, 'alpha': args.alpha,
+            'runs': records}, f, indent=2, default=float)
+    print_summary(records, args.reference)
+    print('Wrote ' + args.report)
+
+if __name__=='__main__':
+    main()
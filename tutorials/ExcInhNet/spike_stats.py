@@ -0,0 +1,114 @@
+#/**********************************************************************
+#** This program is part of 'MOOSE', the
+#** Messaging Object Oriented Simulation Environment.
+#**           Copyright (C) 2003-2014 Upinder S. Bhalla. and NCBS
+#** It is made available under the terms of the
+#** GNU Lesser General Public License version 2.1
+#** See the file COPYING.LIB for the full notice.
+#**********************************************************************/
+
+'''
+Summary statistics of population spike trains, used to characterise
+the asynchronous regimes of the Ostojic 2014 / Brunel 2000 network
+without keeping the rasters around.
+
+All functions take a list of spike time arrays (one per neuron, in s)
+and the duration of the recording (in s), so they work equally on
+MOOSE Table vectors and on Brian SpikeMonitor output.
+'''
+
+import numpy as np
+import scipy.stats
+
+def spiketrains_from_monitor(times, indices, N):
+    """Splits flat (spike time, neuron index) arrays into per-neuron trains."""
+    times = np.asarray(times, dtype=float)
+    indices = np.asarray(indices, dtype=int)
+    order = np.lexsort((times, indices))
+    times = times[order]
+    bounds = np.searchsorted(indices[order], np.arange(N+1))
+    return [times[bounds[i]:bounds[i+1]] for i in range(N)]
+
+def mean_rate(spiketrains, T):
+    """Mean firing rate per neuron (Hz)."""
+    if len(spiketrains) == 0:
+        return 0.0
+    nspikes = sum(len(st) for st in spiketrains)
+    return nspikes/float(len(spiketrains))/T
+
+def neuron_rates(spiketrains, T):
+    """Firing rate of each neuron (Hz)."""
+    return np.array([len(st) for st in spiketrains])/float(T)
+
+def cv_isi(spiketrains, minspikes=3):
+    """Coefficient of variation of the inter-spike intervals of each
+    neuron having at least minspikes spikes."""
+    cvs = []
+    for st in spiketrains:
+        if len(st) < minspikes:
+            continue
+        isi = np.diff(st)
+        mu = isi.mean()
+        if mu > 0:
+            cvs.append(isi.std()/mu)
+    return np.array(cvs)
+
+def binned_counts(spiketrains, T, binsize):
+    """(neurons x bins) array of spike counts."""
+    nbins = max(int(T/binsize), 1)
+    edges = np.linspace(0, nbins*binsize, nbins+1)
+    counts = np.zeros((len(spiketrains), nbins))
+    for i, st in enumerate(spiketrains):
+        counts[i] = np.histogram(st, bins=edges)[0]
+    return counts
+
+def fano_factor(spiketrains, T, window=100e-3):
+    """Mean over neurons of var/mean of the spike count in windows."""
+    counts = binned_counts(spiketrains, T, window)
+    mu = counts.mean(axis=1)
+    active = mu > 0
+    if not active.any():
+        return np.nan
+    return np.mean(counts[active].var(axis=1)/mu[active])
+
+def synchrony(spiketrains, T, binsize=1e-3):
+    """Golomb's synchrony measure chi: the variance of the population
+    averaged activity normalised by the mean variance of the individual
+    neurons. ~0 for asynchronous and 1 for fully synchronous firing."""
+    counts = binned_counts(spiketrains, T, binsize)
+    popvar = counts.mean(axis=0).var()
+    nrnvar = counts.var(axis=1).mean()
+    if nrnvar == 0:
+        return np.nan
+    return np.sqrt(popvar/nrnvar)
+
+def summary_stats(spiketrains, T, NmaxExc=None):
+    """Dict of mean rate (all / exc / inh), CV, Fano factor and synchrony."""
+    if NmaxExc is None:
+        NmaxExc = len(spiketrains)
+    cvs = cv_isi(spiketrains)
+    return {
+        'rate': mean_rate(spiketrains, T),
+        'rate_exc': mean_rate(spiketrains[:NmaxExc], T),
+        'rate_inh': mean_rate(spiketrains[NmaxExc:], T),
+        'cv': cvs.mean() if len(cvs) else np.nan,
+        'fano': fano_factor(spiketrains, T),
+        'synchrony': synchrony(spiketrains, T),
+    }
+
+def ks_2samp(a, b):
+    """Two-sample Kolmogorov-Smirnov statistic D and its p-value, for
+    comparing e.g. rate or CV distributions across simulators. Identical
+    samples give D = 0, p = 1."""
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    if len(a) == 0 or len(b) == 0:
+        return np.nan, np.nan
+    res = scipy.stats.ks_2samp(a, b)
+    return float(res.statistic), float(res.pvalue)
+
+if __name__ == '__main__':
+    a = np.random.RandomState(1).exponential(0.1, 200)
+    assert ks_2samp(a, a) == (0.0, 1.0)
+    assert ks_2samp(a, a + 1e-9)[1] > 0.99
+    print('ks_2samp ok')
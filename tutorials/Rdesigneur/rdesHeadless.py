@@ -0,0 +1,307 @@
+'''
+Runs the rdesigneur tutorial scripts without graphics or blocking.
+
+The script is run unchanged, with rdesigneur.display and displayMoogli
+replaced by versions that write their data to a compressed .npz file:
+
+    python rdesHeadless.py ex9.1_chans_in_neuronal_morpho.py
+
+writes ex9.1_chans_in_neuronal_morpho.npz. display() saves the tables of
+the plotList and wavePlotList and returns at once. displayMoogli()
+builds no viewer; instead it records the field of every moogList entry
+into tables on a clock of its own at the moogliDt of the call, runs the
+whole runtime in one moose.start, and saves those snapshots with the
+plots. Matplotlib is put on the Agg backend, so plt.show() in a script
+returns as well.
+
+In the file, plotK and waveK hold the tables of the K-th entry as
+( objects, samples ), raw values in SI units, with plotK_dt, plotK_scale
+and plotK_info ( table path, title, units ) beside them. moogK holds the
+snapshots of the K-th moogList entry as ( frames, objects ), with
+moogK_info ( title, field ) and moogK_paths; moog_dt is the interval.
+Spike time plots have one row per object padded with NaN.
+
+Given several scripts, each runs in a process of its own and a summary
+of exit status and wall time goes to summary.json in the output
+directory, so all the examples can be run as a nightly sweep:
+
+    python rdesHeadless.py ex*.py --outdir nightly --timeout 900
+    python rdesHeadless.py ex*.py --outdir today --compare nightly
+
+--compare checks every array against the file of the same name in an
+earlier run and marks the script 'changed' if any differs by more than
+--rtol. The output directory defaults to $RDES_HEADLESS_DIR, or to the
+directory of each script when that is not set either.
+
+With --tune, a single script stops after buildModel and the clock dts
+of its diffusion, adaptor and kinetics solvers are tuned instead, by
+trial runs of the given length compared with a fine dt reference on the
+plotList tables (see ../../util/clockTuner.py). The elec dt is not
+tuned, as the HSolve keeps the elecDt it was built with:
+
+    python rdesHeadless.py ex13.1_BCM_multiscale.py --tune 10 \\
+        --tunePlots 1,2,3,4,5 --tuneTol 0.05
+'''
+
+from __future__ import print_function
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import runpy
+import subprocess
+import sys
+import time
+import numpy as np
+
+MOOG_TICK = 19
+
+def _stack( vectors ):
+    # Rows of unequal length, as from spike time tables, are NaN padded.
+    n = max( [ len( v ) for v in vectors ] + [0] )
+    out = np.full( ( len( vectors ), n ), np.nan )
+    for row, v in zip( out, vectors ):
+        row[:len( v )] = v
+    return out
+
+def _tableData( entries, prefix, scaleIndex, unitsIndex ):
+    data = {}
+    for k, i in enumerate( entries ):
+        tabs = moose.vec( i[0] )
+        key = '{}{}'.format( prefix, k )
+        data[key] = _stack( [ np.array( t.vector ) for t in tabs ] )
+        data[key + '_dt'] = tabs[0].dt
+        data[key + '_scale'] = i[scaleIndex]
+        data[key + '_info'] = np.array( [ i[0], i[1], i[unitsIndex] ] )
+    return data
+
+#############################################
+# Replacements for the rdesigneur displays
+#############################################
+
+def install( outfile, tune = None ):
+    """Patches rdesigneur so that display and displayMoogli save to
+    outfile instead of drawing. Must come before the script imports
+    matplotlib.pyplot. Given tune, a dict of arguments for tuneClocks,
+    buildModel tunes the clocks of the model and exits instead."""
+    import matplotlib
+    matplotlib.use( 'Agg' )
+    global moose
+    import moose
+    import rdesigneur
+    # The package exports the class under the name of its module.
+    rdmod = sys.modules[ 'rdesigneur.rdesigneur' ]
+    t0 = time.time()
+
+    def _buildMoogli( self ):
+        dummy = moose.element( '/' )
+        self._headlessMoog = []
+        for i in self.moogList:
+            pair = i.elecpath + " " + i.geom_expr
+            dendCompts = self.elecid.compartmentsFromExpression[ pair ]
+            objs, getter = self._parseComptField( dendCompts, i,
+                    rdmod.knownFieldsDefault )
+            objs = [ o for o in objs if o != dummy ]
+            self._headlessMoog.append( ( i, objs, getter ) )
+            self.moogNames.append( i.title )
+
+    def displayMoogli( self, moogliDt, runtime, *args, **kwargs ):
+        base = moose.Neutral( self.modelPath + '/headless' )
+        self._headlessTabs = []
+        for k, ( i, objs, getter ) in enumerate( self._headlessMoog ):
+            if len( objs ) == 0:
+                continue
+            tabs = moose.Table2( '{}/moog{}'.format( base.path, k ), len( objs ) ).vec
+            for obj, tab in zip( objs, tabs ):
+                moose.connect( tab, 'requestOut', obj, getter )
+                tab.tick = MOOG_TICK
+            self._headlessTabs.append( ( k, i, objs, tabs ) )
+        moose.setClock( MOOG_TICK, moogliDt )
+        moose.reinit()
+        moose.start( runtime )
+        self.display()
+
+    def display( self, startIndex = 0, block = True ):
+        self._save()
+        data = _tableData( self.plotNames, 'plot', 3, 4 )
+        data.update( _tableData( self.wavePlotNames, 'wave', 3, 4 ) )
+        for k, i, objs, tabs in getattr( self, '_headlessTabs', [] ):
+            key = 'moog{}'.format( k )
+            data[key] = _stack( [ np.array( t.vector ) for t in tabs ] ).T
+            data[key + '_info'] = np.array( [ i.title, i.field ] )
+            data[key + '_paths'] = np.array( [ o.path for o in objs ] )
+            data['moog_dt'] = moose.element( '/clock' ).dts[ MOOG_TICK ]
+        data['runtime'] = moose.element( '/clock' ).currentTime
+        data['wallTime'] = time.time() - t0
+        np.savez_compressed( outfile, **data )
+
+    if tune is not None:
+        buildModel = rdmod.rdesigneur.buildModel
+        def tunedBuildModel( self, *args, **kwargs ):
+            buildModel( self, *args, **kwargs )
+            tuneClocks( self, **tune )
+            sys.exit( 0 )
+        rdmod.rdesigneur.buildModel = tunedBuildModel
+
+    rdmod.rdesigneur._buildMoogli = _buildMoogli
+    rdmod.rdesigneur.displayMoogli = displayMoogli
+    rdmod.rdesigneur.display = display
+
+def tuneClocks( rdes, runtime, tol = 0.01, plots = None, metric = 'max' ):
+    """Runs a ClockTuner over the plotList tables of rdes, or those of
+    the plots given by index, and prints its report."""
+    sys.path.append( os.path.join( os.path.dirname( os.path.realpath( __file__ ) ), '../../util' ) )
+    from clockTuner import ClockTuner, rdesigneurFamilies
+    names = rdes.plotNames if plots is None else [ rdes.plotNames[i] for i in plots ]
+    families = [ f for f in rdesigneurFamilies
+            if not ( rdes.turnOffElec and f[0] == 'elec' ) ]
+    print( 'Tuning clocks on: ' + ', '.join( i[1] for i in names ) )
+    tuner = ClockTuner( [ moose.vec( i[0] ) for i in names ], runtime,
+            tol = tol, metric = metric, families = families )
+    tuner.tune()
+    tuner.report()
+    return tuner
+
+def runScript( script, outfile, tune = None ):
+    """Runs script as __main__ in its own directory with the displays
+    patched."""
+    script = os.path.abspath( script )
+    install( os.path.abspath( outfile ), tune )
+    os.chdir( os.path.dirname( script ) )
+    sys.argv = [ script ]
+    sys.path.insert( 0, os.path.dirname( script ) )
+    runpy.run_path( script, run_name = '__main__' )
+
+#############################################
+# Sweep over several scripts
+#############################################
+
+def outName( script, outdir ):
+    base = os.path.splitext( os.path.basename( script ) )[0] + '.npz'
+    if outdir is None:
+        return os.path.join( os.path.dirname( os.path.abspath( script ) ), base )
+    return os.path.join( outdir, base )
+
+def compare( outfile, reffile ):
+    """Returns the largest relative difference between the arrays of
+    two runs, or None if they differ in shape or in what they hold."""
+    a = np.load( outfile )
+    b = np.load( reffile )
+    worst = 0.0
+    for key in a.files:
+        if key in ( 'wallTime', ) or key.endswith( '_info' ) or key.endswith( '_paths' ):
+            continue
+        if key not in b.files or a[key].shape != b[key].shape:
+            return None
+        x, y = a[key], b[key]
+        scale = max( np.nanmax( np.abs( y ) ) if y.size else 0.0, 1e-30 )
+        d = np.abs( x - y )
+        if d.size and np.any( np.isnan( x ) != np.isnan( y ) ):
+            return None
+        if d.size:
+            worst = max( worst, np.nanmax( d ) / scale )
+    return worst
+
+def runOne( job ):
+    script, outfile, timeout, reffile, rtol = job
+    if os.path.exists( outfile ):
+        os.remove( outfile )
+    t0 = time.time()
+    try:
+        proc = subprocess.run( [ sys.executable, os.path.abspath( __file__ ),
+            script, '--out', outfile ], stdout = subprocess.PIPE,
+            stderr = subprocess.STDOUT, timeout = timeout )
+        status = 'ok' if proc.returncode == 0 else 'failed'
+        log = proc.stdout.decode( errors = 'replace' )
+    except subprocess.TimeoutExpired as e:
+        status = 'timeout'
+        log = ( e.stdout or b'' ).decode( errors = 'replace' )
+    result = { 'script': os.path.basename( script ), 'status': status,
+            'wallTime': time.time() - t0 }
+    if status == 'ok' and not os.path.exists( outfile ):
+        result['status'] = 'nodata'
+    if result['status'] == 'ok':
+        result['out'] = outfile
+        if reffile is not None:
+            if not os.path.exists( reffile ):
+                result['status'] = 'noref'
+            else:
+                diff = compare( outfile, reffile )
+                result['maxRelDiff'] = diff
+                if diff is None or diff > rtol:
+                    result['status'] = 'changed'
+    if status != 'ok':
+        result['log'] = log[-2000:]
+    return result
+
+def main():
+    parser = argparse.ArgumentParser( description = 'Runs rdesigneur '
+            'tutorial scripts without graphics, saving the plots and moogli '
+            'fields to .npz files.' )
+    parser.add_argument( 'scripts', nargs = '*' )
+    parser.add_argument( '--out', '-o', default = None,
+            help = 'output file, when running one script' )
+    parser.add_argument( '--outdir', default = os.environ.get( 'RDES_HEADLESS_DIR' ) )
+    parser.add_argument( '--timeout', type = float, default = None,
+            help = 'seconds allowed per script in a sweep' )
+    parser.add_argument( '--compare', default = None,
+            help = 'directory of an earlier sweep to check results against' )
+    parser.add_argument( '--rtol', type = float, default = 1e-6 )
+    parser.add_argument( '--tune', type = float, default = None,
+            metavar = 'RUNTIME', help = 'instead of running one script, '
+            'tune its diffusion, adaptor and kinetics clocks with trial runs '
+            'of this length; the elec dt is fixed by the HSolve at build '
+            'time and is not tuned' )
+    parser.add_argument( '--tuneTol', type = float, default = 0.01 )
+    parser.add_argument( '--tunePlots', default = None,
+            help = 'plotList indices to compare, e.g. 1,2,3 (default: all)' )
+    parser.add_argument( '--tuneMetric', choices = [ 'max', 'rms' ],
+            default = 'max' )
+    parser.add_argument( '--processes', '-p', type = int, default = 1,
+            help = 'scripts run at once; wall times are only comparable '
+            'between sweeps with the same value' )
+    args = parser.parse_args()
+    if not args.scripts:
+        # Nothing to run, as when the examples are run without arguments.
+        parser.print_usage()
+        return
+
+    scripts = [ f for s in args.scripts for f in sorted( glob.glob( s ) ) or [ s ] ]
+    if len( scripts ) == 1 and args.compare is None:
+        tune = None
+        if args.tune is not None:
+            tune = dict( runtime = args.tune, tol = args.tuneTol,
+                    metric = args.tuneMetric, plots = None if args.tunePlots
+                    is None else [ int( i ) for i in args.tunePlots.split( ',' ) ] )
+        runScript( scripts[0], args.out or outName( scripts[0], args.outdir ), tune )
+        return
+
+    if args.outdir is not None and not os.path.isdir( args.outdir ):
+        os.makedirs( args.outdir )
+    jobs = [ ( s, os.path.abspath( outName( s, args.outdir ) ), args.timeout,
+        None if args.compare is None else os.path.join( args.compare,
+            os.path.basename( outName( s, None ) ) ), args.rtol ) for s in scripts ]
+    t0 = time.time()
+    results = []
+    pool = multiprocessing.Pool( args.processes )
+    try:
+        for r in pool.imap( runOne, jobs ):
+            print( '{:48s} {:8s} {:8.2f} s'.format( r['script'], r['status'],
+                r['wallTime'] ) )
+            results.append( r )
+    finally:
+        pool.close()
+        pool.join()
+    summary = os.path.join( args.outdir or '.', 'summary.json' )
+    with open( summary, 'w' ) as f:
+        json.dump( { 'date': time.strftime( '%Y-%m-%d %H:%M:%S' ),
+            'totalTime': time.time() - t0, 'results': results }, f, indent = 1 )
+    bad = [ r for r in results if r['status'] != 'ok' ]
+    print( '{} of {} scripts ok; summary in {}'.format(
+        len( results ) - len( bad ), len( results ), summary ) )
+    if bad:
+        sys.exit( 1 )
+
+if __name__ == '__main__':
+    main()
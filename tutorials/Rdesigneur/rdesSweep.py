@@ -0,0 +1,225 @@
+'''
+Runs one of the rdesigneur tutorial models over a grid of parameters.
+
+The rdesigneur(...) arguments of the example script are captured by
+running the script with rdesigneur, moose.start and the displays
+replaced by stand-ins, so the script is not edited and nothing is
+simulated or drawn. Each --param then names one entry of those
+arguments, with the values it takes:
+
+    python rdesSweep.py ex9.1_chans_in_neuronal_morpho.py \\
+        --param 'chanDistrib[2][3]=450,850,1250' \\
+        --param 'chanDistrib[4][3]=150,300' --out sweep.h5
+
+runs the 6 combinations. Entries that are strings in the script, such
+as the expressions in chanDistrib, take the values as given; others are
+parsed as Python literals. The run time is that of the moose.start
+(or displayMoogli) calls in the script, unless given by --runtime.
+
+The grid points run in worker processes without graphics. Each worker
+keeps the prototypes that rdesigneur loads into /library (channels,
+morphologies, spines) from one point to the next, since rdesigneur
+reuses anything already there. Only prototypes that the build consumes,
+such as a chem model or a stolen cell, are loaded again. A sweep that
+varies any of the *Proto arguments reloads everything for every point.
+
+The tables of the plotList go to one HDF5 file, a group per point
+holding the parameter values as attributes and one dataset per plot of
+shape ( objects, samples ). Scripts that change the model after
+buildModel are only followed up to the rdesigneur(...) call.
+'''
+
+from __future__ import print_function
+import argparse
+import ast
+import copy
+import itertools
+import multiprocessing
+import os
+import re
+import sys
+import time
+import numpy as np
+
+#############################################
+# Capturing the model spec of a script
+#############################################
+
+def captureSpec( script ):
+    """Runs script with stand-ins for rdesigneur and the simulation
+    calls. Returns the keyword arguments of its rdesigneur(...) call and
+    the total run time it asks for."""
+    import moose
+    import rdesigneur as rd
+    specs = []
+    runtimes = []
+    class SpecRecorder( object ):
+        def __init__( self, *args, **kwargs ):
+            specs.append( kwargs )
+        def displayMoogli( self, moogliDt, runtime, *args, **kwargs ):
+            runtimes.append( runtime )
+        def __getattr__( self, name ):
+            return lambda *args, **kwargs: None
+    saved = ( rd.rdesigneur, moose.start, moose.reinit )
+    rd.rdesigneur = SpecRecorder
+    moose.start = lambda t, *args: runtimes.append( t )
+    moose.reinit = lambda: None
+    cwd = os.getcwd()
+    os.chdir( os.path.dirname( os.path.abspath( script ) ) )
+    try:
+        with open( script ) as f:
+            code = compile( f.read(), script, 'exec' )
+        try:
+            exec( code, { '__name__': '__main__', '__file__': script } )
+        except SystemExit:
+            pass
+    finally:
+        rd.rdesigneur, moose.start, moose.reinit = saved
+        os.chdir( cwd )
+        if moose.exists( '/library' ):
+            moose.delete( '/library' )
+    if len( specs ) != 1:
+        raise ValueError( '{} makes {} rdesigneurs, expected 1'.format(
+            script, len( specs ) ) )
+    return specs[0], sum( runtimes )
+
+#############################################
+# Parameter grid
+#############################################
+
+def parseParam( text, spec ):
+    """Parses 'name[i][j]=v1,v2,...' into ( name, indices, values ),
+    with the values typed like the entry they replace."""
+    key, values = text.split( '=', 1 )
+    m = re.match( r'\s*(\w+)((\[\d+\])*)\s*$', key )
+    if not m:
+        raise ValueError( 'bad --param ' + text )
+    name = m.group( 1 )
+    indices = [ int( i ) for i in re.findall( r'\[(\d+)\]', m.group( 2 ) ) ]
+    current = spec.get( name )
+    for i in indices:
+        current = current[i]
+    values = [ v.strip() for v in values.split( ',' ) ]
+    if not isinstance( current, str ):
+        values = [ ast.literal_eval( v ) for v in values ]
+    return name, indices, values
+
+def applyParams( spec, params, point ):
+    spec = copy.deepcopy( spec )
+    for ( name, indices, values ), v in zip( params, point ):
+        if not indices:
+            spec[name] = v
+            continue
+        target = spec[name]
+        for i in indices[:-1]:
+            target = target[i]
+        target[indices[-1]] = v
+    return spec
+
+#############################################
+# Worker side
+#############################################
+
+_worker = {}
+
+def initWorker( script, spec, params, runtime, seed ):
+    import matplotlib
+    matplotlib.use( 'Agg' )
+    os.chdir( os.path.dirname( os.path.abspath( script ) ) )
+    _worker.update( spec = spec, params = params, runtime = runtime,
+            seed = seed, reload = any( p[0].endswith( 'Proto' ) for p in params ) )
+
+def runPoint( job ):
+    import moose
+    import rdesigneur as rd
+    k, point = job
+    w = _worker
+    if w['reload'] and moose.exists( '/library' ):
+        moose.delete( '/library' )
+    if w['seed'] is not None:
+        np.random.seed( w['seed'] )
+        moose.seed( w['seed'] )
+    t0 = time.time()
+    rdes = rd.rdesigneur( **applyParams( w['spec'], w['params'], point ) )
+    rdes.buildModel()
+    t1 = time.time()
+    moose.reinit()
+    moose.start( w['runtime'] )
+    t2 = time.time()
+    plots = []
+    for i in rdes.plotNames + rdes.wavePlotNames:
+        tabs = moose.vec( i[0] )
+        plots.append( ( i[0].split( '/' )[-1], i[1], i[4],
+            np.array( [ t.vector for t in tabs ] ), tabs[0].dt ) )
+    moose.delete( '/model' )
+    # The chem prototype is renamed and emptied by the build.
+    if moose.exists( '/library/temp_chem' ):
+        moose.delete( '/library/temp_chem' )
+    return k, point, plots, t1 - t0, t2 - t1
+
+#############################################
+# Driver
+#############################################
+
+def main():
+    parser = argparse.ArgumentParser( description = 'Sweeps an rdesigneur '
+            'tutorial model over a grid of parameters.' )
+    parser.add_argument( 'script', nargs = '?', help = 'example script, '
+            'e.g. ex9.1_chans_in_neuronal_morpho.py' )
+    parser.add_argument( '--param', action = 'append', default = [],
+            help = "name[i][j]=v1,v2,... ; may be repeated" )
+    parser.add_argument( '--runtime', type = float, default = None )
+    parser.add_argument( '--seed', type = int, default = None,
+            help = 'seed numpy and moose with this before every point' )
+    parser.add_argument( '--processes', '-p', type = int, default = None,
+            help = 'worker processes (default: all cores)' )
+    parser.add_argument( '--out', '-o', default = 'rdesSweep.h5' )
+    args = parser.parse_args()
+    if args.script is None:
+        # Nothing to sweep, as when the examples are run without arguments.
+        parser.print_usage()
+        return
+
+    import h5py
+    script = os.path.abspath( args.script )
+    spec, runtime = captureSpec( script )
+    if args.runtime is not None:
+        runtime = args.runtime
+    if runtime <= 0:
+        parser.error( 'no run time found in {}; give --runtime'.format( args.script ) )
+    params = [ parseParam( p, spec ) for p in args.param ]
+    grid = list( itertools.product( *[ p[2] for p in params ] ) )
+    names = [ p[0] + ''.join( '[{}]'.format( i ) for i in p[1] ) for p in params ]
+    print( '{}: {} points of {} s'.format( os.path.basename( script ),
+        len( grid ), runtime ) )
+
+    t0 = time.time()
+    pool = multiprocessing.Pool( args.processes, initWorker,
+            ( script, spec, params, runtime, args.seed ) )
+    try:
+        with h5py.File( args.out, 'w' ) as f:
+            f.attrs['script'] = os.path.basename( script )
+            f.attrs['runtime'] = runtime
+            f.attrs['params'] = names
+            for k, point, plots, buildTime, runTime in pool.imap_unordered(
+                    runPoint, list( enumerate( grid ) ), chunksize = 1 ):
+                g = f.create_group( 'point{:04d}'.format( k ) )
+                for name, v in zip( names, point ):
+                    g.attrs[name] = v
+                g.attrs['buildTime'] = buildTime
+                g.attrs['runTime'] = runTime
+                for tab, title, units, data, dt in plots:
+                    d = g.create_dataset( tab, data = data )
+                    d.attrs['title'] = title
+                    d.attrs['units'] = units
+                    d.attrs['dt'] = dt
+                print( 'point {:4d} {}  build {:.2f} s, run {:.2f} s'.format(
+                    k, ', '.join( '{}={}'.format( n, v ) for n, v in
+                    zip( names, point ) ), buildTime, runTime ) )
+    finally:
+        pool.close()
+        pool.join()
+    print( 'Wrote {} in {:.1f} s'.format( args.out, time.time() - t0 ) )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+'''
+Scaling benchmark for spiny neuron models built by rdesigneur.
+
+The model is that of ex9.2_spines_in_neuronal_morpho.py: the h10.CNG.swc
+morphology with its channels, active spines on the dendrites, and in
+addition the Ca model of chem/CaOnly.g in dendrite, spine and psd meshes
+with an adaptor from the Ca_conc of each spine head to the spine Ca. The
+spine spacing of the spineDistrib is swept, so the electrical
+compartments, the spine and psd voxels and the adaptors all grow with
+the spine count while the morphology stays fixed. Ca.xml is left out of
+the channels: in current builds its gate tables come up empty and every
+step prints an error, which would swamp the timings.
+
+Every spacing runs in its own process, which records
+    buildTime       rdes.buildModel()
+    reinitTime      moose.reinit()
+    stepTime        wall time per elec step over --runtime
+    elecShare, diffusionShare, adaptorShare, kineticsShare
+                    the share of the run taken by each solver family,
+                    from a second run of the same length with the ticks
+                    of that family switched off (given a dt of 1e6 s, as
+                    rdesigneur does to turn off the elec model). What is
+                    left, mostly the tables and the scheduler, is otherShare.
+    memMB           peak memory over that of a process that has only
+                    imported moose and rdesigneur
+and the spine, compartment, voxel and adaptor counts.
+
+The report is JSON, or CSV if the file name ends in .csv. The summary
+gives the log-log slope of each cost against the spine count between
+successive points, and names the first spine count from which a cost
+grows faster than linearly (slope above --superlinear).
+
+Example:
+    python spineScalingBenchmark.py --spacing 20e-6 5e-6 2e-6 1e-6 0.5e-6 \\
+            --runtime 0.05 -o spines.csv --plot spines.png
+'''
+
+from __future__ import print_function
+import argparse
+import csv
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+scriptDir = os.path.dirname( os.path.realpath( __file__ ) )
+tickGroups = [
+    ( 'elec', list( range( 0, 8 ) ) ),
+    ( 'diffusion', [ 10 ] ),
+    ( 'adaptor', [ 11 ] ),
+    ( 'kinetics', list( range( 13, 18 ) ) ),
+]   # As rdesigneurFamilies in ../../util/clockTuner.py
+shares = [ g[0] + 'Share' for g in tickGroups ] + [ 'otherShare' ]
+costs = [ 'buildTime', 'reinitTime', 'stepTime', 'memMB' ]
+
+#############################################
+# Worker side: one spacing per process
+#############################################
+
+def makeModel( spacing, chem, chemDt, diffDt ):
+    import rdesigneur as rd
+    kwargs = {}
+    if chem:
+        kwargs = dict(
+            chemProto = [['./chem/CaOnly.g', 'chem']],
+            chemDistrib = [
+                ['kinetics', '#dend#,#apical#', 'dend', '1', 10e-6],
+                ['compartment_1', '#', 'spine', '1', 'kinetics']],
+            adaptorList = [
+                [ 'Ca_conc', 'Ca', 'compartment_1/Ca', 'conc', 0.00008, 8 ]],
+            chemDt = chemDt,
+            diffDt = diffDt
+        )
+    return rd.rdesigneur(
+        chanProto = [
+            ['./chans/hd.xml'],
+            ['./chans/kap.xml'],
+            ['./chans/kad.xml'],
+            ['./chans/kdr.xml'],
+            ['./chans/na3.xml'],
+            ['./chans/nax.xml'],
+            ['./chans/CaConc.xml']
+        ],
+        cellProto = [['./cells/h10.CNG.swc', 'elec']],
+        spineProto = [['makeActiveSpine()', 'spine']],
+        chanDistrib = [
+            ["hd", "#dend#,#apical#", "Gbar", "50e-2*(1+(p*3e4))" ],
+            ["kdr", "#", "Gbar", "p < 50e-6 ? 500 : 100" ],
+            ["na3", "#soma#,#dend#,#apical#", "Gbar", "850" ],
+            ["nax", "#soma#,#axon#", "Gbar", "1250" ],
+            ["kap", "#axon#,#soma#", "Gbar", "300" ],
+            ["kap", "#dend#,#apical#", "Gbar",
+                "300*(H(100-p*1e6)) * (1+(p*1e4))" ],
+            ["Ca_conc", "#", "tau", "0.0133" ],
+            ["kad", "#soma#,#dend#,#apical#", "Gbar", "50" ]
+        ],
+        spineDistrib = [['spine', '#dend#,#apical#', str( spacing ), '1e-6']],
+        stimList = [['soma', '1', '.', 'inject', '(t>0.02) * 1e-9' ]],
+        plotList = [['soma', '1', '.', 'Vm', 'Soma membrane potential']],
+        **kwargs
+    )
+
+def maxRss():
+    """Peak resident memory of this process in MB."""
+    return resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss / 1024.0
+
+def timeRun( runtime, ticks = () ):
+    """Wall time of moose.start( runtime ) with ticks switched off."""
+    import moose
+    dts = moose.element( '/clock' ).dts
+    saved = [ dts[i] for i in ticks ]
+    for i in ticks:
+        moose.setClock( i, 1e6 )
+    t0 = time.time()
+    moose.start( runtime )
+    wallTime = time.time() - t0
+    for i, dt in zip( ticks, saved ):
+        moose.setClock( i, dt )
+    return wallTime
+
+def modelCounts():
+    import moose
+    chemCompts = moose.wildcardFind( '/model/chem/##[ISA=ChemCompt]' )
+    return {
+        'spines': len( moose.wildcardFind( '/model/elec/#head#[ISA=CompartmentBase]' ) ),
+        'compartments': len( moose.wildcardFind( '/model/elec/##[ISA=CompartmentBase]' ) ),
+        'voxels': int( sum( len( c.voxelVolume ) for c in chemCompts ) ),
+        'adaptors': len( moose.wildcardFind( '/model/##[ISA=Adaptor]' ) ),
+    }
+
+def worker( spacing, chem, chemDt, diffDt, runtime, out ):
+    import moose
+    import rdesigneur
+    os.chdir( scriptDir )
+    baseMem = maxRss()
+    rdes = makeModel( spacing, chem, chemDt, diffDt )
+    t0 = time.time()
+    rdes.buildModel()
+    buildTime = time.time() - t0
+    t0 = time.time()
+    moose.reinit()
+    reinitTime = time.time() - t0
+    record = { 'buildTime': buildTime, 'reinitTime': reinitTime }
+    wallTime = timeRun( runtime )
+    record['stepTime'] = wallTime / round( runtime / rdes.elecDt )
+    rest = 1.0
+    for name, ticks in tickGroups:
+        share = max( 0.0, 1.0 - timeRun( runtime, ticks ) / wallTime )
+        record[name + 'Share'] = share
+        rest -= share
+    record['otherShare'] = max( 0.0, rest )
+    record['memMB'] = maxRss() - baseMem
+    record.update( modelCounts() )
+    with open( out, 'w' ) as f:
+        json.dump( record, f )
+
+#############################################
+# Driver
+#############################################
+
+def runOne( spacing, args ):
+    record = { 'spacing': spacing, 'chem': not args.noChem,
+            'runtime': args.runtime }
+    fd, out = tempfile.mkstemp( prefix = 'spinebench_', suffix = '.json' )
+    os.close( fd )
+    cmd = [ sys.executable, os.path.realpath( __file__ ), '--worker',
+            '--spacing', str( spacing ), '--chemDt', str( args.chemDt ),
+            '--diffDt', str( args.diffDt ), '--runtime', str( args.runtime ),
+            '--out', out ]
+    if args.noChem:
+        cmd.append( '--noChem' )
+    try:
+        p = subprocess.run( cmd, timeout = args.timeout,
+                stdout = subprocess.PIPE, stderr = subprocess.STDOUT )
+        with open( out ) as f:
+            record.update( json.load( f ) )
+        record['status'] = 'OK'
+    except subprocess.TimeoutExpired:
+        record['status'] = 'TIMEOUT'
+    except ValueError:
+        record['status'] = 'FAILED'
+        lines = p.stdout.decode( 'utf8', 'replace' ).strip().splitlines()
+        record['error'] = lines[-1] if lines else 'exit code %d' % p.returncode
+    os.remove( out )
+    return record
+
+def scalingSlopes( records, threshold ):
+    """Adds the log-log slope against spine count of each cost to every
+    point after the first, and returns { cost: first superlinear spine
+    count }."""
+    ok = sorted( ( r for r in records if r['status'] == 'OK' ),
+            key = lambda r: r['spines'] )
+    onset = {}
+    for prev, r in zip( ok, ok[1:] ):
+        if r['spines'] <= prev['spines']:
+            continue
+        dn = np.log( r['spines'] / float( prev['spines'] ) )
+        for c in costs:
+            if prev[c] > 0 and r[c] > 0:
+                r[c + 'Slope'] = np.log( r[c] / prev[c] ) / dn
+                if r[c + 'Slope'] > threshold and c not in onset:
+                    onset[c] = prev['spines']
+    return onset
+
+def printSummary( records, onset ):
+    print( '{:>8} {:>6} {:>6} {:>6} {:>5} {:>8} {:>8} {:>9} {:>7} '
+            '{:>5} {:>5} {:>5} {:>5} {:>5}'.format( 'spacing', 'spines',
+            'compts', 'voxels', 'adapt', 'build(s)', 'reinit(s)',
+            'step(ms)', 'mem(MB)', 'elec', 'diff', 'adapt', 'kin', 'other' ) )
+    for r in sorted( records, key = lambda r: -r['spacing'] ):
+        if r['status'] != 'OK':
+            print( '{:8.2g} {}'.format( r['spacing'], r['status'] ) )
+            continue
+        print( '{:8.2g} {:6d} {:6d} {:6d} {:5d} {:8.3f} {:8.3f} {:9.4f} '
+                '{:7.1f} {:5.2f} {:5.2f} {:5.2f} {:5.2f} {:5.2f}'.format(
+                r['spacing'], r['spines'], r['compartments'], r['voxels'],
+                r['adaptors'], r['buildTime'], r['reinitTime'],
+                r['stepTime'] * 1e3, r['memMB'], r['elecShare'],
+                r['diffusionShare'], r['adaptorShare'], r['kineticsShare'],
+                r['otherShare'] ) )
+    for c in costs:
+        if c in onset:
+            print( '    {} grows faster than linearly from {} spines'.format(
+                c, onset[c] ) )
+
+def writeReport( records, fname, args ):
+    if fname.endswith( '.csv' ):
+        keys = [ 'spacing', 'chem', 'runtime', 'status', 'spines',
+                'compartments', 'voxels', 'adaptors' ] + costs + [
+                c + 'Slope' for c in costs ] + shares + [ 'error' ]
+        with open( fname, 'w' ) as f:
+            w = csv.DictWriter( f, keys, extrasaction = 'ignore' )
+            w.writeheader()
+            w.writerows( records )
+    else:
+        with open( fname, 'w' ) as f:
+            json.dump( { 'chemDt': args.chemDt, 'diffDt': args.diffDt,
+                'runs': records }, f, indent = 2 )
+    print( 'Wrote ' + fname )
+
+def plotCurves( records, fname ):
+    import matplotlib
+    matplotlib.use( 'Agg' )
+    import matplotlib.pyplot as plt
+    ok = sorted( ( r for r in records if r['status'] == 'OK' ),
+            key = lambda r: r['spines'] )
+    n = [ r['spines'] for r in ok ]
+    labels = [ 'Build (s)', 'Reinit (s)', 'Step (s)', 'Memory (MB)' ]
+    fig, axes = plt.subplots( 2, 3, figsize = ( 14, 8 ) )
+    for ax, c, label in zip( axes.flat, costs, labels ):
+        ax.loglog( n, [ max( r[c], 1e-6 ) for r in ok ], 'o-' )
+        if ok:
+            # Linear scaling from the first point, for reference.
+            ax.loglog( n, [ max( ok[0][c], 1e-6 ) * k / float( n[0] ) for k in n ],
+                    ':', color = 'grey' )
+        ax.set_xlabel( 'Spines' )
+        ax.set_ylabel( label )
+    ax = axes.flat[4]
+    bottom = np.zeros( len( ok ) )
+    for name in shares:
+        share = np.array( [ r[name] for r in ok ] )
+        ax.bar( range( len( ok ) ), share, bottom = bottom, label = name[:-5] )
+        bottom += share
+    ax.set_xticks( range( len( ok ) ) )
+    ax.set_xticklabels( n )
+    ax.set_xlabel( 'Spines' )
+    ax.set_ylabel( 'Share of step time' )
+    ax.legend( fontsize = 'small' )
+    axes.flat[5].axis( 'off' )
+    fig.tight_layout()
+    fig.savefig( fname )
+    print( 'Wrote ' + fname )
+
+def main():
+    parser = argparse.ArgumentParser( description = 'Scaling of rdesigneur '
+        'spiny neuron models with the number of spines.' )
+    parser.add_argument( '--spacing', type = float, nargs = '+',
+        default = [ 20e-6, 10e-6, 5e-6, 2e-6, 1e-6, 0.5e-6 ],
+        help = 'spine spacings (m)' )
+    parser.add_argument( '--noChem', action = 'store_true',
+        help = 'electrical model only' )
+    parser.add_argument( '--chemDt', type = float, default = 0.002 )
+    parser.add_argument( '--diffDt', type = float, default = 0.002 )
+    parser.add_argument( '--runtime', type = float, default = 0.05 )
+    parser.add_argument( '--superlinear', type = float, default = 1.2,
+        help = 'log-log slope above which a cost counts as superlinear' )
+    parser.add_argument( '--timeout', type = float, default = 3600 )
+    parser.add_argument( '--report', '-o', default = 'spineScalingBenchmark.json',
+        help = 'report file, .json or .csv' )
+    parser.add_argument( '--plot', default = None,
+        help = 'save the scaling curves to this image' )
+    parser.add_argument( '--worker', action = 'store_true',
+        help = argparse.SUPPRESS )
+    parser.add_argument( '--out', help = argparse.SUPPRESS )
+    args = parser.parse_args()
+
+    if args.worker:
+        worker( args.spacing[0], not args.noChem, args.chemDt, args.diffDt,
+                args.runtime, args.out )
+        return
+
+    records = []
+    for spacing in sorted( args.spacing, reverse = True ):
+        # Once a spacing has timed out, closer ones will too.
+        if any( r['status'] == 'TIMEOUT' for r in records ):
+            continue
+        print( 'spacing = {:g}'.format( spacing ) )
+        sys.stdout.flush()
+        records.append( runOne( spacing, args ) )
+    onset = scalingSlopes( records, args.superlinear )
+    writeReport( records, args.report, args )
+    printSummary( records, onset )
+    if args.plot:
+        plotCurves( records, args.plot )
+
+if __name__ == '__main__':
+    main()
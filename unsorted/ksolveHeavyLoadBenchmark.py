@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+
+'''
+Scaling benchmark for the chemical solvers, built on the bistable motif
+of ksolve_with_heavy_load.py::
+
+    a ---b---> 2b    # b catalyzes a to form more of b.
+    2b ---c---> a    # c catalyzes b to form a.
+    a <======> 2b    # a interconverts to b.
+
+N copies of the motif are spread over M CubeMesh compartments, each
+with its own Stoich and Ksolve (gsl) or Gsolve (gssa), in one of two
+layouts:
+
+    flat    N/M distinctly named motifs in a single voxel of each
+            compartment, as in ksolve_with_heavy_load.py. This is one
+            large reaction system, and every object is made one at a time.
+    voxels  a single motif per compartment, whose mesh is split into N/M
+            voxels. The build does not grow with N, and the solver
+            advances the voxels independently, which is what the
+            multithreaded solvers of ../parallelSolver divide among threads.
+
+A Stoich collapses pools made with numData > 1 onto the voxels of its
+compartment, so the voxel layout is the only way to create the copies
+in bulk; the flat layout measures what building a large named network
+costs.
+
+Every point runs in its own process, which records the build, reinit
+and run times and the peak memory over that of a process that has only
+imported moose. Throughput is motif-steps per second of wall time:
+N * runtime / dt / wall. NUM_THREADS is set in the worker's environment
+to each value of --threads; builds other than the multithreaded branch
+described in ../parallelSolver/README ignore it, so their curves should
+not change with it.
+
+The report is JSON, or CSV if the file name ends in .csv. A summary
+gives, per curve, the cost per motif-step relative to the cheapest point,
+and the smallest N past that point at which it has more than doubled.
+
+Example:
+    python ksolveHeavyLoadBenchmark.py -N 10 100 1000 10000 \\
+            --compartments 1 4 --layouts flat voxels --threads 1 2 4 \\
+            --plot scaling.png
+'''
+
+from __future__ import print_function
+import argparse
+import csv
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+scriptDir = os.path.dirname( os.path.realpath( __file__ ) )
+layouts = [ 'flat', 'voxels' ]
+solvers = [ 'gsl', 'gssa' ]
+
+#############################################
+# Worker side: one point per process
+#############################################
+
+def makeMotif( compt, suffix = '' ):
+    """Makes one copy of the bistable in compt, with suffix on the names
+    of its pools and reaction."""
+    import moose
+    a = moose.Pool( '%s/a%s' % ( compt.path, suffix ) )
+    b = moose.Pool( '%s/b%s' % ( compt.path, suffix ) )
+    c = moose.Pool( '%s/c%s' % ( compt.path, suffix ) )
+    enz1 = moose.Enz( '%s/enz1' % a.path )
+    enz2 = moose.Enz( '%s/enz2' % c.path )
+    cplx1 = moose.Pool( '%s/cplx' % enz1.path )
+    cplx2 = moose.Pool( '%s/cplx' % enz2.path )
+    reac = moose.Reac( '%s/reac%s' % ( compt.path, suffix ) )
+
+    moose.connect( enz1, 'sub', a, 'reac' )
+    moose.connect( enz1, 'prd', b, 'reac' )
+    moose.connect( enz1, 'prd', b, 'reac' ) # Note 2 molecules of b.
+    moose.connect( enz1, 'enz', b, 'reac' )
+    moose.connect( enz1, 'cplx', cplx1, 'reac' )
+
+    moose.connect( enz2, 'sub', b, 'reac' )
+    moose.connect( enz2, 'sub', b, 'reac' ) # Note 2 molecules of b.
+    moose.connect( enz2, 'prd', a, 'reac' )
+    moose.connect( enz2, 'enz', c, 'reac' )
+    moose.connect( enz2, 'cplx', cplx2, 'reac' )
+
+    moose.connect( reac, 'sub', a, 'reac' )
+    moose.connect( reac, 'prd', b, 'reac' )
+    moose.connect( reac, 'prd', b, 'reac' ) # Note 2 order in b.
+
+    a.concInit = 1
+    b.concInit = 0
+    c.concInit = 0.01
+    enz1.kcat = 0.4
+    enz1.Km = 4
+    enz2.kcat = 0.6
+    enz2.Km = 0.01
+    reac.Kf = 0.001
+    reac.Kb = 0.01
+    return a
+
+def makeModel( numMotifs, numCompts, layout, solver, volume ):
+    """Builds the model and its solvers. Returns moose.vecs of every a."""
+    import moose
+    sys.path.append( os.path.join( scriptDir, '../util' ) )
+    from ensemble import makeEnsembleMesh
+    moose.Neutral( '/model' )
+    sizes = np.diff( np.linspace( 0, numMotifs, numCompts + 1 ).astype( int ) )
+    aList = []
+    for i, n in enumerate( sizes ):
+        if n == 0:
+            continue
+        compt = moose.CubeMesh( '/model/compartment%d' % i )
+        if layout == 'voxels':
+            makeEnsembleMesh( compt, n, volume )
+            aList.append( makeMotif( compt ) )
+        else:
+            compt.volume = volume
+            aList.extend( makeMotif( compt, str( j ) ) for j in range( n ) )
+        if solver == 'gssa':
+            ksolve = moose.Gsolve( compt.path + '/ksolve' )
+        else:
+            ksolve = moose.Ksolve( compt.path + '/ksolve' )
+        stoich = moose.Stoich( compt.path + '/stoich' )
+        stoich.compartment = compt
+        stoich.ksolve = ksolve
+        stoich.reacSystemPath = compt.path + '/##'
+    return [ moose.vec( a ) for a in aList ]
+
+def maxRss():
+    """Peak resident memory of this process in MB."""
+    return resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss / 1024.0
+
+def worker( numMotifs, numCompts, layout, solver, volume, dt, runtime, out ):
+    import moose
+    baseMem = maxRss()
+    for i in range( 10, 18 ):
+        moose.setClock( i, dt )
+    t0 = time.time()
+    aVecs = makeModel( numMotifs, numCompts, layout, solver, volume )
+    buildTime = time.time() - t0
+    t0 = time.time()
+    moose.reinit()
+    reinitTime = time.time() - t0
+    t0 = time.time()
+    moose.start( runtime )
+    wallTime = time.time() - t0
+    meanA = np.mean( np.concatenate( [ v.conc for v in aVecs ] ) )
+    with open( out, 'w' ) as f:
+        json.dump( { 'buildTime': buildTime, 'reinitTime': reinitTime,
+            'wallTime': wallTime, 'memMB': maxRss() - baseMem,
+            'meanA': float( meanA ) }, f )
+
+#############################################
+# Driver
+#############################################
+
+def runOne( numMotifs, numCompts, layout, solver, threads, args ):
+    record = { 'N': numMotifs, 'compartments': numCompts, 'layout': layout,
+            'solver': solver, 'threads': threads, 'dt': args.dt,
+            'runtime': args.runtime }
+    fd, out = tempfile.mkstemp( prefix = 'heavyload_', suffix = '.json' )
+    os.close( fd )
+    cmd = [ sys.executable, os.path.realpath( __file__ ), '--worker',
+            '-N', str( numMotifs ), '--compartments', str( numCompts ),
+            '--layouts', layout, '--solvers', solver,
+            '--volume', str( args.volume ), '--dt', str( args.dt ),
+            '--runtime', str( args.runtime ), '--out', out ]
+    env = dict( os.environ, NUM_THREADS = str( threads ) )
+    try:
+        p = subprocess.run( cmd, env = env, timeout = args.timeout,
+                stdout = subprocess.PIPE, stderr = subprocess.STDOUT )
+        with open( out ) as f:
+            record.update( json.load( f ) )
+        record['status'] = 'OK'
+    except subprocess.TimeoutExpired:
+        record['status'] = 'TIMEOUT'
+    except ValueError:
+        record['status'] = 'FAILED'
+        lines = p.stdout.decode( 'utf8', 'replace' ).strip().splitlines()
+        record['error'] = lines[-1] if lines else 'exit code %d' % p.returncode
+    os.remove( out )
+    if record['status'] == 'OK':
+        steps = numMotifs * args.runtime / args.dt
+        record['motifStepsPerSec'] = steps / max( record['wallTime'], 1e-9 )
+        record['simSecPerSec'] = args.runtime / max( record['wallTime'], 1e-9 )
+    return record
+
+def curveKey( r ):
+    return ( r['layout'], r['solver'], r['compartments'], r['threads'] )
+
+def printSummary( records ):
+    print( '{:>7} {:>7} {:>5} {:>4} {:>8} {:>9} {:>9} {:>9} {:>8} {:>12} {:>8}'.format(
+        'layout', 'solver', 'cmpts', 'thr', 'N', 'build(s)', 'reinit(s)',
+        'run(s)', 'mem(MB)', 'motifStep/s', 'relCost' ) )
+    for key in sorted( set( curveKey( r ) for r in records ) ):
+        curve = sorted( ( r for r in records if curveKey( r ) == key ),
+                key = lambda r: r['N'] )
+        ok = [ r for r in curve if r['status'] == 'OK' ]
+        best = max( [ r['motifStepsPerSec'] for r in ok ] or [ 1.0 ] )
+        bestN = min( [ r['N'] for r in ok if r['motifStepsPerSec'] == best ]
+                or [ 0 ] )
+        knee = None
+        for r in curve:
+            if r['status'] != 'OK':
+                print( '{:>7} {:>7} {:5d} {:4d} {:8d} {}'.format( *( key +
+                    ( r['N'], r['status'] ) ) ) )
+                continue
+            r['relCost'] = best / r['motifStepsPerSec']
+            if knee is None and r['N'] > bestN and r['relCost'] > 2:
+                knee = r['N']
+            print( '{:>7} {:>7} {:5d} {:4d} {:8d} {:9.3f} {:9.3f} {:9.3f} '
+                    '{:8.1f} {:12.4g} {:8.2f}'.format( *( key + ( r['N'],
+                    r['buildTime'], r['reinitTime'], r['wallTime'],
+                    r['memMB'], r['motifStepsPerSec'], r['relCost'] ) ) ) )
+        if knee is not None:
+            print( '    cost per motif-step more than doubles by N = %d' % knee )
+
+def writeReport( records, fname, args ):
+    if fname.endswith( '.csv' ):
+        keys = [ 'layout', 'solver', 'compartments', 'threads', 'N', 'dt',
+                'runtime', 'status', 'buildTime', 'reinitTime', 'wallTime',
+                'memMB', 'motifStepsPerSec', 'simSecPerSec', 'relCost',
+                'meanA', 'error' ]
+        with open( fname, 'w' ) as f:
+            w = csv.DictWriter( f, keys, extrasaction = 'ignore' )
+            w.writeheader()
+            w.writerows( records )
+    else:
+        with open( fname, 'w' ) as f:
+            json.dump( { 'volume': args.volume, 'runs': records }, f,
+                    indent = 2 )
+    print( 'Wrote ' + fname )
+
+def plotCurves( records, fname ):
+    import matplotlib
+    matplotlib.use( 'Agg' )
+    import matplotlib.pyplot as plt
+    fields = [ ( 'buildTime', 'Build (s)' ), ( 'reinitTime', 'Reinit (s)' ),
+            ( 'motifStepsPerSec', 'Motif-steps / s' ), ( 'memMB', 'Memory (MB)' ) ]
+    fig, axes = plt.subplots( 2, 2, figsize = ( 10, 8 ) )
+    for ax, ( field, label ) in zip( axes.flat, fields ):
+        for key in sorted( set( curveKey( r ) for r in records ) ):
+            curve = sorted( ( r for r in records if curveKey( r ) == key
+                    and r['status'] == 'OK' ), key = lambda r: r['N'] )
+            if curve:
+                ax.loglog( [ r['N'] for r in curve ],
+                        [ max( r[field], 1e-6 ) for r in curve ], 'o-',
+                        label = '{} {} M={} thr={}'.format( *key ) )
+        ax.set_xlabel( 'N motifs' )
+        ax.set_ylabel( label )
+    axes[0, 0].legend( fontsize = 'small' )
+    fig.tight_layout()
+    fig.savefig( fname )
+    print( 'Wrote ' + fname )
+
+def main():
+    parser = argparse.ArgumentParser( description = 'Scaling of the '
+        'chemical solvers with the number of copies of a bistable motif.' )
+    parser.add_argument( '-N', type = int, nargs = '+',
+        default = [ 10, 100, 1000, 10000, 100000 ], help = 'motif counts' )
+    parser.add_argument( '--compartments', '-M', type = int, nargs = '+',
+        default = [ 1 ], help = 'compartments the motifs are split over' )
+    parser.add_argument( '--layouts', nargs = '+', default = layouts,
+        choices = layouts )
+    parser.add_argument( '--solvers', nargs = '+', default = [ 'gsl' ],
+        choices = solvers )
+    parser.add_argument( '--threads', type = int, nargs = '+', default = [ 1 ],
+        help = 'values of NUM_THREADS to try' )
+    parser.add_argument( '--volume', type = float, default = 1e-18,
+        help = 'volume per motif (m^3); sets the molecule counts for gssa' )
+    parser.add_argument( '--dt', type = float, default = 0.1 )
+    parser.add_argument( '--runtime', type = float, default = 10.0 )
+    parser.add_argument( '--timeout', type = float, default = 1800 )
+    parser.add_argument( '--report', '-o', default = 'ksolveHeavyLoadBenchmark.json',
+        help = 'report file, .json or .csv' )
+    parser.add_argument( '--plot', default = None,
+        help = 'save the scaling curves to this image' )
+    parser.add_argument( '--worker', action = 'store_true',
+        help = argparse.SUPPRESS )
+    parser.add_argument( '--out', help = argparse.SUPPRESS )
+    args = parser.parse_args()
+
+    if args.worker:
+        worker( args.N[0], args.compartments[0], args.layouts[0],
+                args.solvers[0], args.volume, args.dt, args.runtime, args.out )
+        return
+
+    records = []
+    for layout, solver, numCompts, threads, n in itertools.product(
+            args.layouts, args.solvers, args.compartments, args.threads,
+            sorted( args.N ) ):
+        if n < numCompts:
+            continue
+        # Once a curve has timed out, larger N will too.
+        if any( r['status'] == 'TIMEOUT' and r['N'] < n and
+                curveKey( r ) == ( layout, solver, numCompts, threads )
+                for r in records ):
+            continue
+        print( '{} {} M={} threads={} N={}'.format( layout, solver,
+            numCompts, threads, n ) )
+        sys.stdout.flush()
+        records.append( runOne( n, numCompts, layout, solver, threads, args ) )
+    writeReport( records, args.report, args )
+    printSummary( records )
+    if args.plot:
+        plotCurves( records, args.plot )
+
+if __name__ == '__main__':
+    main()
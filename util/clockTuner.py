@@ -0,0 +1,235 @@
+# clockTuner.py ---
+#
+# Filename: clockTuner.py
+# Description: Picks the clock dts of a built multiscale model by trial runs.
+#
+# Commentary:
+#
+# Multiscale models run their elec, diffusion and chem solvers on
+# separate families of clock ticks, with dts picked by hand. A ClockTuner
+# runs the built model for a short time at a fine reference dt, then
+# again with the dt of one family at a time scaled up or down by powers
+# of two, and compares chosen output tables with the reference:
+#
+#   tuner = ClockTuner( [ '/model/graphs/plot0', '/model/graphs/plot1' ],
+#           runtime = 0.5, tol = 0.01 )
+#   best = tuner.tune()     # { family: largest dt within tol }
+#   tuner.report()
+#   tuner.apply( best )
+#
+# The families default to the ticks rdesigneur uses, as in
+# spineScalingBenchmark.py: elec on 0-7, diffusion on 10, adaptors on 11
+# and kinetics on 13-17. A family with an HSolve on one of its ticks is
+# left out: the HSolve sets up its matrix for the dt it has when given
+# its target and keeps stepping by that dt whatever its tick, and cannot
+# be made again once its channels are zombified. To tune the elec dt of
+# such a model, build it again with another dt (elecDt in rdesigneur).
+# Other scripts
+# give their own with addFamily, e.g. for test_ksolve:
+#
+#   tuner = ClockTuner( tables, 0.1, families = [] )
+#   tuner.addFamily( 'elec', [ 0, 1, 2 ] )
+#   tuner.addFamily( 'chem', [ 5, 6 ] )
+#
+# A first run at the current dts is thrown away, as on some models, such
+# as ex13.1_BCM_multiscale, the first run after the build differs from
+# all later ones. The reference has every family at dt / ( 2 * refine ).
+# It is first checked against a run at dt / refine; if the two differ by
+# more than tol the reference has not converged and tuning stops with a
+# warning. So it does if the current dts are already more than tol from
+# the reference, since then no trial can be judged against them. A trial
+# changes one family and leaves the rest at their current dt. Its error
+# is the largest deviation from the reference over the tables, each
+# relative to the range of its reference trace, or the RMS deviation
+# with metric = 'rms'. A trial passes if its error is within tol. The
+# recommended dt of a family is the largest, counting up from the
+# smallest, before the first that fails or gives a non-finite value;
+# larger steps are not tried once one fails. Spike trains make poor
+# outputs, as a slight shift in spike time gives a large error; Ca or
+# chem traces serve better. Plot ticks must not be in any family, so
+# that every run samples at the same times.
+#
+# Each family is tuned with the others at their current dt, so the
+# report ends with a run at all the recommended dts together, whose
+# error can exceed that of any one of them. Every trial starts with
+# moose.reinit, and with moose.seed( seed ) so that random inputs are
+# the same in all of them; otherwise their noise, not the dt, sets the
+# error. Tune before the production run. The dts are put back when
+# tuning ends; apply() sets new ones.
+#
+
+# Code:
+
+from __future__ import print_function
+import time
+import numpy
+import moose
+
+rdesigneurFamilies = [
+    ( 'elec', list( range( 0, 8 ) ) ),
+    ( 'diffusion', [ 10 ] ),
+    ( 'adaptor', [ 11 ] ),
+    ( 'kinetics', list( range( 13, 18 ) ) ),
+]
+
+class ClockTuner:
+    def __init__( self, tables, runtime, tol = 0.01, refine = 4,
+            factors = ( 0.5, 1, 2, 4, 8, 16, 32 ), metric = 'max',
+            families = None, seed = 1234 ):
+        self.tables = [ moose.element( t ) for t in _expand( tables ) ]
+        self.runtime = runtime
+        self.tol = tol
+        self.refine = refine
+        self.factors = sorted( factors )
+        self.metric = metric
+        self.seed = seed
+        self.families = []  # ( name, ticks )
+        for name, ticks in rdesigneurFamilies if families is None else families:
+            self.addFamily( name, ticks )
+        self.trials = {}    # family: [ ( dt, error, wallTime ) ]
+        self.baseWallTime = 0.0
+        self.warning = None
+        self.fixed = []     # Families not tuned, as they have an HSolve
+
+    def addFamily( self, name, ticks ):
+        """Tunes ticks together as one family called name."""
+        self.families.append( ( name, list( ticks ) ) )
+
+    def dts( self ):
+        """Current dt of each family, from its first tick."""
+        clockDts = moose.element( '/clock' ).dts
+        return dict( ( name, clockDts[ticks[0]] ) for name, ticks in self.families )
+
+    def apply( self, dts ):
+        """Sets the ticks of each family in dts to its dt."""
+        for name, ticks in self.families:
+            if dts.get( name ) is not None:
+                for i in ticks:
+                    moose.setClock( i, dts[name] )
+
+    def _run( self, dts ):
+        self.apply( dts )
+        if self.seed is not None:
+            moose.seed( self.seed )
+            numpy.random.seed( self.seed )
+        moose.reinit()
+        t0 = time.time()
+        moose.start( self.runtime )
+        wallTime = time.time() - t0
+        return [ numpy.array( t.vector ) for t in self.tables ], wallTime
+
+    def error( self, traces, ref ):
+        """Deviation of traces from ref, relative to the range of each
+        reference trace, taken over all tables."""
+        worst = 0.0
+        for x, y in zip( traces, ref ):
+            n = min( len( x ), len( y ) )
+            if n == 0:
+                continue
+            d = x[:n] - y[:n]
+            if not numpy.all( numpy.isfinite( d ) ):
+                return numpy.inf
+            scale = max( numpy.ptp( y[:n] ), 1e-6 * numpy.abs( y[:n] ).max(), 1e-30 )
+            if self.metric == 'rms':
+                e = numpy.sqrt( numpy.mean( d * d ) ) / scale
+            else:
+                e = numpy.abs( d ).max() / scale
+            worst = max( worst, e )
+        return worst
+
+    def tune( self ):
+        """Runs the trials. Returns { family: recommended dt or None },
+        with every dt None if the reference or the current dts are not
+        within tol."""
+        current = self.dts()
+        self.trials = {}
+        best = dict( ( name, None ) for name, ticks in self.families )
+        hsolveTicks = set( h.tick for h in moose.wildcardFind( '/##[ISA=HSolve]' ) )
+        self.fixed = [ name for name, ticks in self.families
+                if hsolveTicks.intersection( ticks ) ]
+        tuned = dict( ( k, v ) for k, v in current.items() if k not in self.fixed )
+        self.bestError = numpy.nan
+        self.bestWallTime = numpy.nan
+        self.warning = None
+        try:
+            # The first run after a build can differ from every later
+            # one at the same dts, so it is thrown away.
+            self._run( current )
+            ref, refWall = self._run( dict( ( name, dt / ( 2 * self.refine ) )
+                    for name, dt in tuned.items() ) )
+            coarse, refWall = self._run( dict( ( name, dt / self.refine )
+                    for name, dt in tuned.items() ) )
+            self.refError = self.error( coarse, ref )
+            base, self.baseWallTime = self._run( current )
+            self.baseError = self.error( base, ref )
+            if not self.refError <= self.tol:
+                self.warning = ( 'reference has not converged: dt / {} and '
+                    'dt / {} differ by {:.3g}'.format( self.refine,
+                    2 * self.refine, self.refError ) )
+            elif not self.baseError <= self.tol:
+                self.warning = ( 'current dts are {:.3g} from the reference; '
+                    'reduce them before tuning'.format( self.baseError ) )
+            if self.warning is not None:
+                print( 'WARNING: ClockTuner: {}, above tol = {:g}. No dts '
+                    'recommended.'.format( self.warning, self.tol ) )
+                self.best = best
+                return best
+            for name, ticks in self.families:
+                if name in self.fixed:
+                    continue
+                self.trials[name] = []
+                for f in self.factors:
+                    dts = dict( current )
+                    dts[name] = current[name] * f
+                    traces, wallTime = self._run( dts )
+                    err = self.error( traces, ref )
+                    self.trials[name].append( ( dts[name], err, wallTime ) )
+                    if not err <= self.tol:
+                        break
+                    best[name] = dts[name]
+            dts = dict( current )
+            dts.update( ( k, v ) for k, v in best.items() if v is not None )
+            traces, self.bestWallTime = self._run( dts )
+            self.bestError = self.error( traces, ref )
+        finally:
+            self.apply( current )
+        self.best = best
+        return best
+
+    def report( self ):
+        """Prints the trials, and the run time at the recommended dts."""
+        current = self.dts()
+        print( 'Reference: dt / {} against dt / {}, error {:.3g}'.format(
+            self.refine, 2 * self.refine, self.refError ) )
+        print( 'Current dts: error {:.3g}, {:.3f} s for {} s'.format(
+            self.baseError, self.baseWallTime, self.runtime ) )
+        if self.warning is not None:
+            print( 'No dts tuned: ' + self.warning )
+            return
+        for name, ticks in self.families:
+            print( '{} (ticks {}), now {:g}'.format( name, ticks, current[name] ) )
+            if name in self.fixed:
+                print( '    not tuned: an HSolve keeps the dt it was built with' )
+                continue
+            for dt, err, wallTime in self.trials.get( name, [] ):
+                print( '    dt = {:<10g} error = {:<10.3g} {:8.3f} s {}'.format(
+                    dt, err, wallTime, '*' if dt == self.best[name] else '' ) )
+            if self.best[name] is None:
+                print( '    no dt tried is within tol = {:g}'.format( self.tol ) )
+        print( 'Recommended dts together: error {:.3g}, {:.3f} s for {} s'.format(
+            self.bestError, self.bestWallTime, self.runtime ) )
+
+def _expand( tables ):
+    # Tables may be given as paths, elements or vecs of tables.
+    out = []
+    for t in tables:
+        if isinstance( t, moose.vec ):
+            out.extend( t )
+        elif isinstance( t, str ):
+            out.extend( moose.vec( t ) )
+        else:
+            out.append( t )
+    return out
+
+#
+# clockTuner.py ends here
@@ -0,0 +1,122 @@
+# ensemble.py ---
+#
+# Filename: ensemble.py
+# Description: Many independent stochastic trajectories in one Gsolve.
+#
+# Commentary:
+#
+# Running a GSSA model once per trial pays the model setup, reinit and
+# Python round trips for every trajectory. If the reaction system sits in
+# a CubeMesh, the mesh can instead be split into numTrials voxels of the
+# volume of interest. With no Dsolve attached nothing diffuses between
+# voxels, so the Gsolve advances numTrials independent trajectories
+# together, and the state of all of them is read in one go through
+# moose.vec( pool ).n or .conc.
+#
+#   makeEnsembleMesh( compt, numTrials, volume )   # before the Stoich
+#   ...
+#   switches = SwitchStats( numTrials, lo = 0.4, hi = 0.7 )
+#   hist = Histogram( numpy.linspace( 0, 1.2, 61 ) )
+#   rc = RunController( runtime, chunkTime = 1.0, verbose = False )
+#   rc.addHook( lambda t: switches.update( t, a.conc ) )
+#   rc.addHook( lambda t: hist.update( a.conc ) )
+#   rc.reinit()
+#   rc.run()
+#
+# Both statistics classes are streaming, so memory does not grow with the
+# run length, and they can be merged across worker processes.
+#
+
+# Code:
+
+import numpy as np
+
+def makeEnsembleMesh( compt, numTrials, volume ):
+    """Makes the CubeMesh compt a row of numTrials cubic voxels, each of
+    the given volume. Call it before the Stoich is set up."""
+    side = volume ** ( 1.0 / 3.0 )
+    compt.preserveNumEntries = 0
+    compt.coords = [ 0, 0, 0, numTrials * side, side, side, side, side, side ]
+    assert len( compt.voxelVolume ) == numTrials
+
+class SwitchStats:
+    """Tracks switching between two states in each trial. A trial is in
+    the high state once its observable rises above hi and in the low
+    state once it falls below lo; in between it keeps its last state, so
+    that noise around a single threshold is not counted as switching."""
+    def __init__( self, numTrials, lo, hi, initialState = None ):
+        self.lo = lo
+        self.hi = hi
+        ## 1 high, 0 low, -1 not yet assigned
+        self.state = np.full( numTrials, -1 if initialState is None
+                else initialState, dtype = int )
+        self.lastSwitch = np.zeros( numTrials )
+        self.firstSwitch = np.full( numTrials, np.nan )
+        self.numSwitches = np.zeros( numTrials, dtype = int )
+        self.dwellTimes = [ [], [] ]    # completed dwells in low, high
+        self.t = 0.0
+
+    def update( self, t, x ):
+        x = np.asarray( x )
+        new = np.where( x > self.hi, 1, np.where( x < self.lo, 0, -1 ) )
+        unset = ( self.state < 0 ) & ( new >= 0 )
+        self.state[unset] = new[unset]
+        switched = ( new >= 0 ) & ( new != self.state )
+        for s in ( 0, 1 ):
+            ## leaving state s
+            idx = switched & ( self.state == s )
+            self.dwellTimes[s].extend( t - self.lastSwitch[idx] )
+        first = switched & ( self.numSwitches == 0 )
+        self.firstSwitch[first] = t
+        self.numSwitches[switched] += 1
+        self.lastSwitch[switched] = t
+        self.state[switched] = new[switched]
+        self.t = t
+
+    def merge( self, other ):
+        for s in ( 0, 1 ):
+            self.dwellTimes[s].extend( other.dwellTimes[s] )
+        self.state = np.concatenate( [ self.state, other.state ] )
+        self.lastSwitch = np.concatenate( [ self.lastSwitch, other.lastSwitch ] )
+        self.firstSwitch = np.concatenate( [ self.firstSwitch, other.firstSwitch ] )
+        self.numSwitches = np.concatenate( [ self.numSwitches, other.numSwitches ] )
+        return self
+
+    def summary( self ):
+        """Switching rate per trial per second, fraction of trials that
+        switched at least once, and the median first switch time and
+        dwell times in each state (nan when none were seen)."""
+        def median( v ):
+            return float( np.median( v ) ) if len( v ) else float( 'nan' )
+        switched = np.isfinite( self.firstSwitch )
+        return {
+            'numTrials': len( self.state ),
+            'switchRate': float( self.numSwitches.sum() ) /
+                    max( len( self.state ) * self.t, 1e-12 ),
+            'fracSwitched': float( switched.mean() ) if len( self.state ) else 0.0,
+            'medianFirstSwitch': median( self.firstSwitch[switched] ),
+            'medianDwellLow': median( self.dwellTimes[0] ),
+            'medianDwellHigh': median( self.dwellTimes[1] ),
+            'fracHigh': float( ( self.state == 1 ).mean() ) if len( self.state ) else 0.0,
+        }
+
+class Histogram:
+    """Histogram over fixed bins, accumulated over samples."""
+    def __init__( self, bins ):
+        self.bins = np.asarray( bins, dtype = float )
+        self.counts = np.zeros( len( self.bins ) - 1, dtype = np.int64 )
+
+    def update( self, x ):
+        x = np.clip( x, self.bins[0], self.bins[-1] )
+        self.counts += np.histogram( x, self.bins )[0]
+
+    def merge( self, other ):
+        self.counts += other.counts
+        return self
+
+    def density( self ):
+        return self.counts / max( float( self.counts.sum() ), 1.0 ) / \
+                np.diff( self.bins )
+
+#
+# ensemble.py ends here
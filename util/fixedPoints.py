@@ -0,0 +1,172 @@
+# fixedPoints.py ---
+#
+# Filename: fixedPoints.py
+# Description: Bookkeeping of distinct fixed points found by SteadyState.
+#
+# Commentary:
+#
+# Finding the fixed points of a chemical system with the SteadyState
+# solver means calling state.randomInit() and state.settle() many times,
+# and most calls land on a fixed point that has already been found.
+# FixedPointSet keeps one entry per distinct fixed point, clustered by a
+# relative tolerance on the state vector, counts how often each one was
+# reached and tracks how many samples have gone by since a new one turned
+# up, so that sampling can stop once it stops finding anything new.
+#
+#   fps = FixedPointSet()
+#   while not fps.converged( patience = 20 ):
+#       ... settle from a random start ...
+#       fps.add( concVector, state.stateType )
+#
+# explore() wraps that loop for a Ksolve and SteadyState: it settles from
+# random starts in batches, clusters each batch against the known points
+# in one go, and stops once a run of samples has found nothing new.
+#
+#   fps = explore( lambda: settleSample( ksolve, state, scale ) )
+#   fps.printTable( names )
+#
+
+# Code:
+
+from __future__ import print_function
+import numpy as np
+import moose
+
+## SteadyState.stateType
+stateTypeNames = { 0: 'stable', 1: 'unstable', 2: 'saddle', 3: 'osc?',
+        4: 'zero eig', 5: 'other' }
+
+class FixedPointSet:
+    def __init__( self, rtol = 1e-3, atol = 1e-12 ):
+        self.rtol = rtol
+        self.atol = atol
+        self.points = []
+        self.stateTypes = []
+        self.counts = []
+        self.numSamples = 0
+        self.samplesSinceNew = 0
+        self.numFailures = 0
+
+    def __len__( self ):
+        return len( self.points )
+
+    def find( self, vector ):
+        """Returns the index of the known fixed point matching vector,
+        or -1."""
+        for i, p in enumerate( self.points ):
+            if np.allclose( vector, p, rtol = self.rtol, atol = self.atol ):
+                return i
+        return -1
+
+    def add( self, vector, stateType = None ):
+        """Records one successful settle. Returns ( index, isNew )."""
+        vector = np.asarray( vector, dtype = float )
+        self.numSamples += 1
+        i = self.find( vector )
+        if i >= 0:
+            self.counts[i] += 1
+            self.samplesSinceNew += 1
+            return i, False
+        self.points.append( vector )
+        self.stateTypes.append( stateType )
+        self.counts.append( 1 )
+        self.samplesSinceNew = 0
+        return len( self.points ) - 1, True
+
+    def addBatch( self, vectors, stateTypes = None ):
+        """Records a batch of successful settles, given as the rows of
+        vectors. Returns the index of the fixed point of each row."""
+        vectors = np.atleast_2d( np.asarray( vectors, dtype = float ) )
+        if stateTypes is None:
+            stateTypes = [ None ] * len( vectors )
+        index = np.full( len( vectors ), -1, dtype = int )
+        if len( self.points ) > 0:
+            ## rows x known points, same test as np.allclose( row, point )
+            p = np.array( self.points )
+            close = np.all( np.abs( vectors[:, None, :] - p[None, :, :] ) <=
+                    self.atol + self.rtol * np.abs( p[None, :, :] ), axis = 2 )
+            hit = close.any( axis = 1 )
+            index[hit] = close[hit].argmax( axis = 1 )
+        for j in range( len( vectors ) ):
+            if index[j] >= 0:
+                self.numSamples += 1
+                self.counts[ index[j] ] += 1
+                self.samplesSinceNew += 1
+            else:
+                ## may still match a point first seen earlier in this batch
+                index[j] = self.add( vectors[j], stateTypes[j] )[0]
+        return index
+
+    def addFailure( self ):
+        """Records a settle that did not reach a fixed point."""
+        self.numSamples += 1
+        self.samplesSinceNew += 1
+        self.numFailures += 1
+
+    def converged( self, patience, maxPoints = None ):
+        """True once patience samples in a row found nothing new, or once
+        maxPoints distinct fixed points are known."""
+        if maxPoints is not None and len( self.points ) >= maxPoints:
+            return True
+        return len( self.points ) > 0 and self.samplesSinceNew >= patience
+
+    def basinFractions( self ):
+        """Fraction of the successful settles that reached each point."""
+        counts = np.array( self.counts, dtype = float )
+        return counts / max( counts.sum(), 1.0 )
+
+    def table( self ):
+        """Rows of ( index, stateType, count, basin fraction, vector ),
+        most often found first."""
+        fractions = self.basinFractions()
+        order = np.argsort( self.counts, kind = 'mergesort' )[::-1]
+        return [ ( i, self.stateTypes[i], self.counts[i], fractions[i],
+                self.points[i] ) for i in order ]
+
+    def printTable( self, names = None ):
+        if names is not None:
+            print( '{:>3} {:>9} {:>6} {:>6}  '.format( '#', 'type', 'count',
+                'basin' ) + ' '.join( '{:>8}'.format( n[:8] ) for n in names ) )
+        for i, t, n, f, vector in self.table():
+            print( '{:3d} {:>9} {:6d} {:6.3f}  '.format( i,
+                stateTypeNames.get( t, str( t ) ), n, f ) +
+                ' '.join( '{:8.3g}'.format( x ) for x in vector ) )
+        print( '{} fixed points from {} samples, {} failed to settle'.format(
+            len( self ), self.numSamples, self.numFailures ) )
+
+def settleSample( ksolve, state, scale = 1.0, runtime = 2.0 ):
+    """Settles state from a random initial condition that obeys the
+    conservation laws, running the model for runtime first as that makes
+    the settle more likely to succeed. Returns ( vector, stateType ) with
+    the vector of ksolve.nVec[0] times scale, or None if it failed."""
+    state.randomInit()
+    moose.start( runtime )
+    state.settle()
+    if state.solutionStatus != 0:
+        return None
+    vector = np.array( ksolve.nVec[0] ) * scale
+    if not np.all( np.isfinite( vector ) ):
+        return None
+    return vector, state.stateType
+
+def explore( sample, batchSize = 10, patience = 30, maxSamples = 1000,
+        maxPoints = None, fps = None ):
+    """Calls sample() in batches of batchSize until patience samples in
+    a row have found no new fixed point, maxPoints are known, or
+    maxSamples have been taken. sample() returns ( vector, stateType ), or
+    None if it did not reach a fixed point. Returns the FixedPointSet."""
+    if fps is None:
+        fps = FixedPointSet()
+    while fps.numSamples < maxSamples and \
+            not fps.converged( patience, maxPoints ):
+        batch = [ sample() for i in range( min( batchSize,
+                maxSamples - fps.numSamples ) ) ]
+        found = [ b for b in batch if b is not None ]
+        for i in range( len( batch ) - len( found ) ):
+            fps.addFailure()
+        if found:
+            fps.addBatch( [ b[0] for b in found ], [ b[1] for b in found ] )
+    return fps
+
+#
+# fixedPoints.py ends here
@@ -0,0 +1,130 @@
+# frameRecorder.py ---
+#
+# Filename: frameRecorder.py
+# Description: Headless capture of voxel concentrations for
+#              reaction-diffusion runs.
+#
+# Commentary:
+#
+# The reaction-diffusion demos advance in displayInterval chunks and
+# redraw matplotlib after each one, so they run at the speed of the GUI.
+# FrameRecorder instead copies the voxel vectors of a few pools into
+# preallocated ( frames x voxels ) arrays between chunks and writes them
+# all out once at the end, as .npz, .h5 (needs h5py), or as a movie
+# (.mp4 needs ffmpeg, .gif needs pillow).
+#
+#   rec = FrameRecorder( { 'a': '/model/compartment/a',
+#           'b': '/model/compartment/b' }, numFrames = 201 )
+#   rc = RunController( runtime, chunkTime = displayInterval, verbose = False )
+#   rc.addHook( rec.capture )
+#   rc.reinit()
+#   rec.capture( 0.0 )
+#   rc.run()
+#   rec.save( 'turing.npz' )
+#
+# Scripts take a --headless OUTFILE option that selects this path, see
+# headlessArgs().
+#
+
+# Code:
+
+from __future__ import print_function
+import argparse
+import os
+import numpy as np
+import moose
+
+def headlessArgs( description = None ):
+    """Parses the --headless OUTFILE option shared by the reaction-diffusion
+    demos. Returns the output file name, or None for the usual display."""
+    parser = argparse.ArgumentParser( description = description )
+    parser.add_argument( '--headless', metavar = 'OUTFILE', default = None,
+            help = 'run without display, saving the voxel concentrations '
+            'to OUTFILE (.npz, .h5, .mp4 or .gif)' )
+    return parser.parse_args().headless
+
+class FrameRecorder:
+    def __init__( self, pools, numFrames, field = 'conc' ):
+        """pools maps a name to a pool path (or moose.vec). Each capture
+        stores that field of every voxel of every pool."""
+        self.field = field
+        self.names = list( pools )
+        self.vecs = dict( ( name, p if isinstance( p, moose.vec ) else
+                moose.vec( p ) ) for name, p in pools.items() )
+        self.frames = dict( ( name, np.zeros( ( numFrames, len( v ) ) ) )
+                for name, v in self.vecs.items() )
+        self.times = np.zeros( numFrames )
+        self.numFrames = 0
+
+    def capture( self, t ):
+        """Stores the current state as the next frame. Frames past the
+        preallocated number are dropped with a warning."""
+        i = self.numFrames
+        if i >= len( self.times ):
+            if i == len( self.times ):
+                print( 'FrameRecorder: out of frames at t = {}'.format( t ) )
+            self.numFrames += 1
+            return
+        self.times[i] = t
+        for name, v in self.vecs.items():
+            self.frames[name][i] = getattr( v, self.field )
+        self.numFrames += 1
+
+    def data( self ):
+        """Returns { 't': times, name: ( frames x voxels ) array, ... } for
+        the frames captured so far."""
+        n = min( self.numFrames, len( self.times ) )
+        ret = dict( ( name, f[:n] ) for name, f in self.frames.items() )
+        ret['t'] = self.times[:n]
+        return ret
+
+    def save( self, fname, **kwargs ):
+        """Writes the frames to fname, picking the format from its
+        extension. kwargs go to saveMovie for movies."""
+        ext = os.path.splitext( fname )[1].lower()
+        if ext in ( '.h5', '.hdf5' ):
+            import h5py
+            with h5py.File( fname, 'w' ) as f:
+                for name, d in self.data().items():
+                    f.create_dataset( name, data = d, compression = 'gzip' )
+                f.attrs['field'] = self.field
+        elif ext in ( '.mp4', '.gif' ):
+            self.saveMovie( fname, **kwargs )
+        else:
+            np.savez_compressed( fname, field = self.field, **self.data() )
+        print( 'Wrote {} frames to {}'.format( min( self.numFrames,
+            len( self.times ) ), fname ) )
+
+    def saveMovie( self, fname, names = None, ylim = None, fps = 10,
+            xlabel = 'Voxel #', ylabel = 'Conc (mM)' ):
+        """Renders one line per pool against voxel index, one frame per
+        capture."""
+        import matplotlib.pyplot as plt
+        from matplotlib import animation
+        names = names or self.names
+        data = self.data()
+        fig, ax = plt.subplots( figsize = ( 10, 5 ) )
+        lines = [ ax.plot( data[n][0], label = n )[0] for n in names ]
+        if ylim is None:
+            ylim = ( 0, 1.05 * max( data[n].max() for n in names ) or 1.0 )
+        ax.set_ylim( *ylim )
+        ax.set_xlabel( xlabel )
+        ax.set_ylabel( ylabel )
+        ax.legend()
+        timeLabel = ax.set_title( '' )
+        def draw( i ):
+            for line, n in zip( lines, names ):
+                line.set_ydata( data[n][i] )
+            timeLabel.set_text( 'time = {:g}'.format( data['t'][i] ) )
+            return lines + [ timeLabel ]
+        anim = animation.FuncAnimation( fig, draw, frames = len( data['t'] ),
+                blit = False )
+        if fname.lower().endswith( '.gif' ):
+            writer = animation.PillowWriter( fps = fps )
+        else:
+            writer = animation.FFMpegWriter( fps = fps )
+        anim.save( fname, writer = writer )
+        plt.close( fig )
+
+#
+# frameRecorder.py ends here
@@ -0,0 +1,222 @@
+# modelCache.py ---
+#
+# Filename: modelCache.py
+# Description: Compiled cache of kkit, cspace and SBML chemical models.
+#
+# Commentary:
+#
+# loadModelCached() is a drop-in for moose.loadModel on chemical models.
+# The first time it sees a file it loads it as usual, then walks the
+# resulting tree and saves the compartments, pools, reactions, enzymes,
+# functions and plot tables to an .npz keyed by the SHA-1 of the file
+# contents: names and classes as string arrays, rate constants and
+# initial concentrations as a float array, and the reaction graph as
+# index arrays. Later loads of the same file rebuild the tree straight
+# from those arrays and skip the parser.
+#
+#   modelId = loadModelCached( '../genesis/EGFR_MAPK_58.g', '/model', 'gsl' )
+#
+# The cache holds no solver, so one entry serves every solver. Only the
+# classes listed in _params below are stored, and the solvers and
+# Annotator notes, which carry no kinetics, are left out. A model that
+# uses any other class, such as a StimulusTable, is marked as
+# uncacheable and always goes through moose.loadModel. Edits to the
+# file change its hash, so stale entries are never used.
+#
+# The cache lives in $MOOSE_MODEL_CACHE, or ~/.cache/moose/models.
+#
+# The gain depends on the reader. The Python SBML reader takes a tenth of
+# a second or more, against a few ms for the rebuild, so
+# snippets/loadSbmlmodel.py uses the cache. The kkit and cspace readers
+# are in C++ and as fast as the rebuild or faster, so for those the cache
+# only adds the cost of hashing the file; use moose.loadModel.
+#
+
+# Code:
+
+from __future__ import print_function
+import hashlib
+import os
+import numpy as np
+import moose
+
+cacheVersion = 1
+
+## Stored fields of each cacheable class, set after the messages are in.
+_params = {
+    'Neutral': (),
+    'CubeMesh': ( 'volume', ),
+    'Pool': ( 'concInit', 'diffConst' ),
+    'BufPool': ( 'concInit', 'diffConst' ),
+    'Reac': ( 'Kf', 'Kb' ),
+    'MMenz': ( 'Km', 'kcat' ),
+    'Enz': ( 'Km', 'kcat', 'ratio' ),
+    'Function': (),
+    'Table2': (),
+}
+## Children created by their parents, or that carry no kinetics.
+_skip = ( 'MeshEntry', 'Variable', 'Annotator', 'Ksolve', 'Gsolve',
+        'Stoich', 'Dsolve' )
+
+class Uncacheable( Exception ):
+    pass
+
+def cacheDir():
+    return os.environ.get( 'MOOSE_MODEL_CACHE', os.path.join(
+        os.path.expanduser( '~' ), '.cache', 'moose', 'models' ) )
+
+def fileKey( fname ):
+    h = hashlib.sha1()
+    with open( fname, 'rb' ) as f:
+        h.update( f.read() )
+    return '{}-v{}'.format( h.hexdigest(), cacheVersion )
+
+def _walk( obj, base, out ):
+    for c in obj.children:
+        c = moose.element( c )
+        if c.className in _skip:
+            continue
+        if c.className not in _params:
+            raise Uncacheable( '{} is a {}'.format( c.path, c.className ) )
+        out.append( c )
+        _walk( c, base, out )
+
+def compileModel( path ):
+    """Flattens the chemical model under path into a dict of arrays."""
+    root = moose.element( path )
+    objs = []
+    _walk( root, root.path, objs )
+    index = dict( ( o.path, i ) for i, o in enumerate( objs ) )
+    def idx( n ):
+        p = moose.element( n ).path
+        if p not in index:
+            raise Uncacheable( 'message to {} outside {}'.format( p, path ) )
+        return index[p]
+    numParams = max( len( v ) for v in _params.values() )
+    params = np.zeros( ( len( objs ), numParams ) )
+    exprs = [ '' ] * len( objs )
+    msgs = []   # ( src, dest, kind )
+    for i, o in enumerate( objs ):
+        for j, f in enumerate( _params[o.className] ):
+            params[i, j] = getattr( o, f )
+        if o.className in ( 'Reac', 'Enz', 'MMenz' ):
+            for kind in ( 'sub', 'prd' ):
+                msgs.extend( ( i, idx( n ), kind ) for n in o.neighbors[kind] )
+        if o.className == 'Enz':
+            msgs.extend( ( i, idx( n ), 'enz' ) for n in o.neighbors['enz'] )
+            msgs.extend( ( i, idx( n ), 'cplx' ) for n in o.neighbors['cplx'] )
+        elif o.className == 'MMenz':
+            msgs.extend( ( idx( n ), i, 'enzDest' ) for n in o.neighbors['enzDest'] )
+        elif o.className == 'Function':
+            exprs[i] = o.expr
+            for m in moose.element( o.path + '/x' ).msgIn:
+                if 'input' in m.destFieldsOnE2:
+                    msgs.append( ( idx( m.e1 ), i, 'input' ) )
+            for m in o.msgOut:
+                if 'valueOut' in m.srcFieldsOnE1:
+                    msgs.append( ( i, idx( m.e2 ), 'valueOut:' + m.destFieldsOnE2[0] ) )
+        elif o.className == 'Table2':
+            for m in o.msgOut:
+                if 'requestOut' in m.srcFieldsOnE1:
+                    msgs.append( ( i, idx( m.e2 ), 'requestOut:' + m.destFieldsOnE2[0] ) )
+    rel = [ o.path[ len( root.path ): ] for o in objs ]
+    return {
+        'paths': np.array( rel, dtype = str ),
+        'classes': np.array( [ o.className for o in objs ], dtype = str ),
+        'params': params,
+        'exprs': np.array( exprs, dtype = str ),
+        'msgSrc': np.array( [ m[0] for m in msgs ], dtype = int ),
+        'msgDest': np.array( [ m[1] for m in msgs ], dtype = int ),
+        'msgKind': np.array( [ m[2] for m in msgs ], dtype = str ),
+        'dts': np.array( moose.element( '/clock' ).dts ),
+    }
+
+def buildModel( data, path ):
+    """Rebuilds the tree saved by compileModel under path. Returns its
+    root element."""
+    root = moose.Neutral( path )
+    classes = data['classes']
+    objs = [ getattr( moose, c )( root.path + p )
+            for c, p in zip( classes, data['paths'] ) ]
+    # Volumes first, since they scale the pool initial values, and the
+    # expressions, which make the Function inputs.
+    for o, c, par, expr in zip( objs, classes, data['params'], data['exprs'] ):
+        if c == 'CubeMesh':
+            o.volume = par[0]
+        elif c == 'Function':
+            o.expr = str( expr )
+    numInputs = {}
+    for s, d, kind in zip( data['msgSrc'], data['msgDest'], data['msgKind'] ):
+        src = objs[s]
+        dest = objs[d]
+        if kind in ( 'sub', 'prd', 'enz', 'cplx' ):
+            moose.connect( src, kind, dest, 'reac' )
+        elif kind == 'enzDest':
+            moose.connect( src, 'nOut', dest, 'enzDest' )
+        elif kind == 'input':
+            n = numInputs.get( d, 0 )
+            numInputs[d] = n + 1
+            moose.connect( src, 'nOut', dest.x[n], 'input' )
+        else:
+            srcField, destField = kind.split( ':' )
+            moose.connect( src, srcField, dest, destField )
+    for o, c, par in zip( objs, classes, data['params'] ):
+        for j, f in enumerate( _params[c] ):
+            if c != 'CubeMesh':
+                setattr( o, f, par[j] )
+    for i, dt in enumerate( data['dts'] ):
+        if dt > 0:
+            moose.setClock( i, dt )
+    return root
+
+def _addSolver( root, solver, isSbml ):
+    if solver == 'ee':
+        return
+    # The SBML reader integrates single compartment models with lsoda
+    # when asked for gsl, where addChemSolver would pick rk5. The method
+    # only takes if it is set before the Stoich is made.
+    compts = moose.wildcardFind( root.path + '/##[ISA=ChemCompt]' )
+    if isSbml and solver.lower() in ( 'gsl', 'rk', 'runge kutta' ) and \
+            len( compts ) == 1:
+        moose.Ksolve( compts[0].path + '/ksolve' ).method = 'lsoda'
+    moose.addChemSolver( root.path, solver )
+
+def loadModelCached( fname, path, solver = 'gsl', verbose = False ):
+    """Loads a kkit, cspace or SBML model like moose.loadModel, using
+    the compiled cache where it can. Returns the model root element."""
+    d = cacheDir()
+    cached = os.path.join( d, fileKey( fname ) + '.npz' )
+    isSbml = os.path.splitext( fname )[1].lower() in ( '.xml', '.sbml' )
+    if os.path.exists( cached ):
+        with np.load( cached ) as f:
+            data = dict( f )
+        if 'uncacheable' not in data:
+            root = buildModel( data, path )
+            _addSolver( root, solver, isSbml )
+            if verbose:
+                print( 'modelCache: built {} from {}'.format( fname, cached ) )
+            return root
+        root = moose.loadModel( fname, path, solver )
+        if verbose:
+            print( 'modelCache: {} is not cacheable'.format( fname ) )
+        return root
+
+    root = moose.loadModel( fname, path, 'ee' )
+    if not os.path.isdir( d ):
+        os.makedirs( d )
+    try:
+        data = compileModel( root.path )
+    except Uncacheable as e:
+        data = { 'uncacheable': np.array( str( e ) ) }
+    # Write to a temporary name first so that concurrent workers never
+    # read a half-written entry.
+    tmp = '{}.{}.npz'.format( cached[:-4], os.getpid() )
+    np.savez( tmp, **data )
+    os.rename( tmp, cached )
+    _addSolver( root, solver, isSbml )
+    if verbose:
+        print( 'modelCache: compiled {} to {}'.format( fname, cached ) )
+    return root
+
+#
+# modelCache.py ends here
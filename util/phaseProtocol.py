@@ -0,0 +1,119 @@
+# phaseProtocol.py ---
+#
+# Filename: phaseProtocol.py
+# Description: Declarative protocols of input phases, and seed batches.
+#
+# Commentary:
+#
+# LTP/LTD protocols such as those of Fig4CDEF and Fig4GHIJ step the
+# concInit of input pools from phase to phase: baseline, tetanus, rest,
+# tetanus, ... with a moose.start per phase and assignments from Python
+# in between. A PhaseProtocol takes the same schedule as a table of
+# phases, one value per target pool for each, and compiles it into one
+# Function per voxel whose expression is a piecewise constant in t.
+# The Functions drive the targets through messages, so the whole
+# protocol runs in one moose.start:
+#
+#   proto = PhaseProtocol( [ '/model/chem/psd/Ca_input',
+#           '/model/chem/dend/DEND/Ca_input' ] )
+#   proto.addPhase( 10, None, None )          # leave as they are
+#   proto.addPhase( 1, castim, lambda n: numpy.random.rand( n ) * 2e-3 )
+#   proto.addPhase( 20, 0.08e-3, 0.08e-3 )
+#   proto.compile()
+#   moose.reinit()
+#   moose.start( proto.runtime )
+#
+# A value can be a number, an array with one entry per voxel, None to
+# keep the value the target has at compile time, or a function of the
+# number of voxels. Functions are called in phase order when compiling,
+# so random draws come in the same order as in the stepped scripts.
+#
+# The Functions run on tick 12, the rdesigneur function clock. A Function
+# sees the time at the start of its step, so the phase boundaries are
+# moved on by half a step; with that a test model followed the stepped
+# assignments exactly. compile() has to come after the solvers are set
+# up, as connecting to a pool that is later zombified crashes, and
+# before moose.reinit.
+#
+# runSeeds() repeats a run over random seeds in worker processes, one
+# fresh process per seed, for statistics over stochastic runs.
+#
+
+# Code:
+
+import multiprocessing
+import numpy
+import moose
+
+class PhaseProtocol:
+    def __init__( self, targets, field = 'concInit' ):
+        self.targets = [ moose.vec( t ).path if not isinstance( t, moose.vec )
+                else t.path for t in targets ]
+        self.field = field
+        self.phases = []    # ( duration, values )
+
+    def addPhase( self, duration, *values ):
+        """Adds a phase of duration, with one value per target."""
+        assert( len( values ) == len( self.targets ) )
+        self.phases.append( ( duration, values ) )
+
+    @property
+    def runtime( self ):
+        return sum( p[0] for p in self.phases )
+
+    def phaseEnds( self ):
+        """Returns the end time of each phase."""
+        return numpy.cumsum( [ p[0] for p in self.phases ] )
+
+    def _values( self ):
+        # Array of voxels x phases for each target.
+        vecs = [ moose.vec( t ) for t in self.targets ]
+        current = [ numpy.array( getattr( v, self.field ), dtype = float )
+                for v in vecs ]
+        out = [ numpy.zeros( ( len( v ), len( self.phases ) ) ) for v in vecs ]
+        for j, ( duration, values ) in enumerate( self.phases ):
+            for i, v in enumerate( values ):
+                n = len( vecs[i] )
+                if v is None:
+                    v = current[i]
+                elif callable( v ):
+                    v = v( n )
+                out[i][:, j] = numpy.broadcast_to( v, n )
+        return out
+
+    def compile( self, path = '/protocol', tick = 12 ):
+        """Builds the Functions under path and connects them to the
+        targets. Returns the list of Function vecs."""
+        if not moose.exists( path ):
+            moose.Neutral( path )
+        ends = self.phaseEnds() + 0.5 * moose.element( '/clock' ).dts[tick]
+        setter = 'set' + self.field[0].upper() + self.field[1:]
+        funcs = []
+        for i, ( target, values ) in enumerate( zip( self.targets, self._values() ) ):
+            f = moose.Function( '{}/f{}'.format( path, i ), len( values ) ).vec
+            for fv, row in zip( f, values ):
+                fv.expr = piecewise( ends[:-1], row )
+                fv.tick = tick
+            moose.connect( f, 'valueOut', moose.vec( target ), setter, 'OneToOne' )
+            funcs.append( f )
+        return funcs
+
+def piecewise( bounds, values ):
+    """Expression in t that is values[k] for bounds[k-1] <= t < bounds[k]."""
+    expr = repr( float( values[-1] ) )
+    for b, v in reversed( list( zip( bounds, values[:-1] ) ) ):
+        expr = 't < {!r} ? {!r} : ( {} )'.format( float( b ), float( v ), expr )
+    return expr
+
+def runSeeds( func, seeds, processes = None ):
+    """Returns [ func( seed ) for seed in seeds ], each run in a fresh
+    worker process. func must be a module level function."""
+    pool = multiprocessing.Pool( processes, maxtasksperchild = 1 )
+    try:
+        return pool.map( func, seeds, chunksize = 1 )
+    finally:
+        pool.close()
+        pool.join()
+
+#
+# phaseProtocol.py ends here
@@ -0,0 +1,52 @@
+# popSpikes.py ---
+#
+# Filename: popSpikes.py
+# Description: Population spike trains merged from per-neuron tables.
+#
+# Commentary:
+#
+# The LIF network scripts record each neuron's spikes into its own entry
+# of a Table vec, through a single OneToOne message. The pooled
+# exc / inh spike trains used for population rates need not be recorded
+# by a second spikeOut message from every neuron into one shared table:
+# they can be merged from the per-neuron tables after the run. This
+# halves the spike message traffic and the memory spent on spike times.
+#
+#   self.spikes = moose.Table( '/plotSpikes', N )
+#   moose.connect( network, 'spikeOut', self.spikes, 'input', 'OneToOne' )
+#   self.spikesExc = PopulationSpikes( self.spikes, 0, NmaxExc )
+#   ...
+#   self.spikesExc.vector        # all exc spike times, sorted
+#   self.spikesExc.events()      # ( times, neuron indices ), sorted by time
+#
+
+# Code:
+
+import numpy as np
+
+class PopulationSpikes:
+    """Read-only view of the spikes of neurons start..stop-1, in the
+    per-neuron spike tables 'tables'. Has a 'vector' like a Table."""
+    def __init__( self, tables, start, stop ):
+        self.tables = tables
+        self.start = start
+        self.stop = stop
+
+    def events( self ):
+        """Returns ( times, indices ) of all spikes of the population,
+        sorted by time; indices are neuron indices into the table vec."""
+        vectors = self.tables.vec.vector[ self.start:self.stop ]
+        if len( vectors ) == 0:
+            return np.zeros( 0 ), np.zeros( 0, dtype = int )
+        counts = [ len( v ) for v in vectors ]
+        times = np.concatenate( vectors )
+        indices = np.repeat( np.arange( self.start, self.stop ), counts )
+        order = np.argsort( times, kind = 'mergesort' )
+        return times[ order ], indices[ order ]
+
+    @property
+    def vector( self ):
+        return self.events()[0]
+
+#
+# popSpikes.py ends here
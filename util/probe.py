@@ -0,0 +1,75 @@
+# probe.py ---
+#
+# Filename: probe.py
+# Description: Sampled recording of a few fields during a run.
+#
+# Commentary:
+#
+# A PyRun whose runString reads fields and prints them runs the Python
+# interpreter on every tick of its clock. A Probe records the same
+# fields into Table2s on a clock of their own, at an interval of dt, so
+# the solvers are only interrupted for a table lookup every dt:
+#
+#   probe = Probe( 1.0 )
+#   probe.add( 'psd_z', moose.element( '/model/chem/psd/z' ), 'n' )
+#   probe.add( 'headDia', moose.element( '/model/elec/head0' ), 'diameter' )
+#   moose.reinit()
+#   moose.start( runtime )
+#   data = probe.data()         # { name: array of samples }, plus 'time'
+#
+# Given an outfile, a Streamer writes the samples out from C++ while the
+# run goes on and empties the tables each time, so they never grow past
+# a few rows. outfile = '-' streams to stdout. The samples then live in
+# the file rather than in data().
+#
+# The tables run on tick 19, which nothing else in MOOSE or rdesigneur
+# uses by default; pass another tick if it is taken.
+#
+
+# Code:
+
+import numpy
+import moose
+
+class Probe:
+    def __init__( self, dt, path = '/probe', tick = 19, outfile = None,
+            fmt = 'csv' ):
+        self.path = path
+        self.dt = dt
+        self.tick = tick
+        self.tables = []    # ( name, Table2 )
+        if not moose.exists( path ):
+            moose.Neutral( path )
+        moose.setClock( tick, dt )
+        self.streamer = None
+        if outfile is not None:
+            self.streamer = moose.Streamer( path + '/streamer' )
+            self.streamer.outfile = '/dev/stdout' if outfile == '-' else outfile
+            self.streamer.format = fmt
+
+    def add( self, name, objs, field ):
+        """Samples field of each of objs, which may be one element, a
+        list or a moose.vec. Returns the Table2s."""
+        if not isinstance( objs, ( list, tuple, moose.vec ) ):
+            objs = [ objs ]
+        tabs = moose.Table2( '{}/{}'.format( self.path, name ), len( objs ) ).vec
+        getter = 'get' + field[0].upper() + field[1:]
+        for i, ( obj, tab ) in enumerate( zip( objs, tabs ) ):
+            moose.connect( tab, 'requestOut', obj, getter )
+            tab.tick = self.tick
+            tab.columnName = name if len( objs ) == 1 else '{}_{}'.format( name, i )
+            self.tables.append( ( tab.columnName, tab ) )
+            if self.streamer:
+                self.streamer.addTable( tab )
+        return tabs
+
+    def data( self ):
+        """Returns { column name: samples } for the samples still held
+        in the tables, with the sample times under 'time'."""
+        d = dict( ( name, numpy.array( tab.vector ) ) for name, tab in self.tables )
+        if self.tables:
+            d['time'] = numpy.arange( len( self.tables[0][1].vector ) ) * self.dt
+        return d
+
+#
+# probe.py ends here
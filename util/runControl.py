@@ -0,0 +1,98 @@
+# runControl.py ---
+#
+# Filename: runControl.py
+# Description: Chunked moose.start with timing and chunk-boundary hooks.
+#
+# Commentary:
+#
+# Long runs are usually split into many moose.start( chunk ) calls so
+# that progress can be printed, plots updated, or tables flushed. This
+# collects that pattern in one place:
+#
+#   rc = RunController( simtime, numChunks = 50 )
+#   rc.addHook( updatePlot )          # called as updatePlot( currTime )
+#   rc.reinit()
+#   rc.run()
+#   rc.report()
+#
+# The reinit cost is measured separately from the run, and for each chunk
+# the wall-clock time spent in moose.start and in the hooks is recorded,
+# along with the throughput in simulated seconds per wall-clock second.
+# Hooks run between moose.start calls, so the simulation carries on from
+# where it stopped without another reinit.
+#
+
+# Code:
+
+from __future__ import print_function
+import time
+import moose
+
+class RunController:
+    def __init__( self, simtime, chunkTime = None, numChunks = 50, verbose = True ):
+        """Runs for simtime in chunks of chunkTime, or in numChunks equal
+        chunks if chunkTime is not given."""
+        self.simtime = simtime
+        if chunkTime is None:
+            chunkTime = simtime / float( numChunks )
+        self.chunkTime = chunkTime
+        self.verbose = verbose
+        self.hooks = []
+        self.reinitTime = 0.0
+        self.chunkStats = []
+
+    def addHook( self, func, every = 1 ):
+        """Calls func( currTime ) after every 'every' chunks."""
+        self.hooks.append( ( func, every ) )
+
+    def reinit( self ):
+        t0 = time.time()
+        moose.reinit()
+        self.reinitTime = time.time() - t0
+        self.chunkStats = []
+        if self.verbose:
+            print( 'reinit time t = ', self.reinitTime )
+        return self.reinitTime
+
+    def run( self ):
+        """Advances to simtime chunk by chunk. Returns the list of
+        per-chunk stats ( simTime, runWallTime, hookWallTime, throughput )."""
+        currTime = 0.0
+        tStart = time.time()
+        i = 0
+        while currTime < self.simtime - 1e-9 * self.chunkTime:
+            step = min( self.chunkTime, self.simtime - currTime )
+            t0 = time.time()
+            moose.start( step )
+            t1 = time.time()
+            currTime += step
+            i += 1
+            for func, every in self.hooks:
+                if i % every == 0:
+                    func( currTime )
+            t2 = time.time()
+            runWall = t1 - t0
+            throughput = step / runWall if runWall > 0 else float( 'inf' )
+            self.chunkStats.append( ( currTime, runWall, t2 - t1, throughput ) )
+            if self.verbose:
+                print( 'at t = %g, realtime = %.3f, %.3g simsec/sec' % (
+                        currTime, t2 - tStart, throughput ) )
+        return self.chunkStats
+
+    def totals( self ):
+        """Returns ( reinitTime, total run time, total hook time,
+        overall throughput )."""
+        runWall = sum( s[1] for s in self.chunkStats )
+        hookWall = sum( s[2] for s in self.chunkStats )
+        simTime = self.chunkStats[-1][0] if self.chunkStats else 0.0
+        throughput = simTime / runWall if runWall > 0 else 0.0
+        return self.reinitTime, runWall, hookWall, throughput
+
+    def report( self ):
+        reinitTime, runWall, hookWall, throughput = self.totals()
+        print( 'reinit: %.3f s, run: %.3f s, hooks: %.3f s, '
+                '%.3g simulated sec per wall sec' % (
+                reinitTime, runWall, hookWall, throughput ) )
+
+#
+# runControl.py ends here
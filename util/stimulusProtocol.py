@@ -0,0 +1,120 @@
+# stimulusProtocol.py ---
+#
+# Filename: stimulusProtocol.py
+# Description: Compiles synaptic stimulus schedules into TimeTables.
+#
+# Commentary:
+#
+# Protocols such as the baseline, tetanus and probe of Fig5BCD were run
+# by alternating moose.start( interval ) with Python loops that call
+# activation( amplitude ) on every stimulated SynChan. A StimulusProtocol
+# holds the same schedule as a list of trains and compiles it into one
+# TimeTable per ( targets, amplitude ) pair, each feeding a synapse on
+# the SimpleSynHandler of every target channel. The whole protocol then
+# runs in a single moose.start:
+#
+#   proto = StimulusProtocol()
+#   proto.addTrain( spines, 1.0, 0.1, 5 )         # probe
+#   proto.addTrain( spines + dends, 1000, 0.01, 2 ) # tetanus
+#   proto.addTrain( spines, 1.0, 0.1, 50 )        # probe again
+#   proto.compile()
+#   moose.reinit()
+#   moose.start( proto.runtime )
+#
+# As in the loops it replaces, a train of interval dt over duration T
+# activates its targets at the end of each interval, dt, 2dt, ... up to
+# len( numpy.arange( 0, T, dt ) ) times, and trains follow each other
+# unless given an explicit start.
+#
+# A SimpleSynHandler passes on weight / dt, where a direct call of
+# activation passes its argument unchanged, so the synapse weights are
+# amplitude * dt of the handler clock. The TimeTables run on clock 0,
+# ahead of the handlers, with their event times offset by half a step.
+# With that the channel conductances match the stepped loops step for
+# step. compile() has to come before moose.reinit, and the clocks must
+# already have their final dt.
+#
+
+# Code:
+
+import numpy
+import moose
+
+class StimulusProtocol:
+    def __init__( self ):
+        self.trains = []    # ( targets, amplitude, times )
+        self.runtime = 0.0
+
+    def addTrain( self, targets, amplitude, interval, duration, start = None ):
+        """Activates each SynChan in targets with amplitude every interval
+        for duration, starting at start or at the end of the protocol so
+        far. Returns the event times."""
+        if start is None:
+            start = self.runtime
+        n = len( numpy.arange( 0, duration, interval ) )
+        times = start + interval * numpy.arange( 1, n + 1 )
+        self.trains.append( ( [ moose.element( t ) for t in targets ],
+            amplitude, times ) )
+        self.runtime = max( self.runtime, start + duration )
+        return times
+
+    def addEvents( self, targets, amplitude, times ):
+        """Activates each SynChan in targets with amplitude at times."""
+        times = numpy.sort( numpy.asarray( times, dtype = float ) )
+        self.trains.append( ( [ moose.element( t ) for t in targets ],
+            amplitude, times ) )
+        if len( times ) > 0:
+            self.runtime = max( self.runtime, times[-1] )
+        return times
+
+    def groups( self ):
+        """Merges trains with the same targets and amplitude. Returns
+        a list of ( targets, amplitude, sorted times )."""
+        merged = {}
+        order = []
+        for targets, amplitude, times in self.trains:
+            key = ( tuple( t.path for t in targets ), amplitude )
+            if key not in merged:
+                merged[key] = ( targets, amplitude, [] )
+                order.append( key )
+            merged[key][2].append( times )
+        return [ ( merged[k][0], merged[k][1],
+            numpy.sort( numpy.concatenate( merged[k][2] ) ) ) for k in order ]
+
+    def compile( self, path = '/stimulus' ):
+        """Builds the TimeTables under path and wires them to the
+        targets. Returns the list of TimeTables."""
+        if not moose.exists( path ):
+            moose.Neutral( path )
+        dts = moose.element( '/clock' ).dts
+        tables = []
+        for i, ( targets, amplitude, times ) in enumerate( self.groups() ):
+            if len( targets ) == 0:
+                continue
+            tt = moose.TimeTable( '{}/tt{}'.format( path, i ) )
+            tt.vector = times + 0.5 * dts[0]
+            tt.tick = 0
+            for chan in targets:
+                sh = synHandler( chan )
+                k = sh.synapse.num
+                sh.synapse.num = k + 1
+                syn = sh.synapse[k]
+                syn.weight = amplitude * dts[ sh.tick ]
+                syn.delay = 0
+                moose.connect( tt, 'eventOut', syn, 'addSpike' )
+            tables.append( tt )
+        return tables
+
+def synHandler( chan ):
+    """Returns the SynHandler driving the activation of chan, making a
+    SimpleSynHandler if it has none."""
+    for m in chan.msgIn:
+        src = moose.element( m.e1 )
+        if 'activation' in m.destFieldsOnE2 and src.isA[ 'SynHandlerBase' ]:
+            return src
+    sh = moose.SimpleSynHandler( chan.path + '/sh' )
+    moose.connect( sh, 'activationOut', chan, 'activation' )
+    return sh
+
+#
+# stimulusProtocol.py ends here
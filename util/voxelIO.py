@@ -0,0 +1,98 @@
+# voxelIO.py ---
+#
+# Filename: voxelIO.py
+# Description: Whole-mesh reads and writes of pool fields.
+#
+# Commentary:
+#
+# Once a Stoich is set up on a CubeMesh, CylMesh or NeuroMesh, each pool
+# holds one entry per voxel, and moose.vec( pool ).conc (or .n, .concInit,
+# .nInit) reads or writes all of them as a NumPy array in one call. A
+# Python loop over moose.vec( pool )[i] or moose.element( 'a[i]' ) pays a
+# round trip per voxel instead; on a 10,000 voxel cylinder that is about
+# 11 ms and 100 ms, against 3 ms for the whole vector.
+#
+# These helpers wrap that pattern:
+#
+#   setField( a, 0.1 )                            # every voxel
+#   setField( a, 0.12, stop = 1 )                 # a slice
+#   applyProfile( c, lambda x, y, z: x < 0.2 * compt.x1, field = 'nInit' )
+#   conc = getField( [ a, b ] )                   # pools x voxels
+#   snap = snapshot( compt )                      # every pool in the mesh
+#   ...
+#   restore( snap )
+#
+# Pools can be given as paths, elements or moose.vecs.
+#
+
+# Code:
+
+import numpy as np
+import moose
+
+def poolVec( pool ):
+    if isinstance( pool, moose.vec ):
+        return pool
+    if isinstance( pool, str ):
+        return moose.vec( pool )
+    return moose.vec( moose.element( pool ).path )
+
+def voxelCoords( compt ):
+    """Returns the x, y and z arrays of the voxel midpoints of compt."""
+    mid = np.asarray( moose.element( compt ).voxelMidpoint )
+    n = len( mid ) // 3
+    return mid[:n], mid[n:2 * n], mid[2 * n:]
+
+def getField( pools, field = 'conc' ):
+    """Returns field over all voxels: an array for one pool, or a
+    ( pools x voxels ) array for a list of them."""
+    if isinstance( pools, ( list, tuple ) ):
+        return np.array( [ getattr( poolVec( p ), field ) for p in pools ] )
+    return np.asarray( getattr( poolVec( pools ), field ) )
+
+def setField( pools, values, field = 'concInit', start = 0, stop = None ):
+    """Sets field of voxels start to stop of each pool to values, which
+    may be a scalar or an array the length of the slice."""
+    if not isinstance( pools, ( list, tuple ) ):
+        pools = [ pools ]
+    for p in pools:
+        v = poolVec( p )
+        if start == 0 and stop is None:
+            setattr( v, field, np.broadcast_to( values, len( v ) ).astype( float ) )
+        else:
+            current = np.array( getattr( v, field ), dtype = float )
+            current[start:stop] = values
+            setattr( v, field, current )
+
+def applyProfile( pools, func, compt = None, field = 'concInit' ):
+    """Sets field of the pools to func( x, y, z ) at the voxel midpoints.
+    compt defaults to the compartment that holds the first pool."""
+    if not isinstance( pools, ( list, tuple ) ):
+        pools = [ pools ]
+    if compt is None:
+        compt = moose.element( poolVec( pools[0] )[0] )
+        while not compt.isA[ 'ChemCompt' ]:
+            compt = compt.parent
+    x, y, z = voxelCoords( compt )
+    setField( pools, func( x, y, z ), field )
+
+def meshPools( compt ):
+    """All pools in compt, including enzyme complexes. The wildcard
+    returns every voxel of each pool, so keep only the first."""
+    return [ p for p in moose.wildcardFind( moose.element( compt ).path +
+            '/##[ISA=PoolBase]' ) if p.dataIndex == 0 ]
+
+def snapshot( compt, field = 'n' ):
+    """Returns { pool path: field over all voxels } for every pool in
+    compt, or in each compartment of a list."""
+    compts = compt if isinstance( compt, ( list, tuple ) ) else [ compt ]
+    return dict( ( p.vec.path, np.array( getattr( p.vec, field ) ) )
+            for c in compts for p in meshPools( c ) )
+
+def restore( snap, field = 'n' ):
+    """Writes a snapshot back."""
+    for path, values in snap.items():
+        setattr( moose.vec( path ), field, values )
+
+#
+# voxelIO.py ends here